@@ -2,14 +2,28 @@
 Main file of the program, entry point
 Loads config file and inits logger
 Start the business logic in app.py
+Modules of an action are imported in its branch, and generators and HTTP clients in app.py by generation mode:
+a short run only loads what it uses.
 """
 
-import logging
 import sys
 
+# --profile-startup: imports are timed from here, before the modules of the program are loaded
+if "--profile-startup" in sys.argv:
+    from benchmark.import_profile import ImportProfiler
+    import_profiler = ImportProfiler()
+    import_profiler.start()
+else:
+    import_profiler = None
+
+import logging
+
 from conf.conf import load_config
-from logs.logs import compute_log_level
-from app import push_campaign_feedbacks_to_api, create_sales_csv_file
+from logs.logs import build_log_handler, compute_log_level, set_debug_sampling, start_queue_logging
+from metrics.metrics import build_metrics_exporter
+
+# Options given without value
+FLAGS = ("profile-startup",)
 
 
 def usage():
@@ -23,10 +37,38 @@ def usage():
     print(
         "\tPUSH: message"
     )
+    print("\tSTREAM [--rate R] [--duration S]: push continuously, R records/s during S seconds or until SIGTERM")
+    print("\t--profile FILE: with PUSH or STREAM, pace the push with the load profile stages of FILE")
+    print("\tCSV <number_of_lines> [--workers N]: sales files, generated by N processes")
+    print("\tBENCH [--sizes 1000,100000] [--output FILE]: benchmark suite against local servers, results as JSON")
+    print("OPTIONS:")
+    print("\t--seed S: seed of the generation, same data for a same seed")
+    print("\t--profile-startup: print the import time of each module at the end of the run, on stderr")
+
+
+def parse_options(arguments):
+    """
+    Split command line arguments in positional arguments and options
+
+    :param arguments: command line arguments
+    :return: tuple (list of positional arguments, dict of options given as --name value, True for FLAGS)
+    """
+    positional = []
+    options = {}
+    arguments = iter(arguments)
+    for argument in arguments:
+        if argument[2:] in FLAGS:
+            options[argument[2:]] = True
+        elif argument.startswith("--"):
+            options[argument[2:]] = next(arguments, None)
+        else:
+            positional.append(argument)
+    return positional, options
 
 
 def main(arguments):
-    if len(arguments) > 3:
+    arguments, options = parse_options(arguments)
+    if len(arguments) > 3 or any(value is None for value in options.values()):
         usage()
         exit(1)
     else:
@@ -37,63 +79,225 @@ def main(arguments):
             api_endpoint_url,
             api_rest_method,
             api_timeout_seconds,
+            api_batch_size,
+            api_max_in_flight,
+            api_max_attempts,
+            api_backoff_base_seconds,
+            api_backoff_max_seconds,
+            api_requests_per_second,
+            api_records_per_second,
+            api_engine,
+            api_content_encoding,
+            api_compression_min_bytes,
+            api_body_format,
+            api_dictionary_encoding,
+            api_dimensions_url,
             api_auth_active,
             api_username,
             api_password,
             sales_csv_file,
             campaign_product_csv_file,
+            csv_merge_parts,
+            csv_format,
+            csv_dictionary_encoding,
             ollama_url,
             ollama_model,
+            ollama_timeout_seconds,
+            ollama_shard_size,
+            ollama_max_workers,
+            ollama_shard_retries,
+            ollama_stream,
+            ollama_cache_mode,
+            ollama_cache_dir,
+            ollama_cache_max_bytes,
             log_file,
             log_level,
             log_format,
+            log_debug_sample_every,
+            log_structured,
+            log_rotation,
+            log_max_bytes,
+            log_rotation_when,
+            log_backup_count,
+            log_compress,
+            log_queue_size,
             generation_mode,
+            generation_date_start,
+            generation_date_end,
+            generation_date_distribution,
+            generation_hybrid_seed_size,
+            generation_hybrid_date_jitter_days,
+            generation_hybrid_value_jitter,
+            generation_seed,
+            stream_rate,
+            stream_ramp_seconds,
+            stream_duration_seconds,
+            stream_report_seconds,
+            profile_unit,
+            load_profile,
+            metrics_file,
+            metrics_host,
+            metrics_port,
+            metrics_summary,
         ) = load_config(config_file=config_file)
 
         # Init Logging
         numeric_level = compute_log_level(log_level)
         logging.basicConfig(
             handlers=[
-                logging.FileHandler(filename=log_file, encoding="utf-8", mode="a+")
+                build_log_handler(
+                    log_file=log_file,
+                    log_format=log_format,
+                    structured=log_structured,
+                    rotation=log_rotation,
+                    max_bytes=log_max_bytes,
+                    when=log_rotation_when,
+                    backup_count=log_backup_count,
+                    compress=log_compress
+                )
             ],
             level=numeric_level,
             format=log_format,
         )
+        # File writes happen in a listener thread, not in the generation and push threads,
+        # records are dropped when the queue is full
+        start_queue_logging(queue_size=log_queue_size)
+        set_debug_sampling(log_debug_sample_every)
         logging.info("Config File loaded")
 
         # Arguments Management
         action = arguments[1]
+        if "seed" in options:
+            generation_seed = int(options["seed"])
+        if "profile" in options:
+            # Only imported when a profile is given
+            from http_client.load_profile import read_profile_file
+            try:
+                load_profile = read_profile_file(options["profile"], profile_unit)
+            except ValueError as e:
+                logging.error(f"Load profile: {e}")
+                return 5
+
+        # Metrics of the run: /metrics endpoint while it runs, text file and summary table at the end
+        metrics_exporter = None
+        if action != "HELP":
+            metrics_exporter = build_metrics_exporter(metrics_file, metrics_host, metrics_port, metrics_summary)
+        if metrics_exporter:
+            metrics_exporter.start()
 
         # Start the correct process
-        match action:
-            case "HELP":
-                usage()
-            case "PUSH":
-                feedbacks_to_push = int(arguments[2])
-                push_campaign_feedbacks_to_api(
-                    api_endpoint_url=api_endpoint_url,
-                    api_rest_method=api_rest_method,
-                    api_timeout_seconds=api_timeout_seconds,
-                    api_auth_active=api_auth_active,
-                    api_username=api_username,
-                    api_password=api_password,
-                    generation_mode=generation_mode,
-                    ollama_url=ollama_url,
-                    ollama_model=ollama_model,
-                    feedbacks_to_push=feedbacks_to_push
-                )
-            case "CSV":
-                lines_to_create = int(arguments[2])
-                create_sales_csv_file(
-                    sales_csv_file=sales_csv_file,
-                    campaign_product_csv_file=campaign_product_csv_file,
-                    generation_mode=generation_mode,
-                    ollama_url=ollama_url,
-                    ollama_model=ollama_model,
-                    lines_to_create=lines_to_create
-                )
+        try:
+            match action:
+                case "HELP":
+                    usage()
+                case "PUSH" | "STREAM":
+                    from app import push_campaign_feedbacks_to_api
+                    from http_client.streaming import StreamControl
+                    if action == "PUSH":
+                        feedbacks_to_push = int(arguments[2])
+                        # Without profile, batches are sent as fast as allowed
+                        stream_control = StreamControl(
+                            profile=load_profile,
+                            report_seconds=stream_report_seconds
+                        ) if load_profile else None
+                    else:
+                        # One process pushes until the duration or SIGTERM, connections and generators are kept
+                        feedbacks_to_push = None
+                        if "rate" in options or not load_profile:
+                            from http_client.load_profile import ramp_profile
+                            load_profile = ramp_profile(float(options.get("rate", stream_rate)), stream_ramp_seconds)
+                        stream_control = StreamControl(
+                            profile=load_profile,
+                            duration_seconds=float(options.get("duration", stream_duration_seconds)),
+                            report_seconds=stream_report_seconds
+                        )
+                    return push_campaign_feedbacks_to_api(
+                        api_endpoint_url=api_endpoint_url,
+                        api_rest_method=api_rest_method,
+                        api_timeout_seconds=api_timeout_seconds,
+                        api_batch_size=api_batch_size,
+                        api_max_in_flight=api_max_in_flight,
+                        api_max_attempts=api_max_attempts,
+                        api_backoff_base_seconds=api_backoff_base_seconds,
+                        api_backoff_max_seconds=api_backoff_max_seconds,
+                        api_requests_per_second=api_requests_per_second,
+                        api_records_per_second=api_records_per_second,
+                        api_engine=api_engine,
+                        api_content_encoding=api_content_encoding,
+                        api_compression_min_bytes=api_compression_min_bytes,
+                        api_body_format=api_body_format,
+                        api_dictionary_encoding=api_dictionary_encoding,
+                        api_dimensions_url=api_dimensions_url,
+                        api_auth_active=api_auth_active,
+                        api_username=api_username,
+                        api_password=api_password,
+                        generation_mode=generation_mode,
+                        generation_date_start=generation_date_start,
+                        generation_date_end=generation_date_end,
+                        generation_date_distribution=generation_date_distribution,
+                        generation_hybrid_seed_size=generation_hybrid_seed_size,
+                        generation_hybrid_date_jitter_days=generation_hybrid_date_jitter_days,
+                        generation_hybrid_value_jitter=generation_hybrid_value_jitter,
+                        generation_seed=generation_seed,
+                        ollama_url=ollama_url,
+                        ollama_model=ollama_model,
+                        ollama_timeout_seconds=ollama_timeout_seconds,
+                        ollama_shard_size=ollama_shard_size,
+                        ollama_max_workers=ollama_max_workers,
+                        ollama_shard_retries=ollama_shard_retries,
+                        ollama_stream=ollama_stream,
+                        ollama_cache_mode=ollama_cache_mode,
+                        ollama_cache_dir=ollama_cache_dir,
+                        ollama_cache_max_bytes=ollama_cache_max_bytes,
+                        feedbacks_to_push=feedbacks_to_push,
+                        stream_control=stream_control
+                    )
+                case "CSV":
+                    from app import create_sales_csv_file
+                    lines_to_create = int(arguments[2])
+                    return create_sales_csv_file(
+                        sales_csv_file=sales_csv_file,
+                        campaign_product_csv_file=campaign_product_csv_file,
+                        csv_merge_parts=csv_merge_parts,
+                        csv_format=csv_format,
+                        csv_dictionary_encoding=csv_dictionary_encoding,
+                        workers=int(options.get("workers", "1")),
+                        generation_mode=generation_mode,
+                        generation_date_start=generation_date_start,
+                        generation_date_end=generation_date_end,
+                        generation_date_distribution=generation_date_distribution,
+                        generation_hybrid_seed_size=generation_hybrid_seed_size,
+                        generation_hybrid_date_jitter_days=generation_hybrid_date_jitter_days,
+                        generation_hybrid_value_jitter=generation_hybrid_value_jitter,
+                        generation_seed=generation_seed,
+                        ollama_url=ollama_url,
+                        ollama_model=ollama_model,
+                        ollama_timeout_seconds=ollama_timeout_seconds,
+                        ollama_shard_size=ollama_shard_size,
+                        ollama_max_workers=ollama_max_workers,
+                        ollama_shard_retries=ollama_shard_retries,
+                        ollama_stream=ollama_stream,
+                        ollama_cache_mode=ollama_cache_mode,
+                        ollama_cache_dir=ollama_cache_dir,
+                        ollama_cache_max_bytes=ollama_cache_max_bytes,
+                        lines_to_create=lines_to_create
+                    )
+                case "BENCH":
+                    from benchmark.suite import DEFAULT_SIZES, run_benchmarks
+                    sizes = options.get("sizes")
+                    run_benchmarks(
+                        sizes=[int(size) for size in sizes.split(",")] if sizes else DEFAULT_SIZES,
+                        output_file=options.get("output", "bench.json")
+                    )
+        finally:
+            if metrics_exporter:
+                metrics_exporter.close()
 
 
 # Program entry point
 if __name__ == "__main__":
-    exit(main(sys.argv))
+    exit_code = main(sys.argv)
+    if import_profiler:
+        import_profiler.stop()
+        import_profiler.report()
+    exit(exit_code)
@@ -1,27 +1,76 @@
 """
-Business logic file, creates the main functions and assembles other packages
+Business logic file, creates the main functions and assembles other packages.
+Modules of a generation mode, a push engine or an output format are imported when they are used:
+a short run only loads what it needs (ex. PUSH in manual mode loads neither Ollama, asyncio nor file writers).
 """
-import codecs
-import json
+import itertools
 import logging
+import os
+import random
+import time
 
-from business.generate_campaign_feedback import generate_feedback_via_ollama, generate_random_feedback
-from business.generate_sales_file import generate_random_sales, generate_sales_via_ollama
-from http_client.http_client import send_json
+from business import (
+    campaign_product_column_types,
+    campaign_product_columns,
+    encoded_campaign_product_column_types,
+    encoded_campaign_product_columns,
+    encoded_sales_column_types,
+    encoded_sales_columns,
+    sales_column_types,
+    sales_columns
+)
+from business.bulk_engine import draw_seed
+from business.dates import DateSampler
+from metrics.metrics import rows_written as rows_written_metric, stage_seconds
 
 
 def push_campaign_feedbacks_to_api(
         api_endpoint_url,
         api_rest_method,
         api_timeout_seconds,
+        api_batch_size,
+        api_max_in_flight,
+        api_max_attempts,
+        api_backoff_base_seconds,
+        api_backoff_max_seconds,
+        api_requests_per_second,
+        api_records_per_second,
+        api_engine,
+        api_content_encoding,
+        api_compression_min_bytes,
+        api_body_format,
+        api_dictionary_encoding,
+        api_dimensions_url,
         api_auth_active,
         api_username,
         api_password,
         generation_mode,
+        generation_date_start,
+        generation_date_end,
+        generation_date_distribution,
+        generation_hybrid_seed_size,
+        generation_hybrid_date_jitter_days,
+        generation_hybrid_value_jitter,
+        generation_seed,
         ollama_url,
         ollama_model,
-        feedbacks_to_push
+        ollama_timeout_seconds,
+        ollama_shard_size,
+        ollama_max_workers,
+        ollama_shard_retries,
+        ollama_stream,
+        ollama_cache_mode,
+        ollama_cache_dir,
+        ollama_cache_max_bytes,
+        feedbacks_to_push,
+        stream_control = None,
+        push_report = None
 ):
+    from http_client.batch_pusher import PushReport
+    from http_client.encoder import encoder_name
+    from http_client.rate_limiter import build_token_bucket
+    from http_client.retry import RetryPolicy
+
     url = api_endpoint_url
     method = api_rest_method
     timeout = api_timeout_seconds
@@ -41,90 +90,311 @@ def push_campaign_feedbacks_to_api(
         "comment": "demo"
     }
 
-    # Init
-    payload = []
-
     logging.info(f"Generation mode: {generation_mode}")
+    date_sampler = DateSampler(generation_date_start, generation_date_end, generation_date_distribution)
+    seed = draw_seed() if generation_seed is None else generation_seed
+    logging.info(f"Generation seed: {seed}")
+
+    # Continuous push (STREAM action): endless generation, released by the stream schedule
+    if feedbacks_to_push is None and generation_mode == "ollama":
+        logging.error("Continuous push needs manual or hybrid generation mode")
+        return 1
+    hybrid_seed_size = generation_hybrid_seed_size
+    if feedbacks_to_push is not None:
+        hybrid_seed_size = min(hybrid_seed_size, feedbacks_to_push)
 
-    # Choose generation mode and generate
+    # Choose generation mode, batches are generated while previous ones are sent
+    ollama_cache = None
     if generation_mode == "ollama":
+        from business.generate_campaign_feedback import iter_feedback_via_ollama
+        from business.ollama_cache import build_ollama_cache
         logging.info(f"Local AI generation mode, using ollama")
+        ollama_cache = build_ollama_cache(ollama_cache_mode, ollama_cache_dir, ollama_cache_max_bytes, seed)
         # IA Generated feedback
-        payload = generate_feedback_via_ollama(
+        feedbacks = iter_feedback_via_ollama(
             count=feedbacks_to_push,
             model=ollama_model,
             host=ollama_url,
-            timeout=300
+            timeout=ollama_timeout_seconds,
+            shard_size=ollama_shard_size,
+            max_workers=ollama_max_workers,
+            shard_retries=ollama_shard_retries,
+            stream=ollama_stream,
+            cache=ollama_cache,
+            date_start=generation_date_start,
+            date_end=generation_date_end
+        )
+        batches = (list(batch) for batch in itertools.batched(feedbacks, api_batch_size))
+    elif generation_mode == "hybrid":
+        from business.generate_campaign_feedback import generate_feedback_via_ollama
+        from business.hybrid_engine import iter_hybrid_feedback_blocks
+        from business.ollama_cache import build_ollama_cache
+        logging.info(f"Hybrid generation mode, {hybrid_seed_size} seed feedbacks from ollama")
+        ollama_cache = build_ollama_cache(ollama_cache_mode, ollama_cache_dir, ollama_cache_max_bytes, seed)
+        # IA Generated seed pool, expanded locally
+        seed_feedbacks = generate_feedback_via_ollama(
+            count=hybrid_seed_size,
+            model=ollama_model,
+            host=ollama_url,
+            timeout=ollama_timeout_seconds,
+            shard_size=ollama_shard_size,
+            max_workers=ollama_max_workers,
+            shard_retries=ollama_shard_retries,
+            stream=ollama_stream,
+            cache=ollama_cache,
+            date_start=generation_date_start,
+            date_end=generation_date_end
+        )
+        batches = iter_hybrid_feedback_blocks(
+            count=feedbacks_to_push,
+            seed_feedbacks=seed_feedbacks,
+            block_size=api_batch_size,
+            date_sampler=date_sampler,
+            date_jitter_days=generation_hybrid_date_jitter_days,
+            rng=random.Random(seed)
         )
     else:
+        from business.bulk_engine import draw_feedback_block, iter_blocks
         logging.info(f"Manual generation mode, using random functions")
         # Manual mode, default mode
-        payload = generate_random_feedback(feedbacks_to_push, payload)
+        batches = iter_blocks(feedbacks_to_push, draw_feedback_block, api_batch_size, date_sampler, seed)
+
+    # Retry and rate limiting, shared by all batches
+    retry_policy = RetryPolicy(
+        max_attempts=api_max_attempts,
+        backoff_base=api_backoff_base_seconds,
+        backoff_max=api_backoff_max_seconds
+    )
+    request_limiter = build_token_bucket(api_requests_per_second)
+    record_limiter = build_token_bucket(api_records_per_second)
+    compressor = None
+    if api_content_encoding != "identity":
+        from http_client.compression import build_request_compressor
+        try:
+            compressor = build_request_compressor(api_content_encoding, api_compression_min_bytes)
+        except ValueError as e:
+            logging.error(f"Request compression: {e}")
+            return 1
 
-    # Send JSON to API Endpoint
+    # Dictionary encoding: comments are sent once, feedbacks refer to them by id
+    if api_dictionary_encoding:
+        from business.records import dictionary_encoded, dimension_records
+        from http_client.http_client import SendError, send_json
+        logging.info(f"Dictionary encoding, comments dimension sent to {api_dimensions_url}")
+        try:
+            send_json(
+                url=api_dimensions_url,
+                payload=dimension_records("comments"),
+                headers=headers,
+                timeout=timeout,
+                method=method,
+                retry_policy=retry_policy,
+                request_limiter=request_limiter,
+                compressor=compressor,
+                body_format=api_body_format
+            )
+        except SendError as e:
+            logging.error(f"Comments dimension not sent: {e}")
+            return 1
+        batches = (dictionary_encoded(batch) for batch in batches)
+
+    # Send JSON batches to API Endpoint, with threads or with an asyncio event loop
+    volume = "continuous" if feedbacks_to_push is None else feedbacks_to_push
+    logging.info(
+        f"Push {volume} feedbacks by batches of {api_batch_size}, {api_max_in_flight} in flight, "
+        f"{api_engine} engine, {api_body_format} bodies encoded with {encoder_name}"
+    )
+    report = push_report or PushReport()
+    if stream_control is not None:
+        if stream_control.profile:
+            logging.info(f"Load profile: {stream_control.profile.describe()}")
+        batches = stream_control.iter_batches(batches)
+        stream_control.start(report)
+    if api_engine == "async":
+        from http_client.async_batch_pusher import run_push_batches_async as push
+    else:
+        from http_client.batch_pusher import push_batches as push
     try:
-        resp = send_json(
+        push(
+            batches=batches,
             url=url,
-            payload=payload,
             headers=headers,
             timeout=timeout,
-            method=method
+            method=method,
+            max_in_flight=api_max_in_flight,
+            retry_policy=retry_policy,
+            request_limiter=request_limiter,
+            record_limiter=record_limiter,
+            compressor=compressor,
+            body_format=api_body_format,
+            report=report
         )
-        logging.info("Query finished without error")
-        logging.info(json.dumps(resp, indent=2, ensure_ascii=False))
-        return 0
-    except Exception:
-        logging.exception(f"Error on query {Exception}")
-        return 1
+    finally:
+        if stream_control is not None:
+            stream_control.close()
+    stage_seconds.observe(report.elapsed(), "push")
+    if compressor:
+        compressor.log_summary()
+    if ollama_cache:
+        ollama_cache.log_summary()
+    return 0 if report.batches_failed == 0 else 1
 
 
 def create_sales_csv_file(
         sales_csv_file,
         campaign_product_csv_file,
+        csv_merge_parts,
+        csv_format,
+        csv_dictionary_encoding,
         generation_mode,
+        generation_date_start,
+        generation_date_end,
+        generation_date_distribution,
+        generation_hybrid_seed_size,
+        generation_hybrid_date_jitter_days,
+        generation_hybrid_value_jitter,
+        generation_seed,
         ollama_url,
         ollama_model,
-        lines_to_create
+        ollama_timeout_seconds,
+        ollama_shard_size,
+        ollama_max_workers,
+        ollama_shard_retries,
+        ollama_stream,
+        ollama_cache_mode,
+        ollama_cache_dir,
+        ollama_cache_max_bytes,
+        lines_to_create,
+        workers = 1
 ):
     # Exemple line
-    columns_sales = "username,sale_date,country,product,quantity,unit_price,total_amount\n"
-    columns_campaign_product = "campaign_id,product\n"
     line_sales = "user149,2025-05-10,India,Chicken Nuggets,5,11.14,55.7"
     line_campaign_product = "CAMP000,Spicy Strips"
 
+    from file_writer.file_writer import write_dimension_files, write_sales_files
+    from file_writer.formats import format_available, output_file_name
+
+    # Output files, named after the format
+    if not format_available(csv_format):
+        logging.error(f"Output format {csv_format} is not available, its library is not installed")
+        return 1
+    sales_csv_file = output_file_name(sales_csv_file, csv_format)
+    campaign_product_csv_file = output_file_name(campaign_product_csv_file, csv_format)
+    logging.info(f"Output format: {csv_format}")
+
+    # Dictionary encoding: countries and products are written once, sales refer to them by id
+    if csv_dictionary_encoding:
+        write_dimension_files(os.path.dirname(sales_csv_file), ("countries", "products"), csv_format)
+        columns = {
+            "sales_columns": encoded_sales_columns,
+            "sales_column_types": encoded_sales_column_types,
+            "campaign_product_columns": encoded_campaign_product_columns,
+            "campaign_product_column_types": encoded_campaign_product_column_types,
+        }
+    else:
+        columns = {
+            "sales_columns": sales_columns,
+            "sales_column_types": sales_column_types,
+            "campaign_product_columns": campaign_product_columns,
+            "campaign_product_column_types": campaign_product_column_types,
+        }
+
     logging.info(f"Generation mode: {generation_mode}")
+    date_sampler = DateSampler(generation_date_start, generation_date_end, generation_date_distribution)
+    seed = draw_seed() if generation_seed is None else generation_seed
+    logging.info(f"Generation seed: {seed}")
+    start_time = time.perf_counter()
+
+    # Manual mode with several workers, each process generates and writes a part of the files
+    if workers > 1 and generation_mode not in ("ollama", "hybrid"):
+        from file_writer.parallel_writer import write_sales_files_parallel
+        logging.info(f"Manual generation mode, using random functions in {workers} processes")
+        rows_written = write_sales_files_parallel(
+            lines_to_create=lines_to_create,
+            workers=workers,
+            sales_csv_file=sales_csv_file,
+            campaign_product_csv_file=campaign_product_csv_file,
+            date_sampler=date_sampler,
+            seed=seed,
+            merge_parts=csv_merge_parts,
+            output_format=csv_format,
+            dictionary_encoded=csv_dictionary_encoding,
+            **columns
+        )
+        logging.info(f"{rows_written} lines written to {sales_csv_file} and {campaign_product_csv_file}")
+        rows_written_metric.inc(rows_written, csv_format)
+        stage_seconds.observe(time.perf_counter() - start_time, "csv")
+        return 0
+    if workers > 1:
+        logging.warning(f"{generation_mode} generation mode runs in one process, workers ignored")
 
-    # Choose generation mode and generate
+    # Choose generation mode, rows are generated lazily while files are written
+    ollama_cache = None
     if generation_mode == "ollama":
+        from business.generate_sales_file import iter_sales_via_ollama
+        from business.ollama_cache import build_ollama_cache
         logging.info(f"Local AI generation mode, using ollama")
+        ollama_cache = build_ollama_cache(ollama_cache_mode, ollama_cache_dir, ollama_cache_max_bytes, seed)
         # IA Generated sales
-        (
-            csv_sales,
-            campaign_product_csv
-        ) = generate_sales_via_ollama(
+        rows = iter_sales_via_ollama(
             lines_to_create=lines_to_create,
-            already_existing_sales=columns_sales,
-            already_existing_campaign_product=columns_campaign_product,
             model=ollama_model,
             host=ollama_url,
-            timeout=300
+            timeout=ollama_timeout_seconds,
+            shard_size=ollama_shard_size,
+            max_workers=ollama_max_workers,
+            shard_retries=ollama_shard_retries,
+            stream=ollama_stream,
+            cache=ollama_cache,
+            date_start=generation_date_start,
+            date_end=generation_date_end
+        )
+    elif generation_mode == "hybrid":
+        from business.generate_sales_file import iter_sales_via_ollama
+        from business.hybrid_engine import iter_hybrid_sales
+        from business.ollama_cache import build_ollama_cache
+        logging.info(f"Hybrid generation mode, {generation_hybrid_seed_size} seed lines from ollama")
+        ollama_cache = build_ollama_cache(ollama_cache_mode, ollama_cache_dir, ollama_cache_max_bytes, seed)
+        # IA Generated seed pool, expanded locally
+        seed_rows = list(iter_sales_via_ollama(
+            lines_to_create=min(generation_hybrid_seed_size, lines_to_create),
+            model=ollama_model,
+            host=ollama_url,
+            timeout=ollama_timeout_seconds,
+            shard_size=ollama_shard_size,
+            max_workers=ollama_max_workers,
+            shard_retries=ollama_shard_retries,
+            stream=ollama_stream,
+            cache=ollama_cache,
+            date_start=generation_date_start,
+            date_end=generation_date_end
+        ))
+        rows = iter_hybrid_sales(
+            lines_to_create=lines_to_create,
+            seed_rows=seed_rows,
+            date_sampler=date_sampler,
+            date_jitter_days=generation_hybrid_date_jitter_days,
+            value_jitter=generation_hybrid_value_jitter,
+            rng=random.Random(seed)
         )
     else:
+        from business.bulk_engine import iter_bulk_sales
         logging.info(f"Manual generation mode, using random functions")
         # Manual mode, default mode
-        (
-            csv_sales,
-            campaign_product_csv
-        ) = generate_random_sales(
-            lines_to_create=lines_to_create,
-            already_existing_sales=columns_sales,
-            already_existing_campaign_product=columns_campaign_product,
-        )
-
-    with codecs.open(sales_csv_file, "w", "utf-8") as text_file:
-        text_file.write(csv_sales)
-        text_file.close()
+        rows = iter_bulk_sales(lines_to_create=lines_to_create, date_sampler=date_sampler, seed=seed)
 
-    with codecs.open(campaign_product_csv_file, "w", "utf-8") as text_file:
-        text_file.write(campaign_product_csv)
-        text_file.close()
+    rows_written = write_sales_files(
+        rows=rows,
+        sales_csv_file=sales_csv_file,
+        campaign_product_csv_file=campaign_product_csv_file,
+        total=lines_to_create,
+        output_format=csv_format,
+        dictionary_encoded=csv_dictionary_encoding,
+        **columns
+    )
+    logging.info(f"{rows_written} lines written to {sales_csv_file} and {campaign_product_csv_file}")
+    rows_written_metric.inc(rows_written, csv_format)
+    stage_seconds.observe(time.perf_counter() - start_time, "csv")
+    if ollama_cache:
+        ollama_cache.log_summary()
+    return 0
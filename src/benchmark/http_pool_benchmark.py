@@ -0,0 +1,63 @@
+"""
+Benchmark of the pooled HTTP transport against one connection per request (urllib)
+
+Run from the src directory: python -m benchmark.http_pool_benchmark [requests]
+"""
+
+import sys
+import time
+from urllib import request
+
+from benchmark.local_servers import start_server
+from business.bulk_engine import generate_bulk_feedback
+from http_client.connection_pool import ConnectionPool
+from http_client.encoder import encode_json
+
+
+def run_urllib(url, body, requests_count):
+    """
+    Send requests with urllib, a new connection is opened for each request
+
+    :return: requests per second
+    """
+    start_time = time.perf_counter()
+    for _ in range(requests_count):
+        req = request.Request(url=url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+        with request.urlopen(req, timeout=10) as resp:
+            resp.read()
+    return requests_count / (time.perf_counter() - start_time)
+
+
+def run_pool(url, body, requests_count):
+    """
+    Send requests on kept alive connections of a pool
+
+    :return: requests per second
+    """
+    pool = ConnectionPool()
+    start_time = time.perf_counter()
+    for _ in range(requests_count):
+        pool.request("POST", url, body=body, headers={"Content-Type": "application/json"}, timeout=10)
+    rate = requests_count / (time.perf_counter() - start_time)
+    pool.close()
+    return rate
+
+
+def main(arguments):
+    requests_count = int(arguments[1]) if len(arguments) > 1 else 2000
+    body = encode_json(generate_bulk_feedback(10))
+
+    server = start_server()
+    try:
+        urllib_rate = run_urllib(server.url, body, requests_count)
+        pool_rate = run_pool(server.url, body, requests_count)
+    finally:
+        server.shutdown()
+
+    print(f"urllib (one connection per request): {urllib_rate:.0f} requests/s")
+    print(f"pool (keep-alive connections): {pool_rate:.0f} requests/s")
+    print(f"gain: x{pool_rate / urllib_rate:.2f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
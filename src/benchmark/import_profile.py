@@ -0,0 +1,117 @@
+"""
+Import time of the modules loaded by a run, used by the --profile-startup option.
+Like python -X importtime: every import statement or importlib.import_module call loading a new module is timed,
+with the time spent in the module itself (self) and with the modules it imports (cumulative). Modules imported
+lazily during the run, ex. pyarrow on the first Parquet file, are reported too.
+"""
+
+import builtins
+import importlib
+import importlib.util
+import sys
+import threading
+import time
+
+# Number of modules of the slowest imports table
+SLOWEST_COUNT = 15
+
+
+class ImportProfiler:
+    """
+    Time the imports by wrapping builtins.__import__ and importlib.import_module, from start() to stop()
+    """
+
+    def __init__(self):
+        self.original_import = None
+        self.original_import_module = None
+        # (module name, self seconds, cumulative seconds, depth), in the order imports end
+        self.entries = []
+        self.start_time = None
+        self.end_time = None
+        # Imports of each thread are nested in their own stack
+        self.local = threading.local()
+
+    def start(self):
+        """
+        Start timing the imports
+
+        :return: No Return
+        """
+        self.original_import = builtins.__import__
+        self.original_import_module = importlib.import_module
+        builtins.__import__ = self._import
+        importlib.import_module = self._import_module
+        self.start_time = time.perf_counter()
+
+    def stop(self):
+        """
+        Stop timing the imports
+
+        :return: No Return
+        """
+        if self.original_import is not None:
+            builtins.__import__ = self.original_import
+            self.original_import = None
+        if self.original_import_module is not None:
+            importlib.import_module = self.original_import_module
+            self.original_import_module = None
+        self.end_time = time.perf_counter()
+
+    def _import(self, name, globals = None, locals = None, fromlist = (), level = 0):
+        # Relative imports and modules already loaded are not timed
+        if level:
+            return self.original_import(name, globals, locals, fromlist, level)
+        loaded = name
+        if name in sys.modules:
+            # from package import submodule, with the package already loaded
+            module = sys.modules[name]
+            loaded = next(
+                (f"{name}.{item}" for item in fromlist or () if item != "*" and not hasattr(module, item)), None
+            )
+            if loaded is None:
+                return self.original_import(name, globals, locals, fromlist, level)
+        return self._timed(loaded, self.original_import, name, globals, locals, fromlist, level)
+
+    def _import_module(self, name, package = None):
+        # Lazy imports of optional libraries go through importlib.import_module
+        absolute = importlib.util.resolve_name(name, package) if name.startswith(".") else name
+        if absolute in sys.modules:
+            return self.original_import_module(name, package)
+        return self._timed(absolute, self.original_import_module, name, package)
+
+    def _timed(self, name, function, *args):
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        # Time spent in nested imports, subtracted from the self time of this one
+        stack.append(0.0)
+        start_time = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            cumulative = time.perf_counter() - start_time
+            nested = stack.pop()
+            if stack:
+                stack[-1] = stack[-1] + cumulative
+            self.entries.append((name, cumulative - nested, cumulative, len(stack)))
+
+    def report(self, file = None):
+        """
+        Print the import times in the -X importtime layout, then the slowest modules and the total
+
+        :param file: text file to print to, sys.stderr if None
+        :return: No Return
+        """
+        file = file or sys.stderr
+        print("import time: self [us] | cumulative | imported package", file=file)
+        for name, self_time, cumulative, depth in self.entries:
+            print(f"import time: {self_time * 1e6:9.0f} | {cumulative * 1e6:10.0f} | {'  ' * depth}{name}", file=file)
+        print(f"Slowest imports (self time, {SLOWEST_COUNT} first):", file=file)
+        slowest = sorted(self.entries, key=lambda entry: entry[1], reverse=True)[:SLOWEST_COUNT]
+        for name, self_time, cumulative, depth in slowest:
+            print(f"  {self_time * 1000:8.2f} ms  {name}", file=file)
+        imports = sum(entry[2] for entry in self.entries if entry[3] == 0)
+        run = (self.end_time or time.perf_counter()) - self.start_time
+        print(
+            f"{len(self.entries)} modules imported in {imports * 1000:.1f} ms, run of {run * 1000:.1f} ms", file=file
+        )
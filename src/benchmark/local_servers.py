@@ -0,0 +1,264 @@
+"""
+Local stand-in servers, used by benchmarks instead of real endpoints
+"""
+
+import asyncio
+import functools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from http_client.async_http_client import read_http_message
+
+
+class SinkHandler(BaseHTTPRequestHandler):
+    """
+    Accept any request with keep-alive and answer with the size of the received body
+    """
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, Nagle would delay every answer
+    disable_nagle_algorithm = True
+
+    def read_body(self):
+        """
+        Read the request body, sent with a Content-Length or with chunked encoding
+
+        :return: body bytes
+        """
+        if self.headers.get("Transfer-Encoding", "").lower() != "chunked":
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        chunks = []
+        while size := int(self.rfile.readline().split(b";")[0], 16):
+            chunks.append(self.rfile.read(size))
+            self.rfile.readline()
+        # Trailers are ignored
+        while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+            pass
+        return b"".join(chunks)
+
+    def do_POST(self):
+        body = self.read_body()
+        self.server.add_request(len(body))
+        answer = json.dumps({"received_bytes": len(body)}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(answer)))
+        self.end_headers()
+        self.wfile.write(answer)
+
+    do_PUT = do_POST
+
+    def log_message(self, format, *args):
+        # No access log on stderr
+        pass
+
+
+def fake_value(name, spec, index):
+    """
+    Build a value matching a JSON schema property, like a model would
+
+    :param name: property name
+    :param spec: property schema
+    :param index: item number
+    :return: fake value
+    """
+    if spec.get("type") == "integer":
+        return random.randint(1, 99)
+    if "pattern" in spec:
+        return f"{random.randint(2024, 2026)}-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}"
+    return f"{name}_{index}"
+
+
+class FakeOllamaHandler(SinkHandler):
+    """
+    Answer Ollama /api/generate requests with items built from the requested JSON schema.
+    Streaming requests are answered with NDJSON chunks of `stream_chunk_size` characters.
+    Server attributes `latency` (seconds before the first chunk), `chunk_delay` (seconds between chunks)
+    and `failure_rate` (0 to 1) simulate a slow or failing model.
+    """
+    stream_chunk_size = 16
+
+    def do_POST(self):
+        body = self.read_body()
+        self.server.add_request(len(body))
+        time.sleep(self.server.latency)
+
+        if self.path != "/api/generate" or random.random() < self.server.failure_rate:
+            self.send_answer(500, {"error": "fake failure"})
+            return
+
+        request = json.loads(body)
+        schema = request["format"]
+        properties = schema["items"]["properties"]
+        items = [
+            {name: fake_value(name, spec, index) for name, spec in properties.items()}
+            for index in range(schema.get("minItems", 1))
+        ]
+        response = json.dumps(items)
+        if request.get("stream", True):
+            self.send_stream(request.get("model"), response)
+        else:
+            self.send_answer(200, {"model": request.get("model"), "response": response, "done": True})
+
+    def send_stream(self, model, response):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        pieces = [response[i:i + self.stream_chunk_size] for i in range(0, len(response), self.stream_chunk_size)]
+        for piece in pieces + [""]:
+            line = json.dumps({"model": model, "response": piece, "done": piece == ""}).encode("utf-8") + b"\n"
+            self.wfile.write(f"{len(line):x}\r\n".encode("latin-1") + line + b"\r\n")
+            time.sleep(self.server.chunk_delay)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def send_answer(self, status, answer):
+        answer = json.dumps(answer).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(answer)))
+        self.end_headers()
+        self.wfile.write(answer)
+
+
+class LocalServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server counting received requests
+    """
+    daemon_threads = True
+
+    def __init__(self, address, handler):
+        super().__init__(address, handler)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.received_bytes = 0
+        # Used by FakeOllamaHandler
+        self.latency = 0.0
+        self.chunk_delay = 0.0
+        self.failure_rate = 0.0
+
+    def add_request(self, received_bytes):
+        with self.lock:
+            self.requests = self.requests + 1
+            self.received_bytes = self.received_bytes + received_bytes
+
+    @property
+    def url(self):
+        return f"http://{self.host}"
+
+    @property
+    def host(self):
+        host, port = self.server_address[:2]
+        return f"{host}:{port}"
+
+
+def start_server(handler = SinkHandler, host = "127.0.0.1", port = 0):
+    """
+    Start a local server in a background thread
+
+    :param handler: request handler class
+    :param host: listening address
+    :param port: listening port, 0 for a free port
+    :return: LocalServer, stop it with shutdown()
+    """
+    server = LocalServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, name="local-server", daemon=True)
+    thread.start()
+    return server
+
+
+async def handle_echo(reader, writer, server = None):
+    """
+    asyncio HTTP/1.1 handler, answers every request of a kept alive connection with its own body
+
+    :param reader: asyncio.StreamReader
+    :param writer: asyncio.StreamWriter
+    :param server: AsyncEchoServer counting the requests, None for no count
+    :return: No Return
+    """
+    try:
+        while True:
+            _, headers, body = await read_http_message(reader)
+            if server is not None:
+                server.add_request(len(body))
+            content_type = headers.get("content-type", "application/octet-stream")
+            writer.write(
+                f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n".encode(
+                    "latin-1"
+                ) + body
+            )
+            await writer.drain()
+            if headers.get("connection", "").lower() == "close":
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        # Client closed the connection
+        pass
+    finally:
+        writer.close()
+
+
+async def start_async_echo_server(host = "127.0.0.1", port = 0, server = None):
+    """
+    Start an asyncio echo server in the running event loop
+
+    :param host: listening address
+    :param port: listening port, 0 for a free port
+    :param server: AsyncEchoServer counting the requests, None for no count
+    :return: tuple (asyncio.Server, url)
+    """
+    echo_server = await asyncio.start_server(functools.partial(handle_echo, server=server), host, port)
+    host, port = echo_server.sockets[0].getsockname()[:2]
+    return echo_server, f"http://{host}:{port}"
+
+
+class AsyncEchoServer:
+    """
+    asyncio echo server running its own event loop in a background thread, counting received requests.
+    Same attributes as LocalServer (url, requests, received_bytes, shutdown), used by the async push benchmark.
+    """
+
+    def __init__(self, host = "127.0.0.1", port = 0):
+        """
+        :param host: listening address
+        :param port: listening port, 0 for a free port
+        """
+        # Counters are only updated from the event loop thread
+        self.requests = 0
+        self.received_bytes = 0
+        self.url = None
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            echo_server, self.url = self.loop.run_until_complete(start_async_echo_server(host, port, self))
+            started.set()
+            self.loop.run_forever()
+            echo_server.close()
+            self.loop.run_until_complete(echo_server.wait_closed())
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run, name="async-echo-server", daemon=True)
+        self.thread.start()
+        started.wait()
+
+    def add_request(self, received_bytes):
+        self.requests = self.requests + 1
+        self.received_bytes = self.received_bytes + received_bytes
+
+    def shutdown(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+def start_async_echo_server_thread(host = "127.0.0.1", port = 0):
+    """
+    Start an asyncio echo server in its own event loop, in a background thread
+
+    :param host: listening address
+    :param port: listening port, 0 for a free port
+    :return: AsyncEchoServer, stop it with shutdown()
+    """
+    return AsyncEchoServer(host, port)
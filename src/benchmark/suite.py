@@ -0,0 +1,409 @@
+"""
+Benchmark suite of the generation, serialization, file writing and push paths.
+Each case reports rows per second, bytes per second, latency percentiles and its peak RSS,
+results are written as JSON to compare versions. Each case runs in its own process: the peak RSS of the process
+is the one of the case, not of the largest case run before.
+
+Run from the src directory: python -m benchmark.suite [sizes] [output_file]
+or with the BENCH action: python __main__.py BENCH [--sizes 1000,100000] [--output bench.json]
+"""
+
+import datetime
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+from app import create_sales_csv_file, push_campaign_feedbacks_to_api
+from benchmark.local_servers import FakeOllamaHandler, start_async_echo_server_thread, start_server
+from business import random_date
+from business.bulk_engine import DEFAULT_BLOCK_SIZE, draw_feedback_block, draw_sales_block, iter_blocks, numpy
+from business.generate_campaign_feedback import generate_random_feedback
+from business.generate_sales_file import iter_random_sales, rows_to_csv
+from file_writer.formats import OUTPUT_FORMATS, format_available
+from http_client.batch_pusher import PushReport
+from http_client.encoder import encode_body, encoder_name
+from logs.logs import init_worker_logging, start_worker_logging
+from metrics.metrics import bytes_sent
+
+# Sizes (rows or records) of each case
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+
+# Rows generated between two latency samples of the row by row generators
+CHUNK_ROWS = 1000
+
+# Records per pushed batch and per encoded body
+BATCH_SIZE = 1000
+
+# Ollama mode generates every record through the fake server, larger sizes are skipped
+OLLAMA_MAX_SIZE = 100000
+
+# Generation parameters shared by the cases
+GENERATION = {
+    "generation_date_start": "2024-01-01",
+    "generation_date_end": "2026-12-31",
+    "generation_date_distribution": "uniform",
+    "generation_hybrid_seed_size": 100,
+    "generation_hybrid_date_jitter_days": 15,
+    "generation_hybrid_value_jitter": 0.1,
+    "generation_seed": 1,
+    "ollama_model": "benchmark",
+    "ollama_timeout_seconds": 30,
+    "ollama_shard_size": 50,
+    "ollama_max_workers": 4,
+    "ollama_shard_retries": 0,
+    "ollama_stream": False,
+    "ollama_cache_mode": "off",
+    "ollama_cache_dir": "",
+    "ollama_cache_max_bytes": 0,
+}
+
+
+def peak_rss_kb():
+    """
+    :return: peak resident memory of the process since its start, in KB, the one of the case in run_isolated
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux gives KB, macOS bytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def latency_percentiles(latencies):
+    """
+    :param latencies: list of durations in seconds
+    :return: dict of p50, p90, p99 and max in milliseconds, None without samples
+    """
+    if not latencies:
+        return None
+    if len(latencies) == 1:
+        return {"p50": latencies[0] * 1000, "p90": latencies[0] * 1000, "p99": latencies[0] * 1000,
+                "max": latencies[0] * 1000}
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50": quantiles[49] * 1000,
+        "p90": quantiles[89] * 1000,
+        "p99": quantiles[98] * 1000,
+        "max": max(latencies) * 1000,
+    }
+
+
+def result(name, size, seconds, rows, output_bytes = None, latencies = None, latency_unit = None):
+    """
+    Build the result of a case
+
+    :param name: case name
+    :param size: requested size
+    :param seconds: duration of the case
+    :param rows: rows or records processed
+    :param output_bytes: bytes produced (file, body or request bytes), None when the case produces none
+    :param latencies: durations of the case steps, in seconds
+    :param latency_unit: what one latency sample measures (ex. '1000 rows', 'batch')
+    :return: dict
+    """
+    return {
+        "name": name,
+        "size": size,
+        "seconds": seconds,
+        "rows": rows,
+        "rows_per_second": rows / seconds if seconds > 0 else None,
+        "bytes": output_bytes,
+        "bytes_per_second": output_bytes / seconds if output_bytes is not None and seconds > 0 else None,
+        "latency_unit": latency_unit,
+        "latency_ms": latency_percentiles(latencies),
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def timed_chunks(size, run_chunk, chunk = CHUNK_ROWS):
+    """
+    Run a case chunk by chunk, timing each chunk
+
+    :param size: number of rows
+    :param run_chunk: function(number of rows) returning the bytes produced, or None
+    :param chunk: rows per chunk
+    :return: tuple (seconds, bytes produced or None, list of chunk durations)
+    """
+    latencies = []
+    output_bytes = None
+    start_time = time.perf_counter()
+    for first in range(0, size, chunk):
+        chunk_start = time.perf_counter()
+        produced = run_chunk(min(chunk, size - first))
+        latencies.append(time.perf_counter() - chunk_start)
+        if produced is not None:
+            output_bytes = (output_bytes or 0) + produced
+    return time.perf_counter() - start_time, output_bytes, latencies
+
+
+def bench_random_sales(size):
+    """
+    Row by row sales generation rendered as csv, as generate_random_sales
+    """
+    rng = random.Random(1)
+
+    def run_chunk(rows):
+        sales, campaign_product = rows_to_csv(iter_random_sales(rows, rng=rng), "", "")
+        return len(sales.encode("utf-8")) + len(campaign_product.encode("utf-8"))
+
+    seconds, output_bytes, latencies = timed_chunks(size, run_chunk)
+    return result("generate_random_sales", size, seconds, size, output_bytes, latencies, f"{CHUNK_ROWS} rows")
+
+
+def bench_random_feedback(size):
+    """
+    Row by row feedback generation, generate_random_feedback
+    """
+    rng = random.Random(1)
+
+    def run_chunk(rows):
+        generate_random_feedback(rows, [], rng=rng)
+
+    seconds, _, latencies = timed_chunks(size, run_chunk)
+    return result("generate_random_feedback", size, seconds, size, None, latencies, f"{CHUNK_ROWS} rows")
+
+
+def bench_bulk(name, draw_block, size):
+    """
+    Block generation of the manual mode, one latency sample per block
+    """
+    latencies = []
+    start_time = time.perf_counter()
+    blocks = iter_blocks(size, draw_block, DEFAULT_BLOCK_SIZE, seed=1)
+    while True:
+        block_start = time.perf_counter()
+        block = next(blocks, None)
+        if block is None:
+            break
+        latencies.append(time.perf_counter() - block_start)
+    return result(name, size, time.perf_counter() - start_time, size, None, latencies, f"{DEFAULT_BLOCK_SIZE} rows")
+
+
+def bench_random_date(size):
+    """
+    random_date calls
+    """
+    rng = random.Random(1)
+
+    def run_chunk(calls):
+        for _ in range(calls):
+            random_date("2024-01-01", "2026-12-31", rng=rng)
+
+    seconds, _, latencies = timed_chunks(size, run_chunk)
+    return result("random_date", size, seconds, size, None, latencies, f"{CHUNK_ROWS} calls")
+
+
+def bench_encode(body_format, size):
+    """
+    Request body encoding of send_json, one latency sample per batch
+    """
+    # Batches of one block are generated once and encoded again until size records are encoded
+    batches = list(iter_blocks(min(size, DEFAULT_BLOCK_SIZE), draw_feedback_block, BATCH_SIZE, seed=1))
+    latencies = []
+    output_bytes = 0
+    encoded = 0
+    start_time = time.perf_counter()
+    for batch in itertools.cycle(batches):
+        if encoded >= size:
+            break
+        batch = batch[:size - encoded]
+        encoded = encoded + len(batch)
+        batch_start = time.perf_counter()
+        output_bytes = output_bytes + len(encode_body(batch, body_format))
+        latencies.append(time.perf_counter() - batch_start)
+    seconds = time.perf_counter() - start_time
+    return result(f"encode_body.{body_format}.{encoder_name}", size, seconds, size, output_bytes, latencies, "batch")
+
+
+def bench_create_sales_csv_file(output_format, size, directory):
+    """
+    Sales files generation and writing of the CSV action, manual mode
+    """
+    sales_file = os.path.join(directory, "sales.csv")
+    campaign_product_file = os.path.join(directory, "campaign_product.csv")
+    start_time = time.perf_counter()
+    create_sales_csv_file(
+        sales_csv_file=sales_file,
+        campaign_product_csv_file=campaign_product_file,
+        csv_merge_parts=True,
+        csv_format=output_format,
+        csv_dictionary_encoding=False,
+        generation_mode="manual",
+        ollama_url=[],
+        lines_to_create=size,
+        **GENERATION
+    )
+    seconds = time.perf_counter() - start_time
+    output_bytes = 0
+    for file_name in os.listdir(directory):
+        output_bytes = output_bytes + os.path.getsize(os.path.join(directory, file_name))
+        os.remove(os.path.join(directory, file_name))
+    return result(f"create_sales_csv_file.{output_format}", size, seconds, size, output_bytes)
+
+
+def bench_push(generation_mode, size, url, ollama_host, engine = "threads"):
+    """
+    End to end PUSH against a local sink, generation included, one latency sample per batch
+    """
+    report = PushReport(keep_latencies=True)
+    sent_bytes = bytes_sent.value()
+    start_time = time.perf_counter()
+    push_campaign_feedbacks_to_api(
+        api_endpoint_url=url,
+        api_rest_method="POST",
+        api_timeout_seconds=30,
+        api_batch_size=BATCH_SIZE,
+        api_max_in_flight=4,
+        api_max_attempts=1,
+        api_backoff_base_seconds=0.5,
+        api_backoff_max_seconds=30,
+        api_requests_per_second=0,
+        api_records_per_second=0,
+        api_engine=engine,
+        api_content_encoding="identity",
+        api_compression_min_bytes=1024,
+        api_body_format="json",
+        api_dictionary_encoding=False,
+        api_dimensions_url=url,
+        api_auth_active=False,
+        api_username="",
+        api_password="",
+        generation_mode=generation_mode,
+        ollama_url=[ollama_host],
+        feedbacks_to_push=size,
+        push_report=report,
+        **GENERATION
+    )
+    seconds = time.perf_counter() - start_time
+    return result(
+        f"push.{generation_mode}.{engine}",
+        size,
+        seconds,
+        report.records_ok,
+        bytes_sent.value() - sent_bytes,
+        report.latencies,
+        "batch"
+    )
+
+
+def run_case(case, args, connection, log_initargs):
+    """
+    Run a case in a worker process and send its result to the suite
+
+    :param case: bench_* function
+    :param args: arguments of the case
+    :param connection: sending end of a Pipe
+    :param log_initargs: arguments of init_worker_logging
+    :return: No Return
+    """
+    init_worker_logging(*log_initargs)
+    connection.send(case(*args))
+    connection.close()
+
+
+def run_isolated(case, *args, log_initargs):
+    """
+    Run a case in a new process, started with spawn: threads of the suite (servers, log listener) are not forked
+
+    :param case: bench_* function
+    :param args: arguments of the case, local servers are given by URL
+    :param log_initargs: arguments of init_worker_logging, records are written by the suite process
+    :return: result of the case
+    :raise RuntimeError: when the case failed, its traceback is printed by the worker process
+    """
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=run_case, args=(case, args, sender, log_initargs), name=case.__name__)
+    process.start()
+    sender.close()
+    try:
+        return receiver.recv()
+    except EOFError:
+        raise RuntimeError(f"Benchmark case {case.__name__}{args} failed") from None
+    finally:
+        receiver.close()
+        process.join()
+
+
+def run_benchmarks(sizes = DEFAULT_SIZES, output_file = "bench.json"):
+    """
+    Run every case for every size and write the results
+
+    :param sizes: sizes of the cases, in rows or records
+    :param output_file: JSON file of the results
+    :return: results (dict)
+    """
+    sink = start_server()
+    # The async engine is measured against an asyncio server, the threads engine against a threaded one
+    echo_server = start_async_echo_server_thread()
+    ollama_server = start_server(FakeOllamaHandler)
+    log_listener, log_initargs = start_worker_logging(multiprocessing.get_context("spawn"))
+    results = []
+
+    def add(case, *args):
+        case_result = run_isolated(case, *args, log_initargs=log_initargs)
+        results.append(case_result)
+        rate = case_result["rows_per_second"] or 0
+        p99 = f"{case_result['latency_ms']['p99']:>10.2f}" if case_result["latency_ms"] else f"{'-':>10}"
+        print(
+            f"{case_result['name']:<40} {case_result['size']:>10} {rate:>14.0f} rows/s {p99} ms p99"
+            f" {case_result['peak_rss_kb'] // 1024:>8} MB peak RSS"
+        )
+        logging.info(f"Benchmark: {case_result}")
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for size in sizes:
+                add(bench_random_sales, size)
+                add(bench_random_feedback, size)
+                add(bench_bulk, "draw_sales_block", draw_sales_block, size)
+                add(bench_bulk, "draw_feedback_block", draw_feedback_block, size)
+                add(bench_random_date, size)
+                for body_format in ("json", "ndjson"):
+                    add(bench_encode, body_format, size)
+                for output_format in OUTPUT_FORMATS:
+                    if format_available(output_format):
+                        add(bench_create_sales_csv_file, output_format, size, directory)
+                add(bench_push, "manual", size, sink.url, ollama_server.host, "threads")
+                add(bench_push, "manual", size, echo_server.url, ollama_server.host, "async")
+                add(bench_push, "hybrid", size, sink.url, ollama_server.host)
+                if size <= OLLAMA_MAX_SIZE:
+                    add(bench_push, "ollama", size, sink.url, ollama_server.host)
+    finally:
+        sink.shutdown()
+        echo_server.shutdown()
+        ollama_server.shutdown()
+        log_listener.stop()
+
+    report = {
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "json_encoder": encoder_name,
+        "numpy": numpy is not None,
+        "log_level": logging.getLevelName(logging.getLogger().getEffectiveLevel()),
+        "sizes": list(sizes),
+        "results": results,
+    }
+    with open(output_file, "w", encoding="utf-8") as bench_file:
+        json.dump(report, bench_file, indent=2)
+    print(f"Results written to {output_file}")
+    return report
+
+
+def main(arguments):
+    sizes = [int(size) for size in arguments[1].split(",")] if len(arguments) > 1 else DEFAULT_SIZES
+    output_file = arguments[2] if len(arguments) > 2 else "bench.json"
+    run_benchmarks(sizes, output_file)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
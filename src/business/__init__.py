@@ -1,5 +1,8 @@
 # Global value: Allowed Comments
-import time
+import functools
+import random
+
+from business.dates import DateSampler
 
 allowed_comments = [
     "Great campaign!",
@@ -66,32 +69,79 @@ allowed_products = [
     "Too Much Grilled Tenders"
 ]
 
+sales_columns = (
+    "username",
+    "sale_date",
+    "country",
+    "product",
+    "quantity",
+    "unit_price",
+    "total_amount"
+)
+
+campaign_product_columns = (
+    "campaign_id",
+    "product"
+)
+
+# Column types, used by typed output formats
+sales_column_types = ("string", "date", "string", "string", "int32", "float64", "float64")
+
+campaign_product_column_types = ("string", "string")
+
+# Dictionary encoded outputs: countries, products and comments are written once in dimensions,
+# fact rows refer to them by id (index in the allowed list)
+encoded_sales_columns = (
+    "username",
+    "sale_date",
+    "country_id",
+    "product_id",
+    "quantity",
+    "unit_price",
+    "total_amount"
+)
+
+encoded_campaign_product_columns = (
+    "campaign_id",
+    "product_id"
+)
+
+encoded_sales_column_types = ("string", "date", "int32", "int32", "int32", "float64", "float64")
 
-def str_time_prop(start, end, time_format, prop):
+encoded_campaign_product_column_types = ("string", "int32")
+
+# Dimension name: ((id column, text column), values)
+dimensions = {
+    "countries": (("country_id", "country"), allowed_countries),
+    "products": (("product_id", "product"), allowed_products),
+    "comments": (("comment_id", "comment"), allowed_comments),
+}
+
+dimension_column_types = ("int32", "string")
+
+
+@functools.lru_cache(maxsize=16)
+def date_sampler_for(start, end):
     """
-    Get a time at a proportion of a range of two formatted times.
+    Get the date sampler of a range, parsed once and cached
 
     :param start: start of the interval
     :param end: end of the interval
-    :param time_format: format of date
-    :param prop: proportion of time between end and start
-    :return: return a random date between start and end, the returned time will be in the specified format
+    :return: DateSampler
     """
-    stime = time.mktime(time.strptime(start, time_format))
-    etime = time.mktime(time.strptime(end, time_format))
-
-    ptime = stime + prop * (etime - stime)
-
-    return time.strftime(time_format, time.localtime(ptime))
+    return DateSampler(start, end)
 
 
-def random_date(start, end, prop):
+def random_date(start, end, prop = None, rng = None):
     """
-    Get a time at a proportion of a range of two formatted times.
+    Get a day at a proportion of a range of two days.
 
     :param start: start of the interval
     :param end: end of the interval
-    :param prop: proportion of time between end and start
+    :param prop: proportion of time between end and start, drawn with rng if None
+    :param rng: random.Random drawing the proportion, global random module if None
     :return: return a random date between start and end
     """
-    return str_time_prop(start, end, '%Y-%m-%d', prop)
+    if prop is None:
+        prop = (rng or random).random()
+    return date_sampler_for(start, end).date_at_proportion(prop)
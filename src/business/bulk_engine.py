@@ -0,0 +1,219 @@
+"""
+Bulk random generation, used by manual generation mode.
+Each column of a block of rows is drawn in a single call, with NumPy when installed
+and with random.choices stored in arrays otherwise.
+"""
+
+import random
+from array import array
+
+from business import allowed_comments, allowed_countries, allowed_products
+from business.dates import default_date_sampler
+from business.records import Feedback, Sale
+from metrics.metrics import records_generated, stage_seconds
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Number of rows drawn at once, from the same random stream
+DEFAULT_BLOCK_SIZE = 65536
+
+# Value ranges, same bounds as the row by row generators
+USER_NUMBER_RANGE = (1, 4999)
+CAMPAIGN_NUMBER_RANGE = (1, 999)
+QUANTITY_RANGE = (1, 999)
+# Unit price is drawn in cents, from 1.00 to 200.00
+UNIT_PRICE_CENTS_RANGE = (100, 20000)
+
+# Lookup tables, strings are built once and picked by index
+usernames = [f"user_{number}" for number in range(USER_NUMBER_RANGE[1] + 1)]
+campaign_ids = [f"CAMP{number}" for number in range(CAMPAIGN_NUMBER_RANGE[1] + 1)]
+
+
+def draw_seed():
+    """
+    Draw a seed for a run without configured seed, logging it allows to generate the same data again
+
+    :return: positive integer
+    """
+    return random.SystemRandom().randrange(2 ** 63)
+
+
+def new_rng(seed = None, stream = 0):
+    """
+    Build a random generator, independent streams of a same seed do not overlap
+
+    :param seed: positive integer, None for an unpredictable generator
+    :param stream: stream number, one per block
+    :return: numpy Generator or random.Random, depending on NumPy availability
+    """
+    if numpy is not None:
+        return numpy.random.default_rng(None if seed is None else [stream, seed])
+    return random.Random(None if seed is None else f"{seed}:{stream}")
+
+
+def draw_integers(low, high, size, rng = None):
+    """
+    Draw a column of uniformly distributed integers
+
+    :param low: lowest value (included)
+    :param high: highest value (included)
+    :param size: number of values to draw
+    :param rng: numpy Generator or random.Random, depending on NumPy availability
+    :return: sequence of integers
+    """
+    if numpy is not None:
+        rng = rng or numpy.random.default_rng()
+        return rng.integers(low, high + 1, size=size).tolist()
+    rng = rng or random
+    return array("l", rng.choices(range(low, high + 1), k=size))
+
+
+def draw_sales_block(size, date_sampler = None, rng = None):
+    """
+    Draw a block of random sales
+
+    :param size: number of rows to draw
+    :param date_sampler: DateSampler used for dates, default range if None
+    :param rng: numpy Generator or random.Random, depending on NumPy availability
+    :return: list of Sale
+    """
+    user_numbers = draw_integers(*USER_NUMBER_RANGE, size, rng)
+    date_sampler = date_sampler or default_date_sampler()
+    date_offsets = date_sampler.sample_offsets(size, rng)
+    country_indexes = draw_integers(0, len(allowed_countries) - 1, size, rng)
+    product_indexes = draw_integers(0, len(allowed_products) - 1, size, rng)
+    quantities = draw_integers(*QUANTITY_RANGE, size, rng)
+    unit_prices_cents = draw_integers(*UNIT_PRICE_CENTS_RANGE, size, rng)
+    campaign_numbers = draw_integers(*CAMPAIGN_NUMBER_RANGE, size, rng)
+
+    records_generated.inc(size, "sale", "manual")
+    return [
+        Sale(
+            usernames[user_number],
+            date_sampler.dates[date_offset],
+            country_index,
+            product_index,
+            quantity,
+            unit_price_cents,
+            campaign_ids[campaign_number]
+        )
+        for user_number, date_offset, country_index, product_index, quantity, unit_price_cents, campaign_number in zip(
+            user_numbers, date_offsets, country_indexes, product_indexes, quantities, unit_prices_cents,
+            campaign_numbers
+        )
+    ]
+
+
+def draw_feedback_block(size, date_sampler = None, rng = None):
+    """
+    Draw a block of random feedbacks
+
+    :param size: number of feedbacks to draw
+    :param date_sampler: DateSampler used for dates, default range if None
+    :param rng: numpy Generator or random.Random, depending on NumPy availability
+    :return: list of Feedback
+    """
+    user_numbers = draw_integers(*USER_NUMBER_RANGE, size, rng)
+    date_sampler = date_sampler or default_date_sampler()
+    date_offsets = date_sampler.sample_offsets(size, rng)
+    campaign_numbers = draw_integers(*CAMPAIGN_NUMBER_RANGE, size, rng)
+    comment_indexes = draw_integers(0, len(allowed_comments) - 1, size, rng)
+
+    records_generated.inc(size, "feedback", "manual")
+    return [
+        Feedback(usernames[user_number], date_sampler.dates[date_offset], campaign_ids[campaign_number], comment_index)
+        for user_number, date_offset, campaign_number, comment_index in zip(
+            user_numbers, date_offsets, campaign_numbers, comment_indexes
+        )
+    ]
+
+
+def rebatch(blocks, batch_size):
+    """
+    Regroup blocks of items in batches of another size
+
+    :param blocks: iterable of blocks (list)
+    :param batch_size: number of items per batch
+    :return: generator of batches (list), the last one can be smaller
+    """
+    pending = []
+    for block in blocks:
+        pending = pending + block if pending else block
+        start = 0
+        while len(pending) - start >= batch_size:
+            yield pending[start:start + batch_size]
+            start = start + batch_size
+        pending = pending[start:]
+    if pending:
+        yield pending
+
+
+def iter_blocks(
+        count,
+        draw_block,
+        batch_size = DEFAULT_BLOCK_SIZE,
+        date_sampler = None,
+        seed = None,
+        first_block = 0
+):
+    """
+    Draw `count` items block by block.
+    Block number k is always DEFAULT_BLOCK_SIZE items drawn from the random stream (seed, k), then blocks are
+    regrouped in batches: for a given seed, items only depend on their position, not on the batch size
+    or on how blocks are shared between workers.
+
+    :param count: number of items to draw, None for an endless generation
+    :param draw_block: block drawing function (draw_sales_block, draw_feedback_block)
+    :param batch_size: number of items per returned batch
+    :param date_sampler: DateSampler used for dates, default range if None
+    :param seed: seed of the generation, None for unpredictable items
+    :param first_block: number of the first block, to continue the items of another worker
+    :return: generator of batches (list)
+    """
+    def draw_blocks():
+        remaining = count
+        block_number = first_block
+        while remaining is None or remaining > 0:
+            size = DEFAULT_BLOCK_SIZE if remaining is None else min(DEFAULT_BLOCK_SIZE, remaining)
+            with stage_seconds.time("generation"):
+                block = draw_block(size, date_sampler, new_rng(seed, block_number))
+            yield block
+            if remaining is not None:
+                remaining = remaining - size
+            block_number = block_number + 1
+
+    if batch_size == DEFAULT_BLOCK_SIZE:
+        return draw_blocks()
+    return rebatch(draw_blocks(), batch_size)
+
+
+def iter_bulk_sales(lines_to_create, date_sampler = None, seed = None, first_block = 0):
+    """
+    Lazily generate random sales, drawn block by block
+
+    :param lines_to_create: number of lines to create
+    :param date_sampler: DateSampler used for sale dates, default range if None
+    :param seed: seed of the generation, None for unpredictable lines
+    :param first_block: number of the first block, see iter_blocks
+    :return: generator of Sale
+    """
+    for block in iter_blocks(lines_to_create, draw_sales_block, DEFAULT_BLOCK_SIZE, date_sampler, seed, first_block):
+        yield from block
+
+
+def generate_bulk_feedback(feedbacks_to_push, date_sampler = None, seed = None):
+    """
+    Generate random feedbacks, drawn block by block
+
+    :param feedbacks_to_push: number of feedbacks to generate
+    :param date_sampler: DateSampler used for feedback dates, default range if None
+    :param seed: seed of the generation, None for unpredictable feedbacks
+    :return: list of Feedback
+    """
+    payload = []
+    for block in iter_blocks(feedbacks_to_push, draw_feedback_block, DEFAULT_BLOCK_SIZE, date_sampler, seed):
+        payload.extend(block)
+    return payload
@@ -0,0 +1,135 @@
+"""
+Date sampling, the date range is parsed once and every day is precomputed.
+NumPy and the sampler of the default range are only loaded on first use.
+"""
+
+import datetime
+import functools
+import itertools
+import math
+import random
+
+from conf.dates import DATE_DISTRIBUTIONS, DEFAULT_DATE_END, DEFAULT_DATE_START, parse_date
+from libraries.libraries import load_module
+
+# Weekday weights, from Monday to Sunday
+WEEKDAY_WEIGHTS = (1.0, 1.0, 1.0, 1.0, 1.0, 0.4, 0.4)
+
+# Seasonal weights: peak at PEAK_DAY_OF_YEAR, lowest six months later
+SEASONAL_PEAK_DAY_OF_YEAR = 350
+SEASONAL_AMPLITUDE = 0.5
+
+
+def day_weight(day, distribution):
+    """
+    Compute the relative weight of a day for a distribution
+
+    :param day: datetime.date
+    :param distribution: one of DATE_DISTRIBUTIONS
+    :return: weight of the day
+    """
+    match distribution:
+        case "uniform":
+            return 1.0
+        case "weekday":
+            return WEEKDAY_WEIGHTS[day.weekday()]
+        case "seasonal":
+            angle = 2 * math.pi * (day.timetuple().tm_yday - SEASONAL_PEAK_DAY_OF_YEAR) / 365.25
+            return 1.0 + SEASONAL_AMPLITUDE * math.cos(angle)
+        case _:
+            raise ValueError(f"Unknown date distribution: {distribution}, expected one of {DATE_DISTRIBUTIONS}")
+
+
+class DateSampler:
+    """
+    Random dates between two days (both included).
+    Days are precomputed as YYYY-MM-DD strings and picked by integer offset.
+    """
+
+    def __init__(self, start = DEFAULT_DATE_START, end = DEFAULT_DATE_END, distribution = "uniform"):
+        """
+        :param start: first day, format YYYY-MM-DD
+        :param end: last day, format YYYY-MM-DD
+        :param distribution: one of DATE_DISTRIBUTIONS
+        """
+        first_day = parse_date(start)
+        last_day = parse_date(end)
+        if last_day < first_day:
+            raise ValueError(f"Invalid date range: {start} is after {end}")
+
+        days = [first_day + datetime.timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+
+        self.start = first_day
+        self.end = last_day
+        self.distribution = distribution
+        self.dates = [day.isoformat() for day in days]
+
+        # Uniform distribution does not need weights, offsets are drawn directly
+        if distribution == "uniform":
+            self.cum_weights = None
+            self.probabilities = None
+        else:
+            weights = [day_weight(day, distribution) for day in days]
+            total = sum(weights)
+            self.cum_weights = list(itertools.accumulate(weights))
+            self.probabilities = [weight / total for weight in weights]
+
+    def __len__(self):
+        return len(self.dates)
+
+    def date_at(self, offset):
+        """
+        Get a day by its offset from the start of the range
+
+        :param offset: number of days since the start of the range
+        :return: day formatted as YYYY-MM-DD
+        """
+        return self.dates[offset]
+
+    def date_at_proportion(self, prop):
+        """
+        Get a day at a proportion of the range, ignoring the distribution
+
+        :param prop: proportion between 0 (included) and 1 (excluded)
+        :return: day formatted as YYYY-MM-DD
+        """
+        return self.dates[min(int(prop * len(self.dates)), len(self.dates) - 1)]
+
+    def sample(self, rng = random):
+        """
+        Draw one day following the distribution
+
+        :param rng: random.Random instance or the random module
+        :return: day formatted as YYYY-MM-DD
+        """
+        if self.cum_weights is None:
+            return self.dates[rng.randrange(len(self.dates))]
+        return rng.choices(self.dates, cum_weights=self.cum_weights)[0]
+
+    def sample_offsets(self, size, rng = None):
+        """
+        Draw a column of day offsets following the distribution
+
+        :param size: number of offsets to draw
+        :param rng: numpy Generator when NumPy is installed, random.Random otherwise
+        :return: sequence of offsets
+        """
+        count = len(self.dates)
+        numpy = load_module("numpy")
+        if numpy is not None:
+            rng = rng or numpy.random.default_rng()
+            if self.probabilities is None:
+                return rng.integers(0, count, size=size).tolist()
+            return rng.choice(count, size=size, p=self.probabilities).tolist()
+        rng = rng or random
+        return rng.choices(range(count), cum_weights=self.cum_weights, k=size)
+
+
+@functools.cache
+def default_date_sampler():
+    """
+    Sampler of the default date range, built once on first use
+
+    :return: DateSampler
+    """
+    return DateSampler()
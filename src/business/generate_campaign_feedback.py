@@ -2,78 +2,80 @@
 Data Generation management
 """
 
-import json
 import logging
 import random
 
-import urllib.request
-import urllib.error
+from business import allowed_comments
+from business.dates import DEFAULT_DATE_END, DEFAULT_DATE_START, default_date_sampler
+from business.records import Feedback
+from business.ollama_client import DEFAULT_SHARD_SIZE, iter_via_ollama
+from logs.logs import DebugSampler, debug_enabled
+from metrics.metrics import records_generated
 
-from business import allowed_comments, random_date
+# Per item debug lines, 1 item in N is logged
+item_debug = DebugSampler()
 
 
 def generate_random_feedback(
     feedbacks_to_push,
-    payload
+    payload,
+    date_sampler = None,
+    rng = None
 ):
     """
     Generate random feedbacks
 
     :param feedbacks_to_push: number of feedbacks to push
     :param payload: existing payload
+    :param date_sampler: DateSampler used for feedback dates, default range if None
+    :param rng: random.Random driving the generation, global random module if None
     :return: returns the payload given with the number of feedbacks to push appended
     """
+    rng = rng or random
+    date_sampler = date_sampler or default_date_sampler()
+    debug = debug_enabled()
     i = 0
     while i < feedbacks_to_push:
         # Get random values to add to payload
-        user_number = random.randint(1, 4999)
-        campaign_date = random_date("2024-1-1", "2026-12-31", random.random())
-        campaign_number = random.randint(1, 999)
+        user_number = rng.randint(1, 4999)
+        campaign_date = date_sampler.sample(rng)
+        campaign_number = rng.randint(1, 999)
 
         # Determine random comment
-        comment_number = random.randint(1, len(allowed_comments))
-        comment = allowed_comments[comment_number-1]
-        logging.debug(f"Random comment number: {comment_number}, comment: {comment}")
-
-        # Build JSON to add to payload
-        item_to_add = {
-            "username": f"user_{user_number}",
-            "feedback_date": f"{campaign_date}",
-            "campaign_id": f"CAMP{campaign_number}",
-            "comment": f"{comment}"
-        }
+        comment_number = rng.randint(1, len(allowed_comments))
+
+        # Build feedback to add to payload, the comment is kept as its index
+        item_to_add = Feedback(f"user_{user_number}", campaign_date, f"CAMP{campaign_number}", comment_number - 1)
 
-        logging.debug(f"Manual generation, item: {item_to_add}")
+        if debug:
+            item_debug.debug("Manual generation, item: %s, comment: %s", item_to_add, item_to_add.comment)
 
         # Append JSON to payload
         payload.append(item_to_add)
         i = i + 1
 
+    records_generated.inc(i, "feedback", "manual")
     return payload
 
 
-def generate_feedback_via_ollama(
+def build_feedback_ollama_payload(
         count,
-        model = "llama3.2",
-        host = "127.0.0.1:11434",
-        temperature = 0.7,
-        timeout = 30,
+        model,
+        temperature,
+        date_start = DEFAULT_DATE_START,
+        date_end = DEFAULT_DATE_END
 ):
     """
-    Generate `count` feedback objects thru Ollama API, setting a
+    Build the Ollama request generating `count` feedback objects, setting a
     JSON schema (objects array) and deactivating streaming.
 
     :param count: number of entry to generate
     :param model: model name (ex. 'llama3.2', 'mistral', etc.)
-    :param host: Ollama base URL (ex. '127.0.0.1:11434')
     :param temperature: model creativity
-    :param timeout: timeout HTTP in seconds
-    :return: objects list (dict) at asked model
+    :param date_start: first day of the feedback dates (YYYY-MM-DD)
+    :param date_end: last day of the feedback dates (YYYY-MM-DD)
+    :return: Ollama request payload
     """
-
-    if count <= 0:
-        return []
-
     # JSON Schema forced for output (Ollama "format": JSON schema)
     schema = {
         "type": "array",
@@ -111,15 +113,17 @@ def generate_feedback_via_ollama(
 Generate {count} distinct feedback objects as a JSON array.
 Rules:
 - "username": random usernames like in social network, no obsene name.
-- "feedback_date": valid date "YYYY-MM-DD" in the year 2024, 2025 and 2026.
+- "feedback_date": valid date "YYYY-MM-DD" between {date_start} and {date_end}, both included.
 - "campaign_id": "CAMP" followed by three digits (e.g. CAMP147).
 - "comment": choose a random number between 1 and {len(allowed_comments)}
 Ensure all items are valid and diverse. Return only JSON.
 """
 
-    url = f"http://{host}/api/generate"  # Ollama endpoint for generation (https://docs.ollama.com/api/generate)
+    logging.debug("Schema: %s", schema)
+    logging.debug("System Prompt: %s", system_prompt)
+    logging.debug("User Prompt: %s", user_prompt)
 
-    ollama_payload = {
+    return {
         "model": model,
         "prompt": f"{system_prompt}\n\n{user_prompt}",
         "format": schema,
@@ -130,57 +134,107 @@ Ensure all items are valid and diverse. Return only JSON.
         }
     }
 
-    logging.debug(f"Schema: {schema}")
-    logging.debug(f"System Prompt: {system_prompt}")
-    logging.debug(f"User Prompt: {user_prompt}")
-    logging.debug(f"URL: {url}")
-    logging.debug(f"Payload: {ollama_payload}")
-
-    # HTTP call
-    try:
-        headers = {"Content-Type": "application/json"}
-        method = "POST"
-        logging.debug(f"data: {json.dumps(ollama_payload).encode("utf-8")}")
-        logging.debug(f"data: {headers}")
-        logging.debug(f"data: {method}")
-        req = urllib.request.Request(
-            url=url,
-            data=json.dumps(ollama_payload).encode("utf-8"),
-            headers=headers,
-            method=method
-        )
-        with urllib.request.urlopen(req, timeout=timeout) as r:
-            raw = r.read().decode("utf-8")
-            data = json.loads(raw)
-            logging.debug(f"Raw: {raw}")
-            logging.debug(f"Data: {data}")
-    except Exception as e:
-        logging.error(f"Ollama call error: {e}")
-        raise RuntimeError(f"Ollama call error: {e}")
-
-    # Parsing ollama answer
-    # Key 'response' can contain JSON string or an already parsed object
-    response = data.get("response")
-    if isinstance(response, str):
-        try:
-            items = json.loads(response)
-        except Exception as e:
-            logging.error(f"Non JSON Response: {e}\nContent: {response[:200]}...")
-            raise ValueError(f"Non JSON Response: {e}\nContent: {response[:200]}...")
-    else:
-        items = response
-
-    logging.debug(f"Ollama answer: {items}")
-
-    result = []
+
+def feedback_from_ollama_item(item):
+    """
+    Build a feedback from an item generated by Ollama
+
+    :param item: generated item (dict)
+    :return: Feedback
+    """
+    return Feedback(
+        f"{item['username']}",
+        f"{item['feedback_date']}",
+        f"{item['campaign_id']}",
+        int(item['comment']) % len(allowed_comments)
+    )
+
+
+def iter_feedback_via_ollama(
+        count,
+        model = "llama3.2",
+        host = "127.0.0.1:11434",
+        temperature = 0.7,
+        timeout = 30,
+        shard_size = DEFAULT_SHARD_SIZE,
+        max_workers = 1,
+        shard_retries = 0,
+        stream = False,
+        cache = None,
+        date_start = DEFAULT_DATE_START,
+        date_end = DEFAULT_DATE_END
+):
+    """
+    Generate `count` feedback objects thru Ollama API, returned as soon as they are received.
+    Generation is split in shards of `shard_size` objects sent concurrently to the hosts.
+
+    :param count: number of entry to generate
+    :param model: model name (ex. 'llama3.2', 'mistral', etc.)
+    :param host: Ollama base URL (ex. '127.0.0.1:11434'), comma separated URLs or list of URLs
+    :param temperature: model creativity
+    :param timeout: timeout HTTP in seconds, per shard
+    :param shard_size: maximum number of objects asked in one call
+    :param max_workers: number of calls sent at the same time
+    :param shard_retries: number of times a failed shard is sent again
+    :param stream: stream Ollama answers, objects are returned while the model generates
+    :param cache: OllamaCache serving and storing generated objects, no cache if None
+    :param date_start: first day of the feedback dates (YYYY-MM-DD)
+    :param date_end: last day of the feedback dates (YYYY-MM-DD)
+    :return: generator of Feedback
+    """
+    items = iter_via_ollama(
+        count=count,
+        build_payload=lambda shard_count: build_feedback_ollama_payload(
+            shard_count, model, temperature, date_start, date_end
+        ),
+        host=host,
+        timeout=timeout,
+        shard_size=shard_size,
+        max_workers=max_workers,
+        shard_retries=shard_retries,
+        stream=stream,
+        cache=cache
+    )
+
+    debug = debug_enabled()
     for item in items:
-        result_to_add = {
-            "username": f"{item['username']}",
-            "feedback_date": f"{item['feedback_date']}",
-            "campaign_id": f"{item['campaign_id']}",
-            "comment": f"{allowed_comments[int(item['comment']) % len(allowed_comments)]}"
-        }
-        logging.debug(f"Ollama response item: {result_to_add}")
-        result.append(result_to_add)
+        result_to_add = feedback_from_ollama_item(item)
+        if debug:
+            item_debug.debug("Ollama response item: %s", result_to_add)
+        records_generated.inc(1, "feedback", "ollama")
+        yield result_to_add
+
 
-    return result
+def generate_feedback_via_ollama(
+        count,
+        model = "llama3.2",
+        host = "127.0.0.1:11434",
+        temperature = 0.7,
+        timeout = 30,
+        shard_size = DEFAULT_SHARD_SIZE,
+        max_workers = 1,
+        shard_retries = 0,
+        stream = False,
+        cache = None,
+        date_start = DEFAULT_DATE_START,
+        date_end = DEFAULT_DATE_END
+):
+    """
+    Generate `count` feedback objects thru Ollama API, see iter_feedback_via_ollama
+
+    :return: list of Feedback at asked model
+    """
+    return list(iter_feedback_via_ollama(
+        count=count,
+        model=model,
+        host=host,
+        temperature=temperature,
+        timeout=timeout,
+        shard_size=shard_size,
+        max_workers=max_workers,
+        shard_retries=shard_retries,
+        stream=stream,
+        cache=cache,
+        date_start=date_start,
+        date_end=date_end
+    ))
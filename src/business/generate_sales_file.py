@@ -2,94 +2,131 @@
 Data Generation management
 """
 
-import json
+import csv
+import io
 import logging
 import random
 
-import urllib.request
-import urllib.error
+from business import allowed_countries, allowed_products
+from business.dates import DEFAULT_DATE_END, DEFAULT_DATE_START, default_date_sampler
+from business.records import Sale
+from business.ollama_client import DEFAULT_SHARD_SIZE, iter_via_ollama
+from logs.logs import DebugSampler, debug_enabled
+from metrics.metrics import records_generated
 
-from business import allowed_comments, random_date, allowed_countries, allowed_products
+# Per row debug lines, 1 row in N is logged
+row_debug = DebugSampler()
 
 
-def generate_random_sales(
-    lines_to_create,
-    already_existing_sales,
-    already_existing_campaign_product,
-):
+def iter_random_sales(lines_to_create, date_sampler = None, rng = None):
     """
-    Generate random sales
+    Lazily generate random sales
 
     :param lines_to_create: number of lines to create
-    :param already_existing_sales: existing lines for sales
-    :param already_existing_campaign_product: existing lines for campaign / product mapping
-    :return: returns the lines given with the number of sales appended
+    :param date_sampler: DateSampler used for sale dates, default range if None
+    :param rng: random.Random driving the generation, global random module if None
+    :return: generator of Sale
     """
-    result_sales = already_existing_sales
-    result_campaign_product = already_existing_campaign_product
+    rng = rng or random
+    date_sampler = date_sampler or default_date_sampler()
+    debug = debug_enabled()
     i = 0
     while i < lines_to_create:
         # Get random values to add to lines
-        user_number = random.randint(1, 4999)
-        sale_date = random_date("2024-1-1", "2026-12-31", random.random())
-        quantity = random.randint(1, 999)
-        unit_price = round(random.uniform(1.00, 200.00), 2)
-        total_amount = round(quantity * unit_price, 2)
+        user_number = rng.randint(1, 4999)
+        sale_date = date_sampler.sample(rng)
+        quantity = rng.randint(1, 999)
+        unit_price_cents = round(rng.uniform(1.00, 200.00) * 100)
 
-        campaign_number = random.randint(1, 999)
+        campaign_number = rng.randint(1, 999)
 
-        # Determine random country
-        country_number = random.randint(1, len(allowed_countries))
-        country = allowed_countries[country_number-1]
-        logging.debug(f"Random country number: {country_number}, country: {country}")
+        # Determine random country and product
+        country_number = rng.randint(1, len(allowed_countries))
+        product_number = rng.randint(1, len(allowed_products))
 
-        # Determine random product
-        product_number = random.randint(1, len(allowed_products))
-        product = allowed_products[product_number-1]
-        logging.debug(f"Random product number: {product_number}, product: {product}")
-
-        # Build line to add
-        line_to_add_sales = f"user_{user_number},{sale_date},{country},{product},{quantity},{unit_price},{total_amount}\n"
-        line_to_add_campaign_product = f"CAMP{campaign_number},{product}\n"
+        # Build sale to add, country and product are kept as their index
+        sale = Sale(
+            f"user_{user_number}",
+            sale_date,
+            country_number - 1,
+            product_number - 1,
+            quantity,
+            unit_price_cents,
+            f"CAMP{campaign_number}"
+        )
 
-        logging.debug(f"Manual generation, line: {line_to_add_sales} & {line_to_add_campaign_product}")
+        if debug:
+            row_debug.debug("Manual generation, line: %s, country: %s, product: %s", sale, sale.country, sale.product)
 
-        # Append JSON to payload
-        result_sales = result_sales + line_to_add_sales
-        result_campaign_product = result_campaign_product + line_to_add_campaign_product
+        yield sale
         i = i + 1
 
-    return result_sales, result_campaign_product
+    records_generated.inc(i, "sale", "manual")
 
-def generate_sales_via_ollama(
-        lines_to_create,
+
+def rows_to_csv(rows, already_existing_sales, already_existing_campaign_product):
+    """
+    Render generated sales as csv strings
+
+    :param rows: iterable of Sale
+    :param already_existing_sales: existing lines for sales
+    :param already_existing_campaign_product: existing lines for campaign / product mapping
+    :return: tuple of string containing the sales & campaign/product mapping
+    """
+    result_sales = io.StringIO(already_existing_sales)
+    result_sales.seek(0, io.SEEK_END)
+    result_campaign_product = io.StringIO(already_existing_campaign_product)
+    result_campaign_product.seek(0, io.SEEK_END)
+
+    writer_sales = csv.writer(result_sales, lineterminator="\n")
+    writer_campaign_product = csv.writer(result_campaign_product, lineterminator="\n")
+    for sale in rows:
+        writer_sales.writerow(sale.sales_row())
+        writer_campaign_product.writerow(sale.campaign_product_row())
+
+    return result_sales.getvalue(), result_campaign_product.getvalue()
+
+
+def generate_random_sales(
+    lines_to_create,
+    already_existing_sales,
+    already_existing_campaign_product,
+    rng = None
+):
+    """
+    Generate random sales
+
+    :param lines_to_create: number of lines to create
+    :param already_existing_sales: existing lines for sales
+    :param already_existing_campaign_product: existing lines for campaign / product mapping
+    :param rng: random.Random driving the generation, global random module if None
+    :return: returns the lines given with the number of sales appended
+    """
+    return rows_to_csv(
+        iter_random_sales(lines_to_create, rng=rng),
         already_existing_sales,
-        already_existing_campaign_product,
-        model = "llama3.2",
-        host = "127.0.0.1:11434",
-        temperature = 0.7,
-        timeout = 30
+        already_existing_campaign_product
+    )
+
+
+def build_sales_ollama_payload(
+        lines_to_create,
+        model,
+        temperature,
+        date_start = DEFAULT_DATE_START,
+        date_end = DEFAULT_DATE_END
 ):
     """
-    Generate `lines_to_create` sales objects thru Ollama API, setting a
+    Build the Ollama request generating `lines_to_create` sales objects, setting a
     JSON schema (objects array) and deactivating streaming.
-    JSON is transformed to a csv file as a result for sales and campaign/product mapping
 
     :param lines_to_create: number of lines to generate
-    :param already_existing_sales: existing lines for sales
-    :param already_existing_campaign_product: existing lines for campaign / product mapping
     :param model: model name (ex. 'llama3.2', 'mistral', etc.)
-    :param host: Ollama base URL (ex. '127.0.0.1:11434')
     :param temperature: model creativity
-    :param timeout: timeout HTTP in seconds
-    :return: tuple of string containing the sales & campaign/product mapping
+    :param date_start: first day of the sale dates (YYYY-MM-DD)
+    :param date_end: last day of the sale dates (YYYY-MM-DD)
+    :return: Ollama request payload
     """
-    result_sales = already_existing_sales
-    result_campaign_product = already_existing_campaign_product
-
-    if lines_to_create <= 0:
-        return []
-
     # JSON Schema forced for output (Ollama "format": JSON schema)
     schema = {
         "type": "array",
@@ -139,7 +176,7 @@ def generate_sales_via_ollama(
 Generate {lines_to_create} distinct sales as a JSON array.
 Rules:
 - "username": random usernames like in social network, no obsene name.
-- "sale_date": valid date "YYYY-MM-DD" in the year 2024, 2025 and 2026.
+- "sale_date": valid date "YYYY-MM-DD" between {date_start} and {date_end}, both included.
 - "campaign_id": "CAMP" followed by three digits (e.g. CAMP147).
 - "product_id": choose a random number between 1 and {len(allowed_products)}
 - "country_id": choose a random number between 1 and {len(allowed_countries)}
@@ -149,9 +186,11 @@ Rules:
 Ensure all items are valid and diverse. Return only JSON.
 """
 
-    url = f"http://{host}/api/generate"  # Ollama endpoint for generation (https://docs.ollama.com/api/generate)
+    logging.debug("Schema: %s", schema)
+    logging.debug("System Prompt: %s", system_prompt)
+    logging.debug("User Prompt: %s", user_prompt)
 
-    ollama_payload = {
+    return {
         "model": model,
         "prompt": f"{system_prompt}\n\n{user_prompt}",
         "format": schema,
@@ -162,65 +201,125 @@ Ensure all items are valid and diverse. Return only JSON.
         }
     }
 
-    logging.debug(f"Schema: {schema}")
-    logging.debug(f"System Prompt: {system_prompt}")
-    logging.debug(f"User Prompt: {user_prompt}")
-    logging.debug(f"URL: {url}")
-    logging.debug(f"Payload: {ollama_payload}")
-
-    # HTTP call
-    try:
-        headers = {"Content-Type": "application/json"}
-        method = "POST"
-        logging.debug(f"data: {json.dumps(ollama_payload).encode("utf-8")}")
-        logging.debug(f"data: {headers}")
-        logging.debug(f"data: {method}")
-        req = urllib.request.Request(
-            url=url,
-            data=json.dumps(ollama_payload).encode("utf-8"),
-            headers=headers,
-            method=method
-        )
-        with urllib.request.urlopen(req, timeout=timeout) as r:
-            raw = r.read().decode("utf-8")
-            data = json.loads(raw)
-            logging.debug(f"Raw: {raw}")
-            logging.debug(f"Data: {data}")
-    except Exception as e:
-        logging.error(f"Ollama call error: {e}")
-        raise RuntimeError(f"Ollama call error: {e}")
-
-    # Parsing ollama answer
-    # Key 'response' can contain JSON string or an already parsed object
-    response = data.get("response")
-    if isinstance(response, str):
-        try:
-            items = json.loads(response)
-        except Exception as e:
-            logging.error(f"Non JSON Response: {e}\nContent: {response[:200]}...")
-            raise ValueError(f"Non JSON Response: {e}\nContent: {response[:200]}...")
-    else:
-        items = response
-
-    logging.debug(f"Ollama answer: {items}")
 
-    for item in items:
-        user_number = item['username']
-        sale_date = item['sale_date']
-        campaign_number = item['campaign_id']
-        country = allowed_countries[int(item['country_id']) % len(allowed_countries)]
-        product = allowed_products[int(item['product_id']) % len(allowed_products)]
-        quantity = item['quantity']
-        unit_price = round(item['unit_price_part1'] + (item['unit_price_part2']/100),2)
-        total_amount = round(quantity * unit_price,2)
+def sale_from_ollama_item(item):
+    """
+    Build a sale from an item generated by Ollama
+
+    :param item: generated item (dict)
+    :return: Sale
+    """
+    return Sale(
+        f"user_{item['username']}",
+        item['sale_date'],
+        int(item['country_id']) % len(allowed_countries),
+        int(item['product_id']) % len(allowed_products),
+        item['quantity'],
+        item['unit_price_part1'] * 100 + item['unit_price_part2'],
+        item['campaign_id']
+    )
+
+
+def iter_sales_via_ollama(
+        lines_to_create,
+        model = "llama3.2",
+        host = "127.0.0.1:11434",
+        temperature = 0.7,
+        timeout = 30,
+        shard_size = DEFAULT_SHARD_SIZE,
+        max_workers = 1,
+        shard_retries = 0,
+        stream = False,
+        cache = None,
+        date_start = DEFAULT_DATE_START,
+        date_end = DEFAULT_DATE_END
+):
+    """
+    Generate `lines_to_create` sales objects thru Ollama API.
+    Generation is split in shards of `shard_size` objects sent concurrently to the hosts.
+    JSON items are transformed to sales as soon as they are received
+
+    :param lines_to_create: number of lines to generate
+    :param model: model name (ex. 'llama3.2', 'mistral', etc.)
+    :param host: Ollama base URL (ex. '127.0.0.1:11434'), comma separated URLs or list of URLs
+    :param temperature: model creativity
+    :param timeout: timeout HTTP in seconds, per shard
+    :param shard_size: maximum number of objects asked in one call
+    :param max_workers: number of calls sent at the same time
+    :param shard_retries: number of times a failed shard is sent again
+    :param stream: stream Ollama answers, rows are returned while the model generates
+    :param cache: OllamaCache serving and storing generated objects, no cache if None
+    :param date_start: first day of the sale dates (YYYY-MM-DD)
+    :param date_end: last day of the sale dates (YYYY-MM-DD)
+    :return: generator of Sale
+    """
+    items = iter_via_ollama(
+        count=lines_to_create,
+        build_payload=lambda shard_count: build_sales_ollama_payload(
+            shard_count, model, temperature, date_start, date_end
+        ),
+        host=host,
+        timeout=timeout,
+        shard_size=shard_size,
+        max_workers=max_workers,
+        shard_retries=shard_retries,
+        stream=stream,
+        cache=cache
+    )
 
-        # Build lines to add
-        line_to_add_sales = f"user_{user_number},{sale_date},{country},{product},{quantity},{unit_price},{total_amount}\n"
-        line_to_add_campaign_product = f"{campaign_number},{product}\n"
+    debug = debug_enabled()
+    for item in items:
+        sale = sale_from_ollama_item(item)
+        if debug:
+            row_debug.debug("Ollama response line: %s", sale)
+        records_generated.inc(1, "sale", "ollama")
+        yield sale
 
-        logging.debug(f"Ollama response line: {line_to_add_sales} & {line_to_add_campaign_product}")
 
-        result_sales = result_sales + line_to_add_sales
-        result_campaign_product = result_campaign_product + line_to_add_campaign_product
+def generate_sales_via_ollama(
+        lines_to_create,
+        already_existing_sales,
+        already_existing_campaign_product,
+        model = "llama3.2",
+        host = "127.0.0.1:11434",
+        temperature = 0.7,
+        timeout = 30,
+        shard_size = DEFAULT_SHARD_SIZE,
+        max_workers = 1,
+        shard_retries = 0,
+        date_start = DEFAULT_DATE_START,
+        date_end = DEFAULT_DATE_END
+):
+    """
+    Generate `lines_to_create` sales thru Ollama API as csv strings
 
-    return result_sales, result_campaign_product
+    :param lines_to_create: number of lines to generate
+    :param already_existing_sales: existing lines for sales
+    :param already_existing_campaign_product: existing lines for campaign / product mapping
+    :param model: model name (ex. 'llama3.2', 'mistral', etc.)
+    :param host: Ollama base URL (ex. '127.0.0.1:11434'), comma separated URLs or list of URLs
+    :param temperature: model creativity
+    :param timeout: timeout HTTP in seconds, per shard
+    :param shard_size: maximum number of objects asked in one call
+    :param max_workers: number of calls sent at the same time
+    :param shard_retries: number of times a failed shard is sent again
+    :param date_start: first day of the sale dates (YYYY-MM-DD)
+    :param date_end: last day of the sale dates (YYYY-MM-DD)
+    :return: tuple of string containing the sales & campaign/product mapping
+    """
+    return rows_to_csv(
+        iter_sales_via_ollama(
+            lines_to_create=lines_to_create,
+            model=model,
+            host=host,
+            temperature=temperature,
+            timeout=timeout,
+            shard_size=shard_size,
+            max_workers=max_workers,
+            shard_retries=shard_retries,
+            date_start=date_start,
+            date_end=date_end
+        ),
+        already_existing_sales,
+        already_existing_campaign_product
+    )
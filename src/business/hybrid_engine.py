@@ -0,0 +1,177 @@
+"""
+Hybrid generation, used by hybrid generation mode.
+A small seed pool is generated by Ollama, rows are then built locally by recombining
+the fields of the pool, with jitter on dates, quantities and prices.
+"""
+
+import bisect
+import random
+
+from business.bulk_engine import DEFAULT_BLOCK_SIZE, QUANTITY_RANGE, UNIT_PRICE_CENTS_RANGE, rebatch
+from business.dates import default_date_sampler, parse_date
+from business.records import Feedback, Sale
+from metrics.metrics import records_generated, stage_seconds
+
+# Default jitter: +/- days on dates, +/- proportion on quantities and prices
+DEFAULT_DATE_JITTER_DAYS = 15
+DEFAULT_VALUE_JITTER = 0.1
+
+
+def date_offsets_of(dates, date_sampler):
+    """
+    Get the offsets of seed dates in the date sampler range, invalid dates are dropped
+    and dates out of the range are moved to its nearest bound
+
+    :param dates: dates formatted as YYYY-MM-DD
+    :param date_sampler: DateSampler, default range if None
+    :return: list of offsets
+    """
+    offsets = []
+    for date in dates:
+        try:
+            day = parse_date(str(date)).isoformat()
+        except ValueError:
+            continue
+        offsets.append(min(bisect.bisect_left(date_sampler.dates, day), len(date_sampler) - 1))
+    return offsets or [0]
+
+
+def jitter_offsets(offsets, size, date_jitter_days, days, rng):
+    """
+    Draw date offsets from seed offsets, moved by up to `date_jitter_days` days
+
+    :param offsets: seed offsets
+    :param size: number of offsets to draw
+    :param date_jitter_days: maximum number of days added or removed
+    :param days: number of days in the range
+    :param rng: random.Random
+    :return: list of offsets in the range
+    """
+    return [
+        min(max(offset + rng.randint(-date_jitter_days, date_jitter_days), 0), days - 1)
+        for offset in rng.choices(offsets, k=size)
+    ]
+
+
+def iter_hybrid_feedback_blocks(
+        count,
+        seed_feedbacks,
+        block_size = DEFAULT_BLOCK_SIZE,
+        date_sampler = None,
+        date_jitter_days = DEFAULT_DATE_JITTER_DAYS,
+        rng = None
+):
+    """
+    Build `count` feedbacks block by block from a seed pool.
+    Usernames, campaigns and comments are drawn independently from the pool, dates are jittered.
+    Feedbacks are drawn by DEFAULT_BLOCK_SIZE whatever the block size, they only depend on the rng state.
+
+    :param count: number of feedbacks to build, None for an endless generation
+    :param seed_feedbacks: list of Feedback generated by Ollama
+    :param block_size: number of feedbacks per returned block
+    :param date_sampler: DateSampler, range of the jittered dates, default range if None
+    :param date_jitter_days: maximum number of days added or removed to seed dates
+    :param rng: random.Random
+    :return: generator of blocks (list of Feedback)
+    """
+    if not seed_feedbacks:
+        raise ValueError("Empty seed pool")
+    rng = rng or random.Random()
+
+    usernames = [feedback.username for feedback in seed_feedbacks]
+    campaign_ids = [feedback.campaign_id for feedback in seed_feedbacks]
+    comment_indexes = [feedback.comment_index for feedback in seed_feedbacks]
+    date_sampler = date_sampler or default_date_sampler()
+    offsets = date_offsets_of([feedback.feedback_date for feedback in seed_feedbacks], date_sampler)
+
+    def draw_blocks():
+        remaining = count
+        while remaining is None or remaining > 0:
+            size = DEFAULT_BLOCK_SIZE if remaining is None else min(DEFAULT_BLOCK_SIZE, remaining)
+            with stage_seconds.time("generation"):
+                block = [
+                    Feedback(username, date_sampler.dates[offset], campaign_id, comment_index)
+                    for username, offset, campaign_id, comment_index in zip(
+                        rng.choices(usernames, k=size),
+                        jitter_offsets(offsets, size, date_jitter_days, len(date_sampler), rng),
+                        rng.choices(campaign_ids, k=size),
+                        rng.choices(comment_indexes, k=size)
+                    )
+                ]
+            records_generated.inc(size, "feedback", "hybrid")
+            yield block
+            if remaining is not None:
+                remaining = remaining - size
+
+    return rebatch(draw_blocks(), block_size)
+
+
+def jitter_value(value, value_jitter, low, high, rng):
+    """
+    Move a value by up to +/- `value_jitter` of itself, kept between low and high
+
+    :return: jittered value (int)
+    """
+    return min(max(round(value * (1 + rng.uniform(-value_jitter, value_jitter))), low), high)
+
+
+def iter_hybrid_sales(
+        lines_to_create,
+        seed_rows,
+        block_size = DEFAULT_BLOCK_SIZE,
+        date_sampler = None,
+        date_jitter_days = DEFAULT_DATE_JITTER_DAYS,
+        value_jitter = DEFAULT_VALUE_JITTER,
+        rng = None
+):
+    """
+    Build `lines_to_create` sales from a seed pool.
+    Usernames, countries, campaign/product pairs, quantities and prices are drawn independently
+    from the pool, dates, quantities and prices are jittered.
+
+    :param lines_to_create: number of lines to build
+    :param seed_rows: list of Sale generated by Ollama
+    :param block_size: number of lines drawn at once
+    :param date_sampler: DateSampler, range of the jittered dates, default range if None
+    :param date_jitter_days: maximum number of days added or removed to seed dates
+    :param value_jitter: maximum proportion added or removed to seed quantities and prices
+    :param rng: random.Random
+    :return: generator of Sale
+    """
+    if not seed_rows:
+        raise ValueError("Empty seed pool")
+    rng = rng or random.Random()
+
+    usernames = [sale.username for sale in seed_rows]
+    country_indexes = [sale.country_index for sale in seed_rows]
+    campaign_products = [(sale.campaign_id, sale.product_index) for sale in seed_rows]
+    quantities = [int(sale.quantity) for sale in seed_rows]
+    unit_prices_cents = [int(sale.unit_price_cents) for sale in seed_rows]
+    date_sampler = date_sampler or default_date_sampler()
+    offsets = date_offsets_of([sale.sale_date for sale in seed_rows], date_sampler)
+
+    remaining = lines_to_create
+    while remaining > 0:
+        size = min(block_size, remaining)
+        # Lines are built lazily, they are counted when their block is drawn
+        records_generated.inc(size, "sale", "hybrid")
+        for username, offset, country_index, (campaign_id, product_index), quantity, unit_price_cents in zip(
+                rng.choices(usernames, k=size),
+                jitter_offsets(offsets, size, date_jitter_days, len(date_sampler), rng),
+                rng.choices(country_indexes, k=size),
+                rng.choices(campaign_products, k=size),
+                rng.choices(quantities, k=size),
+                rng.choices(unit_prices_cents, k=size)
+        ):
+            quantity = jitter_value(quantity, value_jitter, *QUANTITY_RANGE, rng)
+            unit_price_cents = jitter_value(unit_price_cents, value_jitter, *UNIT_PRICE_CENTS_RANGE, rng)
+            yield Sale(
+                username,
+                date_sampler.dates[offset],
+                country_index,
+                product_index,
+                quantity,
+                unit_price_cents,
+                campaign_id
+            )
+        remaining = remaining - size
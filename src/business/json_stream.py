@@ -0,0 +1,56 @@
+"""
+Incremental JSON parsing, objects of a JSON array are returned as soon as they are closed
+"""
+
+import json
+
+
+class JsonArrayParser:
+    """
+    Parse a JSON array of objects fed by text chunks of any size.
+    Only the text of the object being read is kept in memory.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, text):
+        """
+        Feed the next chunk of text
+
+        :param text: chunk of the JSON array text
+        :return: list of objects (dict) closed in this chunk
+        """
+        objects = []
+        # Start of the current object text in this chunk, None if it started in a previous chunk or outside an object
+        start = 0 if self.depth >= 2 else None
+
+        for position, char in enumerate(text):
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "[{":
+                self.depth = self.depth + 1
+                if self.depth == 2:
+                    start = position
+            elif char in "]}":
+                self.depth = self.depth - 1
+                if self.depth == 1:
+                    # An item of the top level array is closed
+                    self.buffer.append(text[start:position + 1])
+                    objects.append(json.loads("".join(self.buffer)))
+                    self.buffer = []
+                    start = None
+
+        if start is not None and self.depth >= 2:
+            self.buffer.append(text[start:])
+        return objects
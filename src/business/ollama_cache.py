@@ -0,0 +1,199 @@
+"""
+Disk cache of items generated by Ollama, reused across runs instead of calling the model again
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+
+# Available cache modes
+CACHE_MODES = ("off", "write", "replay", "sample")
+
+
+def cache_key(ollama_payload):
+    """
+    Compute the content address of a generation request
+
+    :param ollama_payload: Ollama request payload, built for one item
+    :return: hexadecimal key from model, prompt, schema and temperature
+    """
+    content = {
+        "model": ollama_payload.get("model"),
+        "prompt": ollama_payload.get("prompt"),
+        "format": ollama_payload.get("format"),
+        "temperature": ollama_payload.get("options", {}).get("temperature"),
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class OllamaCache:
+    """
+    Generated items stored as JSON lines segments in `cache_dir/<key>/`.
+    Least recently used segments are removed when the cache is bigger than `max_bytes`.
+
+    Modes:
+    - write: every generated item is stored, the model is always called
+    - replay: stored items are returned in generation order, the model is called for the missing ones
+    - sample: stored items are drawn at random, the model is called only when nothing is stored
+    """
+
+    def __init__(self, cache_dir, mode = "write", max_bytes = 512 * 1024 * 1024, rng = None):
+        """
+        :param cache_dir: cache directory, created if needed
+        :param mode: one of CACHE_MODES except "off"
+        :param max_bytes: maximum size of the cache on disk
+        :param rng: random.Random used in sample mode
+        """
+        if mode not in CACHE_MODES or mode == "off":
+            raise ValueError(f"Invalid cache mode: {mode}")
+        self.cache_dir = cache_dir
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.rng = rng or random.Random()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _segments(self, key):
+        """
+        :return: segment files of a key, oldest first
+        """
+        key_dir = os.path.join(self.cache_dir, key)
+        if not os.path.isdir(key_dir):
+            return []
+        return [os.path.join(key_dir, name) for name in sorted(os.listdir(key_dir)) if name.endswith(".jsonl")]
+
+    def _read_segment(self, segment):
+        # Segment is used: it becomes the most recently used for eviction
+        os.utime(segment)
+        with open(segment, encoding="utf-8") as segment_file:
+            for line in segment_file:
+                if line.strip():
+                    yield json.loads(line)
+
+    def _cached_items(self, key, count):
+        """
+        Get stored items of a key
+
+        :param key: cache key
+        :param count: number of items wanted
+        :return: generator of at most `count` items
+        """
+        if count <= 0:
+            return
+        if self.mode == "replay":
+            served = 0
+            for segment in self._segments(key):
+                for item in self._read_segment(segment):
+                    yield item
+                    served = served + 1
+                    if served >= count:
+                        return
+        elif self.mode == "sample":
+            pool = [item for segment in self._segments(key) for item in self._read_segment(segment)]
+            if pool:
+                for _ in range(count):
+                    yield self.rng.choice(pool)
+
+    def iter_items(self, ollama_payload, count, generate):
+        """
+        Get `count` items, from the cache when possible and from the model otherwise.
+        Items generated by the model are stored.
+
+        :param ollama_payload: Ollama request payload built for one item, used as cache key
+        :param count: number of items wanted
+        :param generate: function generating a number of items with the model
+        :return: generator of items
+        """
+        key = cache_key(ollama_payload)
+        served = 0
+        for item in self._cached_items(key, count):
+            self.hits = self.hits + 1
+            served = served + 1
+            yield item
+
+        missing = count - served
+        if missing <= 0:
+            return
+
+        key_dir = os.path.join(self.cache_dir, key)
+        os.makedirs(key_dir, exist_ok=True)
+        segment = os.path.join(key_dir, f"{time.time_ns()}-{os.getpid()}.jsonl")
+        try:
+            with open(segment, "w", encoding="utf-8") as segment_file:
+                for item in generate(missing):
+                    self.misses = self.misses + 1
+                    segment_file.write(json.dumps(item, ensure_ascii=False) + "\n")
+                    yield item
+        finally:
+            if os.path.getsize(segment) == 0:
+                os.remove(segment)
+            self.evict()
+
+    def size(self):
+        """
+        :return: size of the cache on disk in bytes
+        """
+        return sum(os.path.getsize(segment) for segment, _ in self._all_segments())
+
+    def _all_segments(self):
+        """
+        :return: list of (segment path, last use time) of every key
+        """
+        segments = []
+        for key in os.listdir(self.cache_dir):
+            for segment in self._segments(key):
+                segments.append((segment, os.path.getmtime(segment)))
+        return segments
+
+    def evict(self):
+        """
+        Remove least recently used segments until the cache fits in max_bytes
+
+        :return: number of segments removed
+        """
+        segments = sorted(self._all_segments(), key=lambda segment: segment[1])
+        total = sum(os.path.getsize(segment) for segment, _ in segments)
+        removed = 0
+        for segment, _ in segments:
+            if total <= self.max_bytes:
+                break
+            total = total - os.path.getsize(segment)
+            os.remove(segment)
+            removed = removed + 1
+        if removed:
+            logging.info(f"Ollama cache: {removed} segments evicted, {total} bytes left")
+        return removed
+
+    def log_summary(self):
+        """
+        Log cache hits and misses of the run
+
+        :return: No Return
+        """
+        total = self.hits + self.misses
+        hit_rate = self.hits * 100 / total if total else 0.0
+        logging.info(
+            f"Ollama cache ({self.mode}): {self.hits} items from cache, {self.misses} items generated, "
+            f"hit rate {hit_rate:.1f}%"
+        )
+
+
+def build_ollama_cache(cache_mode, cache_dir, cache_max_bytes, seed = None):
+    """
+    Build the cache from the configuration
+
+    :param cache_mode: one of CACHE_MODES
+    :param cache_dir: cache directory
+    :param cache_max_bytes: maximum size of the cache on disk
+    :param seed: generation seed, sample mode draws the same items for a same seed, unpredictable if None
+    :return: OllamaCache, None when the cache is off
+    """
+    if cache_mode == "off":
+        return None
+    # Own stream of the seed, like the streams of the local generators
+    rng = random.Random(None if seed is None else f"{seed}:cache")
+    return OllamaCache(cache_dir, cache_mode, cache_max_bytes, rng)
@@ -0,0 +1,239 @@
+"""
+Ollama API management, large generations are split in shards sent concurrently to one or more hosts
+"""
+
+import json
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from business.json_stream import JsonArrayParser
+from http_client.connection_pool import default_pool
+from metrics.metrics import ollama_items, ollama_request_seconds
+
+# Default number of items asked to the model in one call
+DEFAULT_SHARD_SIZE = 50
+
+
+def parse_hosts(host):
+    """
+    Get the list of Ollama hosts
+
+    :param host: host (ex. '127.0.0.1:11434'), comma separated hosts or list of hosts
+    :return: list of hosts
+    """
+    if isinstance(host, str):
+        host = host.split(",")
+    hosts = [h.strip() for h in host if h.strip()]
+    if not hosts:
+        raise ValueError("No Ollama host")
+    return hosts
+
+
+def parse_ollama_response(data):
+    """
+    Get generated items from an Ollama answer
+
+    :param data: Ollama answer (dict)
+    :return: list of items
+    """
+    # Key 'response' can contain JSON string or an already parsed object
+    response = data.get("response")
+    if isinstance(response, str):
+        try:
+            return json.loads(response)
+        except Exception as e:
+            logging.error(f"Non JSON Response: {e}\nContent: {response[:200]}...")
+            raise ValueError(f"Non JSON Response: {e}\nContent: {response[:200]}...")
+    return response
+
+
+def call_ollama(host, ollama_payload, timeout, pool = None):
+    """
+    Send a generation request to Ollama (https://docs.ollama.com/api/generate)
+
+    :param host: Ollama base URL (ex. '127.0.0.1:11434')
+    :param ollama_payload: request payload
+    :param timeout: timeout HTTP in seconds
+    :param pool: ConnectionPool to use, shared default pool if None
+    :return: list of generated items
+    """
+    url = f"http://{host}/api/generate"
+    pool = pool or default_pool
+
+    # Payload is dumped once, for the request and for the debug line
+    body = json.dumps(ollama_payload)
+    logging.debug("URL: %s", url)
+    logging.debug("Payload: %s", body)
+
+    # HTTP call
+    try:
+        headers = {"Content-Type": "application/json"}
+        resp = pool.request("POST", url, body=body.encode("utf-8"), headers=headers, timeout=timeout)
+        raw = resp.body.decode("utf-8")
+        if resp.status >= 400:
+            raise RuntimeError(f"HTTP {resp.status}: {raw[:200]}")
+        data = json.loads(raw)
+        logging.debug("Raw: %s", raw)
+    except Exception as e:
+        logging.error(f"Ollama call error on {host}: {e}")
+        raise RuntimeError(f"Ollama call error on {host}: {e}")
+
+    items = parse_ollama_response(data)
+    logging.debug("Ollama answer: %s", items)
+    return items
+
+
+def stream_ollama(host, ollama_payload, timeout, pool = None):
+    """
+    Send a streaming generation request to Ollama (https://docs.ollama.com/api/streaming).
+    Answer chunks (NDJSON) are parsed as they arrive, each item is returned as soon as it is complete.
+
+    :param host: Ollama base URL (ex. '127.0.0.1:11434')
+    :param ollama_payload: request payload, "stream" is forced to True
+    :param timeout: timeout HTTP in seconds, between two chunks
+    :param pool: ConnectionPool to use, shared default pool if None
+    :return: generator of generated items
+    """
+    url = f"http://{host}/api/generate"
+    pool = pool or default_pool
+    parser = JsonArrayParser()
+
+    logging.debug("URL: %s", url)
+
+    try:
+        headers = {"Content-Type": "application/json"}
+        body = json.dumps({**ollama_payload, "stream": True}).encode("utf-8")
+        for line in pool.stream_lines("POST", url, body=body, headers=headers, timeout=timeout):
+            if not line.strip():
+                continue
+            chunk = json.loads(line)
+            if "error" in chunk:
+                raise RuntimeError(chunk["error"])
+            yield from parser.feed(chunk.get("response", ""))
+            if chunk.get("done"):
+                break
+    except Exception as e:
+        logging.error(f"Ollama call error on {host}: {e}")
+        raise RuntimeError(f"Ollama call error on {host}: {e}")
+
+
+def split_in_shards(count, shard_size):
+    """
+    Split a number of items in shards
+
+    :param count: number of items
+    :param shard_size: maximum number of items per shard
+    :return: list of shard sizes
+    """
+    return [min(shard_size, count - start) for start in range(0, count, shard_size)]
+
+
+def run_shard(index, ollama_payload, host, timeout, stream, results):
+    """
+    Generate the items of a shard and put them in the results queue
+
+    :param index: shard index
+    :param ollama_payload: request payload
+    :param host: Ollama base URL
+    :param timeout: timeout HTTP in seconds
+    :param stream: True to put items in the queue as they are generated
+    :param results: queue.Queue receiving ("item", index, item) then ("done", index, error)
+    :return: No Return
+    """
+    error = None
+    with ollama_request_seconds.time(str(stream).lower()):
+        try:
+            items = stream_ollama(host, ollama_payload, timeout) if stream else call_ollama(host, ollama_payload, timeout)
+            for item in items:
+                ollama_items.inc()
+                results.put(("item", index, item))
+        except Exception as e:
+            error = str(e)
+    results.put(("done", index, error))
+
+
+def iter_via_ollama(
+        count,
+        build_payload,
+        host,
+        timeout,
+        shard_size = DEFAULT_SHARD_SIZE,
+        max_workers = 1,
+        shard_retries = 0,
+        stream = False,
+        cache = None
+):
+    """
+    Generate `count` items with Ollama, split in shards dispatched to the hosts by a thread pool.
+    Items are returned as soon as their shard answered, or as soon as they are generated when streaming.
+    A failed or incomplete shard is sent again on its own, on the next host, for its missing items.
+
+    :param count: number of items to generate
+    :param build_payload: function building the Ollama payload for a number of items
+    :param host: Ollama host, comma separated hosts or list of hosts
+    :param timeout: timeout HTTP in seconds, per shard (between two chunks when streaming)
+    :param shard_size: maximum number of items asked in one call
+    :param max_workers: number of calls sent at the same time
+    :param shard_retries: number of times a shard is sent again
+    :param stream: stream Ollama answers
+    :param cache: OllamaCache serving and storing items, no cache if None
+    :return: generator of items
+    """
+    if count <= 0:
+        return
+
+    if cache is not None:
+        yield from cache.iter_items(
+            build_payload(1),
+            count,
+            lambda missing: iter_via_ollama(
+                missing, build_payload, host, timeout, shard_size, max_workers, shard_retries, stream
+            )
+        )
+        return
+
+    hosts = parse_hosts(host)
+    shards = split_in_shards(count, shard_size)
+    received = [0 for _ in shards]
+    attempts = [0 for _ in shards]
+    results = queue.Queue()
+    logging.info(f"Ollama generation of {count} items in {len(shards)} shards on {len(hosts)} hosts, stream {stream}")
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ollama")
+
+    def submit(index):
+        shard_host = hosts[(index + attempts[index]) % len(hosts)]
+        ollama_payload = build_payload(shards[index] - received[index])
+        executor.submit(run_shard, index, ollama_payload, shard_host, timeout, stream, results)
+
+    try:
+        for index in range(len(shards)):
+            submit(index)
+
+        running = len(shards)
+        while running:
+            kind, index, value = results.get()
+            if kind == "item":
+                # Extra items of a shard are dropped
+                if received[index] < shards[index]:
+                    received[index] = received[index] + 1
+                    yield value
+                continue
+
+            running = running - 1
+            missing = shards[index] - received[index]
+            if missing == 0:
+                logging.info(f"Shard {index + 1}/{len(shards)}: {shards[index]} items")
+                continue
+
+            error = value or f"{missing} items missing"
+            if attempts[index] >= shard_retries:
+                raise RuntimeError(f"Shard {index + 1}/{len(shards)} failed after {attempts[index] + 1} attempts: {error}")
+            logging.warning(f"Shard {index + 1}/{len(shards)} failed ({error}), retry for {missing} items")
+            attempts[index] = attempts[index] + 1
+            submit(index)
+            running = running + 1
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
@@ -0,0 +1,178 @@
+"""
+Compact generated records.
+Records hold references to shared strings (usernames, dates, campaign ids) and small integer indexes
+into the allowed lists: a record costs a fraction of a dict or of a tuple of rendered values.
+Values are turned into strings only when a record is serialized.
+"""
+
+from business import allowed_comments, allowed_countries, allowed_products, dimensions
+
+
+class Record:
+    """
+    Base of the records, compared and printed by their slots
+    """
+    __slots__ = ()
+
+    def values(self):
+        """
+        :return: tuple of the slot values
+        """
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.values() == other.values()
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Feedback(Record):
+    """
+    Campaign feedback, sent as a JSON object
+    """
+    __slots__ = ("username", "feedback_date", "campaign_id", "comment_index")
+
+    def __init__(self, username, feedback_date, campaign_id, comment_index):
+        """
+        :param username: username
+        :param feedback_date: date formatted as YYYY-MM-DD
+        :param campaign_id: campaign id (ex. 'CAMP147')
+        :param comment_index: index in allowed_comments
+        """
+        self.username = username
+        self.feedback_date = feedback_date
+        self.campaign_id = campaign_id
+        self.comment_index = comment_index
+
+    @property
+    def comment(self):
+        return allowed_comments[self.comment_index]
+
+    def as_dict(self):
+        """
+        :return: feedback as sent to the API (dict)
+        """
+        return {
+            "username": self.username,
+            "feedback_date": self.feedback_date,
+            "campaign_id": self.campaign_id,
+            "comment": allowed_comments[self.comment_index]
+        }
+
+
+class EncodedFeedback(Feedback):
+    """
+    Feedback sent dictionary encoded: the comment is sent as its id, see the comments dimension
+    """
+    __slots__ = ()
+
+    def as_dict(self):
+        """
+        :return: feedback as sent to the API (dict)
+        """
+        return {
+            "username": self.username,
+            "feedback_date": self.feedback_date,
+            "campaign_id": self.campaign_id,
+            "comment_id": self.comment_index
+        }
+
+
+def dictionary_encoded(feedbacks):
+    """
+    Get feedbacks sent dictionary encoded
+
+    :param feedbacks: list of Feedback
+    :return: list of EncodedFeedback
+    """
+    return [EncodedFeedback(*feedback.values()) for feedback in feedbacks]
+
+
+def dimension_records(name):
+    """
+    Get the records of a dimension, as sent to the API
+
+    :param name: dimension name, key of business.dimensions
+    :return: list of {id column: id, text column: text} dicts
+    """
+    (id_column, text_column), values = dimensions[name]
+    return [{id_column: index, text_column: value} for index, value in enumerate(values)]
+
+
+class Sale(Record):
+    """
+    Sale, written as one line of the sales file and one line of the campaign/product file.
+    Prices are kept in cents, amounts are computed when rows are rendered.
+    """
+    __slots__ = ("username", "sale_date", "country_index", "product_index", "quantity", "unit_price_cents",
+                 "campaign_id")
+
+    def __init__(self, username, sale_date, country_index, product_index, quantity, unit_price_cents, campaign_id):
+        """
+        :param username: username
+        :param sale_date: date formatted as YYYY-MM-DD
+        :param country_index: index in allowed_countries
+        :param product_index: index in allowed_products
+        :param quantity: quantity sold
+        :param unit_price_cents: unit price in cents
+        :param campaign_id: campaign id (ex. 'CAMP147')
+        """
+        self.username = username
+        self.sale_date = sale_date
+        self.country_index = country_index
+        self.product_index = product_index
+        self.quantity = quantity
+        self.unit_price_cents = unit_price_cents
+        self.campaign_id = campaign_id
+
+    @property
+    def country(self):
+        return allowed_countries[self.country_index]
+
+    @property
+    def product(self):
+        return allowed_products[self.product_index]
+
+    def sales_row(self):
+        """
+        :return: row of the sales file, columns of business.sales_columns
+        """
+        # Amounts are computed in cents to avoid float rounding
+        return (
+            self.username,
+            self.sale_date,
+            allowed_countries[self.country_index],
+            allowed_products[self.product_index],
+            self.quantity,
+            self.unit_price_cents / 100,
+            self.quantity * self.unit_price_cents / 100
+        )
+
+    def campaign_product_row(self):
+        """
+        :return: row of the campaign/product file, columns of business.campaign_product_columns
+        """
+        return self.campaign_id, allowed_products[self.product_index]
+
+    def encoded_sales_row(self):
+        """
+        :return: row of the dictionary encoded sales file, columns of business.encoded_sales_columns
+        """
+        return (
+            self.username,
+            self.sale_date,
+            self.country_index,
+            self.product_index,
+            self.quantity,
+            self.unit_price_cents / 100,
+            self.quantity * self.unit_price_cents / 100
+        )
+
+    def encoded_campaign_product_row(self):
+        """
+        :return: row of the dictionary encoded campaign/product file,
+                 columns of business.encoded_campaign_product_columns
+        """
+        return self.campaign_id, self.product_index
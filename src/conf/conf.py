@@ -6,6 +6,9 @@ import sys
 import configparser
 import logging
 
+from conf.dates import DATE_DISTRIBUTIONS, parse_date
+from logs.logs import LOG_ROTATIONS
+
 
 # Read config file for technical configuration
 def load_config(config_file):
@@ -17,17 +20,66 @@ def load_config(config_file):
             api_endpoint_url,
             api_rest_method,
             api_timeout_seconds,
+            api_batch_size,
+            api_max_in_flight,
+            api_max_attempts,
+            api_backoff_base_seconds,
+            api_backoff_max_seconds,
+            api_requests_per_second,
+            api_records_per_second,
+            api_engine,
+            api_content_encoding,
+            api_compression_min_bytes,
+            api_body_format,
+            api_dictionary_encoding,
+            api_dimensions_url,
             api_auth_active,
             api_username,
             api_password,
             sales_csv_file,
             campaign_product_csv_file,
+            csv_merge_parts,
+            csv_format,
+            csv_dictionary_encoding,
             ollama_url,
             ollama_model,
+            ollama_timeout_seconds,
+            ollama_shard_size,
+            ollama_max_workers,
+            ollama_shard_retries,
+            ollama_stream,
+            ollama_cache_mode,
+            ollama_cache_dir,
+            ollama_cache_max_bytes,
             log_file,
             log_level,
             log_format,
+            log_debug_sample_every,
+            log_structured,
+            log_rotation,
+            log_max_bytes,
+            log_rotation_when,
+            log_backup_count,
+            log_compress,
+            log_queue_size,
             generation_mode,
+            generation_date_start,
+            generation_date_end,
+            generation_date_distribution,
+            generation_hybrid_seed_size,
+            generation_hybrid_date_jitter_days,
+            generation_hybrid_value_jitter,
+            generation_seed,
+            stream_rate,
+            stream_ramp_seconds,
+            stream_duration_seconds,
+            stream_report_seconds,
+            profile_unit,
+            load_profile,
+            metrics_file,
+            metrics_host,
+            metrics_port,
+            metrics_summary,
     """
     config = configparser.ConfigParser()
     try:
@@ -38,6 +90,29 @@ def load_config(config_file):
         api_endpoint_url = config["API"]["endpoint_url"]
         api_rest_method = config["API"]["method"]
         api_timeout_seconds = int(config["API"]["timeout_seconds"])
+        api_batch_size = int(config["API"].get("batch_size", "1000"))
+        api_max_in_flight = int(config["API"].get("max_in_flight", "4"))
+        if api_batch_size <= 0 or api_max_in_flight <= 0:
+            raise ValueError("batch_size and max_in_flight must be greater than 0")
+        api_max_attempts = int(config["API"].get("max_attempts", "5"))
+        api_backoff_base_seconds = float(config["API"].get("backoff_base_seconds", "0.5"))
+        api_backoff_max_seconds = float(config["API"].get("backoff_max_seconds", "30"))
+        if api_max_attempts <= 0:
+            raise ValueError("max_attempts must be greater than 0")
+        api_requests_per_second = float(config["API"].get("requests_per_second", "0"))
+        api_records_per_second = float(config["API"].get("records_per_second", "0"))
+        api_engine = config["API"].get("engine", "threads")
+        if api_engine not in ("threads", "async"):
+            raise ValueError(f"Invalid push engine: {api_engine}")
+        api_content_encoding = config["API"].get("content_encoding", "identity")
+        api_compression_min_bytes = int(config["API"].get("compression_min_bytes", "1024"))
+        if api_content_encoding not in ("identity", "gzip", "deflate", "zstd"):
+            raise ValueError(f"Invalid content encoding: {api_content_encoding}")
+        api_body_format = config["API"].get("body_format", "json")
+        if api_body_format not in ("json", "ndjson"):
+            raise ValueError(f"Invalid body format: {api_body_format}")
+        api_dictionary_encoding = config["API"].getboolean("dictionary_encoding", fallback=False)
+        api_dimensions_url = config["API"].get("dimensions_url", "").strip() or api_endpoint_url
 
         api_auth_active = config["API_AUTH"]["active"]
         api_username = config["API_AUTH"]["username"]
@@ -50,15 +125,107 @@ def load_config(config_file):
         campaign_product_csv_file_name = config["CSV"]["campaign_product_file_name"]
         campaign_product_csv_file_path = config["CSV"]["campaign_product_file_path"]
         campaign_product_csv_file = campaign_product_csv_file_path + campaign_product_csv_file_name
+        csv_merge_parts = config["CSV"].getboolean("merge_parts", fallback=True)
+        csv_format = config["CSV"].get("format", "csv")
+        if csv_format not in ("csv", "csv.gz", "csv.zst", "parquet"):
+            raise ValueError(f"Invalid output format: {csv_format}")
+        csv_dictionary_encoding = config["CSV"].getboolean("dictionary_encoding", fallback=False)
 
-        ollama_url = config["OLLAMA"]["ollama_url"]
+        ollama_url = [url.strip() for url in config["OLLAMA"]["ollama_url"].split(",") if url.strip()]
         ollama_model = config["OLLAMA"]["ollama_model"]
+        ollama_timeout_seconds = int(config["OLLAMA"].get("timeout_seconds", "300"))
+        ollama_shard_size = int(config["OLLAMA"].get("shard_size", "50"))
+        ollama_max_workers = int(config["OLLAMA"].get("max_workers", "4"))
+        ollama_shard_retries = int(config["OLLAMA"].get("shard_retries", "2"))
+        ollama_stream = config["OLLAMA"].getboolean("stream", fallback=False)
+        ollama_cache_mode = config["OLLAMA"].get("cache_mode", "off")
+        ollama_cache_dir = config["OLLAMA"].get("cache_dir", "./ollama_cache")
+        ollama_cache_max_bytes = int(float(config["OLLAMA"].get("cache_max_mb", "512")) * 1024 * 1024)
+        if ollama_cache_mode not in ("off", "write", "replay", "sample"):
+            raise ValueError(f"Invalid Ollama cache mode: {ollama_cache_mode}")
+        if not ollama_url:
+            raise ValueError("ollama_url must contain at least one host")
+        if ollama_shard_size <= 0 or ollama_max_workers <= 0:
+            raise ValueError("shard_size and max_workers must be greater than 0")
 
         log_file = config["LOG"]["log_file"]
         log_level = config["LOG"]["log_level"]
         log_format = config["LOG"]["log_format"]
+        log_debug_sample_every = int(config["LOG"].get("debug_sample_every", "1000"))
+        if log_debug_sample_every < 1:
+            raise ValueError("debug_sample_every must be greater than 0")
+        log_structured = config["LOG"].getboolean("structured", fallback=False)
+        log_rotation = config["LOG"].get("rotation", "none")
+        if log_rotation not in LOG_ROTATIONS:
+            raise ValueError(f"Invalid log rotation: {log_rotation}, expected one of {', '.join(LOG_ROTATIONS)}")
+        log_max_bytes = int(float(config["LOG"].get("max_mb", "100")) * 1024 * 1024)
+        log_rotation_when = config["LOG"].get("when", "midnight")
+        if log_rotation_when.upper() not in ("S", "M", "H", "D", "MIDNIGHT", "W0", "W1", "W2", "W3", "W4", "W5", "W6"):
+            raise ValueError(f"Invalid log rotation interval: {log_rotation_when}")
+        log_backup_count = int(config["LOG"].get("backup_count", "5"))
+        log_compress = config["LOG"].getboolean("compress", fallback=False)
+        log_queue_size = int(config["LOG"].get("queue_size", "10000"))
+        if log_max_bytes <= 0 and log_rotation == "size" or log_backup_count < 0 or log_queue_size < 0:
+            raise ValueError("max_mb must be greater than 0, backup_count and queue_size positive")
 
         generation_mode = config["GENERATION"]["mode"]
+        generation_date_start = config["GENERATION"].get("date_start", "2024-01-01")
+        generation_date_end = config["GENERATION"].get("date_end", "2026-12-31")
+        for date in (generation_date_start, generation_date_end):
+            try:
+                parse_date(date)
+            except ValueError:
+                raise ValueError(f"Invalid date: {date}, expected YYYY-MM-DD") from None
+        if parse_date(generation_date_start) > parse_date(generation_date_end):
+            raise ValueError(f"Invalid date range: {generation_date_start} is after {generation_date_end}")
+        generation_date_distribution = config["GENERATION"].get("date_distribution", "uniform")
+        if generation_date_distribution not in DATE_DISTRIBUTIONS:
+            raise ValueError(
+                f"Invalid date distribution: {generation_date_distribution}, "
+                f"expected one of {', '.join(DATE_DISTRIBUTIONS)}"
+            )
+        generation_hybrid_seed_size = int(config["GENERATION"].get("hybrid_seed_size", "100"))
+        generation_hybrid_date_jitter_days = int(config["GENERATION"].get("hybrid_date_jitter_days", "15"))
+        generation_hybrid_value_jitter = float(config["GENERATION"].get("hybrid_value_jitter", "0.1"))
+        if generation_hybrid_seed_size <= 0:
+            raise ValueError("hybrid_seed_size must be greater than 0")
+        if generation_hybrid_date_jitter_days < 0 or not 0 <= generation_hybrid_value_jitter < 1:
+            raise ValueError("hybrid_date_jitter_days must be positive and hybrid_value_jitter between 0 and 1")
+        generation_seed = config["GENERATION"].get("seed", "").strip()
+        generation_seed = int(generation_seed) if generation_seed else None
+        if generation_seed is not None and generation_seed < 0:
+            raise ValueError("seed must be a positive integer")
+
+        # Continuous push, optional section
+        stream_rate = config.getfloat("STREAM", "rate", fallback=1000.0)
+        stream_ramp_seconds = config.getfloat("STREAM", "ramp_seconds", fallback=0.0)
+        stream_duration_seconds = config.getfloat("STREAM", "duration_seconds", fallback=0.0)
+        stream_report_seconds = config.getfloat("STREAM", "report_seconds", fallback=10.0)
+        if min(stream_rate, stream_ramp_seconds, stream_duration_seconds, stream_report_seconds) < 0:
+            raise ValueError("rate, ramp_seconds, duration_seconds and report_seconds must be positive")
+
+        # Load profile of PUSH and STREAM, optional section, stages in a file or in the config
+        profile_unit = config.get("PROFILE", "unit", fallback="records")
+        if profile_unit not in ("records", "requests"):
+            raise ValueError(f"Invalid profile unit: {profile_unit}")
+        profile_file = config.get("PROFILE", "file", fallback="").strip()
+        profile_stages = config.get("PROFILE", "stages", fallback="").strip()
+        load_profile = None
+        if profile_file or profile_stages:
+            # Only imported when a profile is configured
+            from http_client.load_profile import parse_profile, read_profile_file
+        if profile_file:
+            load_profile = read_profile_file(profile_file, profile_unit)
+        elif profile_stages:
+            load_profile = parse_profile(profile_stages.splitlines(), profile_unit)
+
+        # Metrics export, optional section
+        metrics_file = config.get("METRICS", "file", fallback="").strip()
+        metrics_host = config.get("METRICS", "host", fallback="127.0.0.1").strip()
+        metrics_port = config.getint("METRICS", "port", fallback=0)
+        metrics_summary = config.getboolean("METRICS", "summary", fallback=True)
+        if not 0 <= metrics_port <= 65535:
+            raise ValueError("Metrics port must be between 0 and 65535")
 
         # For multivalued, use split
         # mv_list = config["XYZ"]["list"].split(",")
@@ -67,17 +234,66 @@ def load_config(config_file):
             api_endpoint_url,
             api_rest_method,
             api_timeout_seconds,
+            api_batch_size,
+            api_max_in_flight,
+            api_max_attempts,
+            api_backoff_base_seconds,
+            api_backoff_max_seconds,
+            api_requests_per_second,
+            api_records_per_second,
+            api_engine,
+            api_content_encoding,
+            api_compression_min_bytes,
+            api_body_format,
+            api_dictionary_encoding,
+            api_dimensions_url,
             api_auth_active,
             api_username,
             api_password,
             sales_csv_file,
             campaign_product_csv_file,
+            csv_merge_parts,
+            csv_format,
+            csv_dictionary_encoding,
             ollama_url,
             ollama_model,
+            ollama_timeout_seconds,
+            ollama_shard_size,
+            ollama_max_workers,
+            ollama_shard_retries,
+            ollama_stream,
+            ollama_cache_mode,
+            ollama_cache_dir,
+            ollama_cache_max_bytes,
             log_file,
             log_level,
             log_format,
+            log_debug_sample_every,
+            log_structured,
+            log_rotation,
+            log_max_bytes,
+            log_rotation_when,
+            log_backup_count,
+            log_compress,
+            log_queue_size,
             generation_mode,
+            generation_date_start,
+            generation_date_end,
+            generation_date_distribution,
+            generation_hybrid_seed_size,
+            generation_hybrid_date_jitter_days,
+            generation_hybrid_value_jitter,
+            generation_seed,
+            stream_rate,
+            stream_ramp_seconds,
+            stream_duration_seconds,
+            stream_report_seconds,
+            profile_unit,
+            load_profile,
+            metrics_file,
+            metrics_host,
+            metrics_port,
+            metrics_summary,
         )
     except FileNotFoundError:
         logging.error(f"Config file not found: {config_file}")
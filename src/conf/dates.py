@@ -0,0 +1,23 @@
+"""
+Date range settings, shared by the configuration and the date sampling of business.dates.
+Only needs datetime: the configuration is checked without importing the generators.
+"""
+
+import datetime
+
+# Default date range, both days included
+DEFAULT_DATE_START = "2024-01-01"
+DEFAULT_DATE_END = "2026-12-31"
+
+# Available distributions of dates over the range
+DATE_DISTRIBUTIONS = ("uniform", "weekday", "seasonal")
+
+
+def parse_date(date):
+    """
+    Parse a date
+
+    :param date: date formatted as YYYY-MM-DD, month and day can be not padded (ex. 2024-1-1)
+    :return: datetime.date
+    """
+    return datetime.datetime.strptime(date, "%Y-%m-%d").date()
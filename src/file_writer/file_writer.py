@@ -0,0 +1,131 @@
+"""
+Output files management
+"""
+
+import itertools
+import logging
+import os
+import time
+
+from business import dimension_column_types, dimensions
+from business.records import Sale
+from file_writer.formats import open_table_writer, output_file_name
+
+# Number of rows handed to the csv writer at once
+WRITE_CHUNK_SIZE = 1000
+
+# Number of rows between two progress reports
+PROGRESS_EVERY = 100000
+
+
+def log_progress(rows_written, total, start_time):
+    """
+    Log generation progress
+
+    :param rows_written: number of rows already written
+    :param total: number of rows expected, None if unknown
+    :param start_time: time.perf_counter() value at the start of the generation
+    :return: No Return
+    """
+    elapsed = time.perf_counter() - start_time
+    rate = rows_written / elapsed if elapsed > 0 else 0.0
+    if total:
+        logging.info(f"Progress: {rows_written}/{total} rows ({rows_written * 100 / total:.1f}%), {rate:.0f} rows/s")
+    else:
+        logging.info(f"Progress: {rows_written} rows, {rate:.0f} rows/s")
+
+
+def write_sales_files(
+        rows,
+        sales_csv_file,
+        sales_columns,
+        campaign_product_csv_file,
+        campaign_product_columns,
+        total = None,
+        progress_every = PROGRESS_EVERY,
+        output_format = "csv",
+        header = True,
+        sales_column_types = None,
+        campaign_product_column_types = None,
+        dictionary_encoded = False
+):
+    """
+    Stream generated sales into the sales and campaign/product files.
+    Sales are consumed lazily, memory usage does not depend on the number of rows.
+
+    :param rows: iterable of Sale
+    :param sales_csv_file: path of the sales file
+    :param sales_columns: header of the sales file
+    :param campaign_product_csv_file: path of the campaign/product file
+    :param campaign_product_columns: header of the campaign/product file
+    :param total: number of rows expected, used for progress reports
+    :param progress_every: number of rows between two progress reports
+    :param output_format: one of formats.OUTPUT_FORMATS
+    :param header: write the csv headers, False for the parts following the first one
+    :param sales_column_types: types of the sales columns, needed by typed formats
+    :param campaign_product_column_types: types of the campaign/product columns, needed by typed formats
+    :param dictionary_encoded: write country and product ids instead of their names, see write_dimension_files
+    :return: number of rows written
+    """
+    rows = iter(rows)
+    rows_written = 0
+    next_report = progress_every
+    start_time = time.perf_counter()
+    if dictionary_encoded:
+        sales_row, campaign_product_row = Sale.encoded_sales_row, Sale.encoded_campaign_product_row
+    else:
+        sales_row, campaign_product_row = Sale.sales_row, Sale.campaign_product_row
+
+    sales_writer = open_table_writer(sales_csv_file, sales_columns, sales_column_types, output_format, header)
+    try:
+        campaign_product_writer = open_table_writer(
+            campaign_product_csv_file,
+            campaign_product_columns,
+            campaign_product_column_types,
+            output_format,
+            header
+        )
+        try:
+            while True:
+                chunk = list(itertools.islice(rows, WRITE_CHUNK_SIZE))
+                if not chunk:
+                    break
+
+                sales_writer.write_rows([sales_row(sale) for sale in chunk])
+                campaign_product_writer.write_rows([campaign_product_row(sale) for sale in chunk])
+                rows_written = rows_written + len(chunk)
+
+                if rows_written >= next_report:
+                    log_progress(rows_written, total, start_time)
+                    next_report = rows_written + progress_every
+        finally:
+            campaign_product_writer.close()
+    finally:
+        sales_writer.close()
+
+    if rows_written != next_report - progress_every:
+        log_progress(rows_written, total, start_time)
+    return rows_written
+
+
+def write_dimension_files(directory, names, output_format = "csv"):
+    """
+    Write the dimensions of dictionary encoded files, one file per dimension (ex. './countries.csv')
+
+    :param directory: directory of the files
+    :param names: dimension names, keys of business.dimensions
+    :param output_format: one of formats.OUTPUT_FORMATS
+    :return: list of written files
+    """
+    files = []
+    for name in names:
+        columns, values = dimensions[name]
+        file_name = output_file_name(os.path.join(directory, name), output_format)
+        writer = open_table_writer(file_name, columns, dimension_column_types, output_format)
+        try:
+            writer.write_rows(list(enumerate(values)))
+        finally:
+            writer.close()
+        logging.info(f"Dimension {name}: {len(values)} values written to {file_name}")
+        files.append(file_name)
+    return files
@@ -0,0 +1,243 @@
+"""
+Output formats of the generated files: plain csv, compressed csv and Parquet.
+Compressors and pyarrow are optional, a format is only available when its library can be imported.
+They are imported on first use of their format: pyarrow alone takes longer to import than the rest of the program.
+"""
+
+import csv
+import gzip
+import io
+import os
+
+from libraries.libraries import load_pyarrow, load_zstd
+
+# Available formats and the extension of their files
+OUTPUT_FORMATS = {
+    "csv": ".csv",
+    "csv.gz": ".csv.gz",
+    "csv.zst": ".csv.zst",
+    "parquet": ".parquet",
+}
+
+# Size of the write buffer of output files, data is flushed to disk when full
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Compression levels, chosen for generation speed
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Number of rows of a Parquet row group
+PARQUET_ROW_GROUP_SIZE = 128 * 1024
+
+
+def format_available(output_format):
+    """
+    Check that the library needed by a format can be imported
+
+    :param output_format: one of OUTPUT_FORMATS
+    :return: True if files can be written in this format
+    """
+    match output_format:
+        case "csv.zst":
+            return any(load_zstd())
+        case "parquet":
+            return load_pyarrow() is not None
+        case _:
+            return output_format in OUTPUT_FORMATS
+
+
+def output_file_name(file_name, output_format, part = None):
+    """
+    Get the name of an output file in a format
+
+    :param file_name: configured file name, with or without extension (ex. './sales.csv')
+    :param output_format: one of OUTPUT_FORMATS
+    :param part: part index, None for the complete file
+    :return: file name with the format extension (ex. './sales.csv.gz', './sales.part-0000.parquet')
+    """
+    root = file_name
+    for extension in sorted(OUTPUT_FORMATS.values(), key=len, reverse=True):
+        if root.endswith(extension):
+            root = root[:-len(extension)]
+            break
+    if part is not None:
+        root = f"{root}.part-{part:04d}"
+    return root + OUTPUT_FORMATS[output_format]
+
+
+def compressed_output(raw_file, output_format):
+    """
+    Wrap a binary output file in the compressor of a format
+
+    :param raw_file: binary file object
+    :param output_format: csv, csv.gz or csv.zst
+    :return: binary file object, raw_file itself for plain csv
+    """
+    zstd, zstandard = load_zstd() if output_format == "csv.zst" else (None, None)
+    match output_format:
+        case "csv.gz":
+            # No file name nor time in the gzip header: same bytes for same rows
+            return gzip.GzipFile(filename="", fileobj=raw_file, mode="wb", compresslevel=GZIP_LEVEL, mtime=0)
+        case "csv.zst" if zstd is not None:
+            return zstd.ZstdFile(raw_file, mode="w", level=ZSTD_LEVEL)
+        case "csv.zst":
+            return io.BufferedWriter(
+                zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw_file, closefd=False),
+                WRITE_BUFFER_SIZE
+            )
+        case _:
+            return raw_file
+
+
+class CsvTableWriter:
+    """
+    Rows written in a csv file, plain or compressed
+    """
+
+    def __init__(self, file_name, columns, output_format = "csv", header = True):
+        """
+        :param file_name: path of the file to create
+        :param columns: header columns
+        :param output_format: csv, csv.gz or csv.zst
+        :param header: write the header, False for the parts following the first one
+        """
+        self.raw_file = open(file_name, "wb", buffering=WRITE_BUFFER_SIZE)
+        self.text_file = io.TextIOWrapper(
+            compressed_output(self.raw_file, output_format),
+            encoding="utf-8",
+            newline=""
+        )
+        self.writer = csv.writer(self.text_file, lineterminator="\n")
+        if header:
+            self.writer.writerow(columns)
+
+    def write_rows(self, rows):
+        """
+        :param rows: list of row tuples
+        :return: No Return
+        """
+        self.writer.writerows(rows)
+
+    def close(self):
+        # Compressors do not close a file object they did not open
+        self.text_file.close()
+        if not self.raw_file.closed:
+            self.raw_file.close()
+
+
+def to_arrow_array(values, arrow_type):
+    """
+    Build a typed Arrow column
+
+    :param values: column values
+    :param arrow_type: pyarrow type of the column
+    :return: pyarrow Array
+    """
+    pyarrow = load_pyarrow()
+    array = pyarrow.array(values)
+    if array.type == arrow_type:
+        return array
+    if arrow_type == pyarrow.date32() and pyarrow.types.is_string(array.type):
+        # ISO dates are parsed as timestamps, then truncated to days
+        return array.cast(pyarrow.timestamp("s")).cast(arrow_type)
+    return array.cast(arrow_type)
+
+
+class ParquetTableWriter:
+    """
+    Rows written in a Parquet file, with typed columns, by row groups
+    """
+
+    def __init__(self, file_name, columns, column_types, row_group_size = PARQUET_ROW_GROUP_SIZE):
+        """
+        :param file_name: path of the file to create
+        :param columns: column names
+        :param column_types: column types (string, date, int32, float64)
+        :param row_group_size: number of rows of a row group
+        """
+        pyarrow = load_pyarrow()
+        types = {
+            "string": pyarrow.string(),
+            "date": pyarrow.date32(),
+            "int32": pyarrow.int32(),
+            "float64": pyarrow.float64(),
+        }
+        self.schema = pyarrow.schema([(name, types[column_type]) for name, column_type in zip(columns, column_types)])
+        self.row_group_size = row_group_size
+        self.pending = []
+        self.writer = pyarrow.parquet.ParquetWriter(file_name, self.schema, compression="zstd")
+
+    def _flush(self):
+        """
+        Write pending rows as one row group, column by column
+        """
+        if not self.pending:
+            return
+        pyarrow = load_pyarrow()
+        arrays = [to_arrow_array(values, field.type) for values, field in zip(zip(*self.pending), self.schema)]
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema), row_group_size=len(self.pending))
+        self.pending = []
+
+    def write_rows(self, rows):
+        """
+        :param rows: list of row tuples
+        :return: No Return
+        """
+        self.pending.extend(rows)
+        if len(self.pending) >= self.row_group_size:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+
+def open_table_writer(file_name, columns, column_types, output_format = "csv", header = True):
+    """
+    Open a writer of rows in a format
+
+    :param file_name: path of the file to create
+    :param columns: column names
+    :param column_types: column types, used by typed formats
+    :param output_format: one of OUTPUT_FORMATS
+    :param header: write the csv header
+    :return: CsvTableWriter or ParquetTableWriter
+    :raise RuntimeError: when the library of the format is not installed
+    """
+    if not format_available(output_format):
+        raise RuntimeError(f"Output format {output_format} is not available, its library is not installed")
+    if output_format == "parquet":
+        return ParquetTableWriter(file_name, columns, column_types)
+    return CsvTableWriter(file_name, columns, output_format, header)
+
+
+def merge_part_files(part_files, file_name, output_format):
+    """
+    Merge part files in one file and remove them.
+    Csv parts are concatenated as they are (compressed streams can be concatenated),
+    Parquet parts are copied row group by row group.
+
+    :param part_files: part files, in order, only the first one has a csv header
+    :param file_name: complete file to create
+    :param output_format: one of OUTPUT_FORMATS
+    :return: No Return
+    """
+    if output_format == "parquet":
+        pyarrow = load_pyarrow()
+        writer = None
+        for part_file in part_files:
+            part = pyarrow.parquet.ParquetFile(part_file)
+            writer = writer or pyarrow.parquet.ParquetWriter(file_name, part.schema_arrow, compression="zstd")
+            for row_group in range(part.num_row_groups):
+                writer.write_table(part.read_row_group(row_group))
+            os.remove(part_file)
+        if writer:
+            writer.close()
+        return
+
+    with open(file_name, "wb") as output:
+        for part_file in part_files:
+            with open(part_file, "rb") as part:
+                while chunk := part.read(WRITE_BUFFER_SIZE):
+                    output.write(chunk)
+            os.remove(part_file)
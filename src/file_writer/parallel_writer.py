@@ -0,0 +1,154 @@
+"""
+Multi-process generation of the sales files.
+Lines are split in parts of whole generation blocks, each part is generated by a worker process
+and written to its own part files. For a given seed the lines are the same whatever the number of workers.
+"""
+
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from business.bulk_engine import DEFAULT_BLOCK_SIZE, draw_seed, iter_bulk_sales
+from file_writer.file_writer import write_sales_files
+from file_writer.formats import merge_part_files, output_file_name
+from logs.logs import init_worker_logging, start_worker_logging
+
+
+def split_lines(lines_to_create, parts, block_size = DEFAULT_BLOCK_SIZE):
+    """
+    Split a number of lines in parts of whole blocks, of nearly the same size
+
+    :param lines_to_create: number of lines
+    :param parts: maximum number of parts
+    :param block_size: number of lines per block, only the last block can be smaller
+    :return: list of (first block number, number of lines) tuples, without empty parts
+    """
+    blocks = -(-lines_to_create // block_size)
+    size, remainder = divmod(blocks, parts)
+    result = []
+    first_block = 0
+    for index in range(min(parts, blocks)):
+        part_blocks = size + 1 if index < remainder else size
+        lines = min(part_blocks * block_size, lines_to_create - first_block * block_size)
+        result.append((first_block, lines))
+        first_block = first_block + part_blocks
+    return result
+
+
+def write_sales_part(first_block, lines_to_create, seed, date_sampler, **file_options):
+    """
+    Generate and write a part of the sales files, run in a worker process
+
+    :param first_block: number of the first generation block of the part
+    :param lines_to_create: number of lines of the part
+    :param seed: seed shared by every part
+    :param date_sampler: DateSampler used for sale dates
+    :param file_options: write_sales_files parameters (files, columns, format, header, dictionary encoding)
+    :return: number of lines written
+    """
+    rows = iter_bulk_sales(
+        lines_to_create=lines_to_create,
+        date_sampler=date_sampler,
+        seed=seed,
+        first_block=first_block
+    )
+    return write_sales_files(rows=rows, total=lines_to_create, **file_options)
+
+
+def write_sales_files_parallel(
+        lines_to_create,
+        workers,
+        sales_csv_file,
+        sales_columns,
+        campaign_product_csv_file,
+        campaign_product_columns,
+        date_sampler,
+        seed = None,
+        merge_parts = True,
+        output_format = "csv",
+        sales_column_types = None,
+        campaign_product_column_types = None,
+        dictionary_encoded = False
+):
+    """
+    Generate the sales files with a pool of worker processes
+
+    :param lines_to_create: number of lines to create
+    :param workers: number of worker processes, also the maximum number of parts
+    :param sales_csv_file: path of the sales file
+    :param sales_columns: header of the sales file
+    :param campaign_product_csv_file: path of the campaign/product file
+    :param campaign_product_columns: header of the campaign/product file
+    :param date_sampler: DateSampler used for sale dates
+    :param seed: seed of the generation, drawn and logged if None
+    :param merge_parts: merge part files in the configured files, keep part files otherwise
+    :param output_format: one of formats.OUTPUT_FORMATS
+    :param sales_column_types: types of the sales columns, needed by typed formats
+    :param campaign_product_column_types: types of the campaign/product columns, needed by typed formats
+    :param dictionary_encoded: write country and product ids instead of their names
+    :return: number of lines written
+    """
+    if seed is None:
+        seed = draw_seed()
+    parts = split_lines(lines_to_create, workers)
+    sales_part_files = [output_file_name(sales_csv_file, output_format, index) for index in range(len(parts))]
+    campaign_product_part_files = [
+        output_file_name(campaign_product_csv_file, output_format, index) for index in range(len(parts))
+    ]
+    file_options = {
+        "sales_columns": sales_columns,
+        "campaign_product_columns": campaign_product_columns,
+        "output_format": output_format,
+        "sales_column_types": sales_column_types,
+        "campaign_product_column_types": campaign_product_column_types,
+        "dictionary_encoded": dictionary_encoded,
+    }
+    logging.info(f"Generation of {lines_to_create} lines in {len(parts)} parts, seed {seed}")
+    if not parts:
+        return write_sales_files(
+            rows=[],
+            sales_csv_file=sales_csv_file,
+            campaign_product_csv_file=campaign_product_csv_file,
+            **file_options
+        )
+
+    start_time = time.perf_counter()
+    rows_written = 0
+    # Records logged by the workers are written by the parent process
+    log_listener, log_initargs = start_worker_logging()
+    try:
+        with ProcessPoolExecutor(
+                max_workers=len(parts), initializer=init_worker_logging, initargs=log_initargs
+        ) as executor:
+            futures = {
+                executor.submit(
+                    write_sales_part,
+                    *parts[index],
+                    seed,
+                    date_sampler,
+                    sales_csv_file=sales_part_files[index],
+                    campaign_product_csv_file=campaign_product_part_files[index],
+                    # Merged parts are concatenated: only the first one has a header
+                    header=index == 0 or not merge_parts,
+                    **file_options
+                ): index
+                for index in range(len(parts))
+            }
+            for future in as_completed(futures):
+                part_rows = future.result()
+                rows_written = rows_written + part_rows
+                logging.info(
+                    f"Part {futures[future] + 1}/{len(parts)}: {part_rows} lines, {rows_written}/{lines_to_create}"
+                )
+    finally:
+        # Workers have exited, their last records are in the queue before the listener stops
+        log_listener.stop()
+
+    if merge_parts:
+        merge_part_files(sales_part_files, sales_csv_file, output_format)
+        merge_part_files(campaign_product_part_files, campaign_product_csv_file, output_format)
+
+    elapsed = time.perf_counter() - start_time
+    rate = rows_written / elapsed if elapsed > 0 else 0.0
+    logging.info(f"{rows_written} lines generated in {elapsed:.1f} s, {rate:.0f} lines/s")
+    return rows_written
@@ -0,0 +1,163 @@
+"""
+Asynchronous batch pushing management.
+Generation and sending are pipelined through an asyncio.Queue, requests in flight are bounded by a semaphore.
+"""
+
+import asyncio
+import logging
+import time
+
+from http_client.async_http_client import AsyncConnectionPool, send_json_async
+from http_client.batch_pusher import PushReport
+from http_client.http_client import SendError
+
+
+async def send_batch_async(batch_id, batch, url, headers, timeout, method, report, pool, retry_policy,
+                           request_limiter, record_limiter, compressor = None, body_format = "json"):
+    """
+    Send one batch and record its status
+
+    :param batch_id: batch number, used in logs
+    :param batch: list of records
+    :param url: API endpoint
+    :param headers: query headers
+    :param timeout: query timeout
+    :param method: query method
+    :param report: PushReport to update
+    :param pool: AsyncConnectionPool to use
+    :param retry_policy: RetryPolicy to use
+    :param request_limiter: TokenBucket limiting requests per second, no limit if None
+    :param record_limiter: TokenBucket limiting records per second, no limit if None
+    :param compressor: RequestCompressor of the bodies, sent as they are if None
+    :param body_format: json or ndjson
+    :return: No Return
+    """
+    start_time = time.perf_counter()
+    status = None
+    try:
+        resp = await send_json_async(
+            url=url,
+            payload=batch,
+            headers=headers,
+            timeout=timeout,
+            method=method,
+            pool=pool,
+            retry_policy=retry_policy,
+            request_limiter=request_limiter,
+            record_limiter=record_limiter,
+            compressor=compressor,
+            body_format=body_format
+        )
+        status = resp["status"]
+    except SendError as e:
+        status = e.status
+    except Exception:
+        logging.exception(f"Batch {batch_id}: error on query")
+
+    success = status is not None and 200 <= status < 300
+    latency = time.perf_counter() - start_time
+    report.add_batch(len(batch), success, latency)
+    logging.info(
+        "Batch %d: %d records, status %s, %.0f ms, %s",
+        batch_id, len(batch), status, latency * 1000, "OK" if success else "FAILED",
+        extra={"batch_id": batch_id, "records": len(batch), "status": status, "latency_ms": latency * 1000,
+               "success": success}
+    )
+
+
+async def produce_batches(batches, queue):
+    """
+    Put generated batches in the queue, waiting when the queue is full.
+    Batches are generated in a worker thread: a slow or paced generation does not block the event loop.
+
+    :param batches: iterable of batches (list of records), consumed lazily
+    :param queue: asyncio.Queue, None is put at the end, also when the generation fails
+    :return: No Return
+    """
+    batches = iter(batches)
+    try:
+        while (batch := await asyncio.to_thread(next, batches, None)) is not None:
+            await queue.put(batch)
+    finally:
+        # The consumer stops on None, the error of the generation is raised when the producer is awaited
+        await queue.put(None)
+
+
+async def push_batches_async(
+        batches,
+        url,
+        headers,
+        timeout,
+        method = "POST",
+        max_in_flight = 4,
+        retry_policy = None,
+        request_limiter = None,
+        record_limiter = None,
+        compressor = None,
+        body_format = "json",
+        report = None
+):
+    """
+    Send batches to an API from the running event loop.
+    At most `max_in_flight` requests are sent at the same time, generation runs ahead by as many batches.
+
+    :param batches: iterable of batches (list of records), consumed lazily
+    :param url: API endpoint
+    :param headers: query headers
+    :param timeout: query timeout
+    :param method: query method
+    :param max_in_flight: maximum number of batches being sent at the same time
+    :param retry_policy: RetryPolicy to use, no retry if None
+    :param request_limiter: TokenBucket limiting requests per second, no limit if None
+    :param record_limiter: TokenBucket limiting records per second, no limit if None
+    :param compressor: RequestCompressor of the bodies, sent as they are if None
+    :param body_format: json (array of records) or ndjson (one record per line)
+    :param report: PushReport to update, read while the push runs, new one if None
+    :return: PushReport
+    """
+    report = report or PushReport()
+    pool = AsyncConnectionPool()
+    queue = asyncio.Queue(maxsize=max_in_flight)
+    in_flight = asyncio.Semaphore(max_in_flight)
+    tasks = set()
+
+    async def send(batch_id, batch):
+        try:
+            await send_batch_async(
+                batch_id, batch, url, headers, timeout, method, report, pool,
+                retry_policy, request_limiter, record_limiter, compressor, body_format
+            )
+        finally:
+            in_flight.release()
+
+    producer = asyncio.create_task(produce_batches(batches, queue))
+    batch_id = 0
+    try:
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                break
+            batch_id = batch_id + 1
+            await in_flight.acquire()
+            task = asyncio.create_task(send(batch_id, batch))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        # Batches already sent are completed before a generation error is raised
+        await asyncio.gather(*tasks)
+        await producer
+    finally:
+        pool.close()
+
+    report.end_time = time.perf_counter()
+    report.log_summary()
+    return report
+
+
+def run_push_batches_async(*args, **kwargs):
+    """
+    Run push_batches_async in a new event loop, same parameters
+
+    :return: PushReport
+    """
+    return asyncio.run(push_batches_async(*args, **kwargs))
@@ -0,0 +1,243 @@
+"""
+Asynchronous HTTP requests management, HTTP/1.1 over asyncio streams.
+Same request/response contract as http_client.send_json.
+"""
+
+import asyncio
+import http.client
+import logging
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from http_client.connection_pool import PooledResponse, request_body
+from http_client.encoder import BODY_FORMATS
+from http_client.http_client import SendError, encode_request_body, observe_response
+from http_client.retry import no_retry_policy
+
+# Errors raised when a kept alive connection was closed by the server
+STALE_CONNECTION_ERRORS = (
+    ConnectionError,
+    asyncio.IncompleteReadError,
+)
+
+
+async def read_http_message(reader):
+    """
+    Read an HTTP/1.1 message (request or response) from a stream
+
+    :param reader: asyncio.StreamReader
+    :return: tuple (start line, headers as http.client.HTTPMessage, body bytes)
+    :raise asyncio.IncompleteReadError: when the stream is closed before the end of the message
+    """
+    start_line = (await reader.readuntil(b"\r\n")).decode("latin-1").rstrip("\r\n")
+    # Case insensitive names, repeated headers are all kept
+    headers = http.client.HTTPMessage()
+    while True:
+        line = await reader.readuntil(b"\r\n")
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip()] = value.strip()
+
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            if size == 0:
+                # Trailers are ignored
+                while await reader.readuntil(b"\r\n") != b"\r\n":
+                    pass
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        body = b"".join(chunks)
+    else:
+        body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+    return start_line, headers, body
+
+
+class AsyncConnectionPool:
+    """
+    Pool of keep-alive asyncio stream connections, by (scheme, host, port)
+    """
+
+    def __init__(self):
+        # Idle connections: key -> list of (reader, writer)
+        self.idle = defaultdict(list)
+
+    async def _open(self, key):
+        scheme, host, port = key
+        logging.debug(f"Open connection to {scheme}://{host}:{port}")
+        return await asyncio.open_connection(host, port, ssl=scheme == "https")
+
+    async def _send(self, reader, writer, method, host, path, body, headers):
+        """
+        Write a request and read its full response
+
+        :return: tuple (PooledResponse, True if the server closes the connection)
+        """
+        body = request_body(body)
+        chunked = body is not None and not isinstance(body, bytes)
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {host}"]
+        lines.append("Transfer-Encoding: chunked" if chunked else f"Content-Length: {len(body or b'')}")
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        if chunked:
+            # Streamed body: chunks are written as they are produced
+            writer.write(head)
+            for chunk in body:
+                if chunk:
+                    writer.write(f"{len(chunk):x}\r\n".encode("latin-1") + chunk + b"\r\n")
+                    await writer.drain()
+            writer.write(b"0\r\n\r\n")
+        else:
+            writer.write(head + (body or b""))
+        await writer.drain()
+
+        status_line, response_headers, response_body = await read_http_message(reader)
+        _, status, reason = (status_line.split(" ", 2) + [""])[:3]
+        will_close = response_headers.get("connection", "").lower() == "close"
+        return PooledResponse(int(status), reason, response_headers, response_body), will_close
+
+    async def request(self, method, url, body = None, headers = None, timeout = None):
+        """
+        Send an HTTP request on a pooled connection.
+        A reused connection closed by the server is reopened and the request is sent again once.
+
+        :param method: request method
+        :param url: request url
+        :param body: request body (bytes), or function returning a new iterable of chunks sent with chunked encoding
+        :param headers: request headers
+        :param timeout: request timeout in seconds
+        :return: PooledResponse
+        """
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+
+        async with asyncio.timeout(timeout):
+            reused = bool(self.idle[key])
+            reader, writer = self.idle[key].pop() if reused else await self._open(key)
+            try:
+                response, will_close = await self._send(reader, writer, method, parts.netloc, path, body, headers)
+            except STALE_CONNECTION_ERRORS:
+                writer.close()
+                if not reused:
+                    raise
+                # Kept alive connection closed by the server: reconnect transparently
+                logging.debug(f"Stale connection to {parts.netloc}, reconnecting")
+                reader, writer = await self._open(key)
+                try:
+                    response, will_close = await self._send(reader, writer, method, parts.netloc, path, body, headers)
+                except BaseException:
+                    writer.close()
+                    raise
+            except BaseException:
+                writer.close()
+                raise
+
+        if will_close:
+            writer.close()
+        else:
+            self.idle[key].append((reader, writer))
+        return response
+
+    def close(self):
+        """
+        Close every idle connection
+
+        :return: No Return
+        """
+        for connections in self.idle.values():
+            for _, writer in connections:
+                writer.close()
+            connections.clear()
+
+
+async def send_json_async(
+        url,
+        payload,
+        headers,
+        timeout,
+        method = 'POST',
+        pool = None,
+        retry_policy = None,
+        request_limiter = None,
+        record_limiter = None,
+        compressor = None,
+        body_format = "json"
+):
+    """
+    Sends JSON payload to an API without blocking the event loop.
+    Failed queries are sent again following the retry policy.
+
+    :param url: API endpoint
+    :param payload: payload
+    :param headers: query headers
+    :param timeout: query timeout
+    :param method: query method
+    :param pool: AsyncConnectionPool to use, must belong to the running event loop
+    :param retry_policy: RetryPolicy to use, no retry if None
+    :param request_limiter: TokenBucket limiting requests per second, no limit if None
+    :param record_limiter: TokenBucket limiting records per second, no limit if None
+    :param compressor: RequestCompressor of the body, sent as it is if None
+    :param body_format: json (array of records) or ndjson (one record per line)
+    :return: returns the result sent by the endpoint
+    :raise SendError: when the query failed after every allowed attempt
+    """
+    hdrs = dict(headers or {})
+    hdrs.setdefault('Content-Type', BODY_FORMATS[body_format])
+    data_bytes = encode_request_body(payload, hdrs, compressor, body_format)
+    retry_policy = retry_policy or no_retry_policy
+    records = len(payload) if isinstance(payload, list) else 1
+
+    attempt = 1
+    while True:
+        # Rate limiting, each attempt counts
+        if request_limiter:
+            await request_limiter.acquire_async()
+        if record_limiter:
+            await record_limiter.acquire_async(records)
+
+        status = None
+        retry_after = None
+        try:
+            logging.info("Send %s to %s", method, url)
+
+            # Send query
+            start_time = time.perf_counter()
+            try:
+                resp = await pool.request(method, url, body=data_bytes, headers=hdrs, timeout=timeout)
+                status = resp.status
+            finally:
+                observe_response(status, start_time, data_bytes)
+            # Answers not in UTF-8 are kept readable instead of failing the send
+            body = resp.body.decode('utf-8', errors='replace')
+            if status < 400:
+                logging.info("HTTP answer %s", status)
+                logging.debug("HTTP answer %s, Headers: %s", body, resp.headers)
+                return {
+                    'status': status,
+                    'body': body,
+                    'headers': resp.headers,
+                }
+            retry_after = resp.get_header('Retry-After')
+            reason = f"HTTPError {status}: {body}"
+        # Exception management
+        except (OSError, TimeoutError, asyncio.IncompleteReadError, http.client.HTTPException, ValueError) as e:
+            reason = f"URLError: {e!r}"
+
+        if attempt >= retry_policy.max_attempts or not retry_policy.is_retryable(status):
+            logging.error(f"{reason}, attempt {attempt}/{retry_policy.max_attempts}, giving up")
+            raise SendError(reason, status)
+
+        delay = retry_policy.delay(attempt, retry_after)
+        logging.warning(f"{reason}, attempt {attempt}/{retry_policy.max_attempts}, retry in {delay:.2f} s")
+        await asyncio.sleep(delay)
+        attempt = attempt + 1
@@ -0,0 +1,195 @@
+"""
+Batch pushing management, batches are sent concurrently while next ones are generated
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from http_client.connection_pool import ConnectionPool
+from http_client.http_client import SendError, send_json
+from metrics.metrics import batches_sent, records_sent, stage_seconds
+
+
+class PushReport:
+    """
+    Results of a push run, updated by the sending threads
+    """
+
+    def __init__(self, keep_latencies = False):
+        """
+        :param keep_latencies: keep the latency of every batch, for benchmarks (memory grows with the batches)
+        """
+        self.lock = threading.Lock()
+        self.batches_ok = 0
+        self.batches_failed = 0
+        self.records_ok = 0
+        self.records_failed = 0
+        self.latencies = [] if keep_latencies else None
+        self.start_time = time.perf_counter()
+        self.end_time = None
+
+    def add_batch(self, records, success, latency = None):
+        """
+        Record the result of a batch
+
+        :param records: number of records in the batch
+        :param success: True if the batch was accepted by the endpoint
+        :param latency: seconds spent sending the batch, retries included
+        :return: No Return
+        """
+        result = "ok" if success else "failed"
+        batches_sent.inc(1, result)
+        records_sent.inc(records, result)
+        if latency is not None:
+            stage_seconds.observe(latency, "batch")
+        with self.lock:
+            if self.latencies is not None and latency is not None:
+                self.latencies.append(latency)
+            if success:
+                self.batches_ok = self.batches_ok + 1
+                self.records_ok = self.records_ok + records
+            else:
+                self.batches_failed = self.batches_failed + 1
+                self.records_failed = self.records_failed + records
+
+    def elapsed(self):
+        """
+        :return: duration of the run in seconds
+        """
+        return (self.end_time or time.perf_counter()) - self.start_time
+
+    def records_per_second(self):
+        """
+        :return: throughput of accepted records
+        """
+        elapsed = self.elapsed()
+        return self.records_ok / elapsed if elapsed > 0 else 0.0
+
+    def log_summary(self):
+        """
+        Log the summary of the run
+
+        :return: No Return
+        """
+        logging.info(
+            f"Push finished: {self.batches_ok} batches OK, {self.batches_failed} batches failed, "
+            f"{self.records_ok} records sent, {self.records_failed} records failed, "
+            f"{self.elapsed():.2f} s, {self.records_per_second():.0f} records/s",
+            extra={
+                "batches_ok": self.batches_ok,
+                "batches_failed": self.batches_failed,
+                "records_ok": self.records_ok,
+                "records_failed": self.records_failed,
+                "elapsed_seconds": self.elapsed(),
+            }
+        )
+
+
+def send_batch(batch_id, batch, url, headers, timeout, method, report, retry_policy, request_limiter, record_limiter,
+               compressor = None, body_format = "json", pool = None):
+    """
+    Send one batch and record its status
+
+    :param batch_id: batch number, used in logs
+    :param batch: list of records
+    :param url: API endpoint
+    :param headers: query headers
+    :param timeout: query timeout
+    :param method: query method
+    :param report: PushReport to update
+    :param retry_policy: RetryPolicy to use
+    :param request_limiter: TokenBucket limiting requests per second, no limit if None
+    :param record_limiter: TokenBucket limiting records per second, no limit if None
+    :param compressor: RequestCompressor of the bodies, sent as they are if None
+    :param body_format: json or ndjson
+    :param pool: ConnectionPool to use, shared default pool if None
+    :return: No Return
+    """
+    start_time = time.perf_counter()
+    status = None
+    try:
+        resp = send_json(
+            url=url,
+            payload=batch,
+            headers=headers,
+            timeout=timeout,
+            method=method,
+            retry_policy=retry_policy,
+            request_limiter=request_limiter,
+            record_limiter=record_limiter,
+            compressor=compressor,
+            body_format=body_format,
+            pool=pool
+        )
+        status = resp["status"]
+    except SendError as e:
+        status = e.status
+    except Exception:
+        logging.exception(f"Batch {batch_id}: error on query")
+
+    success = status is not None and 200 <= status < 300
+    latency = time.perf_counter() - start_time
+    report.add_batch(len(batch), success, latency)
+    logging.info(
+        "Batch %d: %d records, status %s, %.0f ms, %s",
+        batch_id, len(batch), status, latency * 1000, "OK" if success else "FAILED",
+        extra={"batch_id": batch_id, "records": len(batch), "status": status, "latency_ms": latency * 1000,
+               "success": success}
+    )
+
+
+def push_batches(
+        batches,
+        url,
+        headers,
+        timeout,
+        method = "POST",
+        max_in_flight = 4,
+        retry_policy = None,
+        request_limiter = None,
+        record_limiter = None,
+        compressor = None,
+        body_format = "json",
+        report = None
+):
+    """
+    Send batches to an API over a bounded pool of threads.
+    Generation of next batches is blocked when `max_in_flight` batches are being sent.
+    Batches are sent on a connection pool of `max_in_flight` connections, closed at the end.
+
+    :param batches: iterable of batches (list of records), consumed lazily
+    :param url: API endpoint
+    :param headers: query headers
+    :param timeout: query timeout
+    :param method: query method
+    :param max_in_flight: maximum number of batches being sent at the same time
+    :param retry_policy: RetryPolicy to use, no retry if None
+    :param request_limiter: TokenBucket limiting requests per second, no limit if None
+    :param record_limiter: TokenBucket limiting records per second, no limit if None
+    :param compressor: RequestCompressor of the bodies, sent as they are if None
+    :param body_format: json (array of records) or ndjson (one record per line)
+    :param report: PushReport to update, read while the push runs, new one if None
+    :return: PushReport
+    """
+    report = report or PushReport()
+    in_flight = threading.BoundedSemaphore(max_in_flight)
+    # One connection per sending thread, the default pool would cap them to its own size
+    pool = ConnectionPool(max_per_host=max_in_flight)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="push") as executor:
+            for batch_id, batch in enumerate(batches, start=1):
+                in_flight.acquire()
+                future = executor.submit(
+                    send_batch, batch_id, batch, url, headers, timeout, method, report,
+                    retry_policy, request_limiter, record_limiter, compressor, body_format, pool
+                )
+                future.add_done_callback(lambda _: in_flight.release())
+    finally:
+        pool.close()
+
+    report.end_time = time.perf_counter()
+    report.log_summary()
+    return report
@@ -0,0 +1,121 @@
+"""
+Request body compression, bodies are compressed once and sent with their Content-Encoding header
+"""
+
+import logging
+import threading
+import zlib
+
+from libraries.libraries import load_zstd
+
+# Available content encodings, identity sends bodies as they are
+CONTENT_ENCODINGS = ("identity", "gzip", "deflate", "zstd")
+
+# Bodies smaller than this size are not compressed
+DEFAULT_MIN_BYTES = 1024
+
+# Compression levels, chosen for throughput
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+class RequestCompressor:
+    """
+    Compress request bodies with one content encoding, shared by sending threads.
+    Totals of the run are kept for the final summary.
+    """
+
+    def __init__(self, encoding, min_bytes = DEFAULT_MIN_BYTES):
+        """
+        :param encoding: gzip, deflate or zstd
+        :param min_bytes: bodies smaller than this size are sent as they are
+        """
+        if encoding not in CONTENT_ENCODINGS or encoding == "identity":
+            raise ValueError(f"Invalid content encoding: {encoding}")
+        # zstd libraries are only imported when the zstd encoding is used
+        self.zstd, self.zstandard = load_zstd() if encoding == "zstd" else (None, None)
+        if encoding == "zstd" and self.zstd is None and self.zstandard is None:
+            raise ValueError("zstd content encoding needs Python 3.14 or the zstandard package")
+        self.encoding = encoding
+        self.min_bytes = min_bytes
+        self.lock = threading.Lock()
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _compress(self, body):
+        match self.encoding:
+            case "gzip":
+                # gzip format written by zlib (wbits 31), header without time: the gzip module is not imported
+                return zlib.compress(body, GZIP_LEVEL, wbits=31)
+            case "deflate":
+                # HTTP deflate is the zlib format (RFC 9110)
+                return zlib.compress(body, GZIP_LEVEL)
+            case "zstd" if self.zstd is not None:
+                return self.zstd.compress(body, level=ZSTD_LEVEL)
+            case _:
+                return self.zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+
+    def compress(self, body):
+        """
+        Compress a request body
+
+        :param body: body bytes
+        :return: tuple (body to send, Content-Encoding value or None when the body is sent as it is)
+        """
+        if len(body) < self.min_bytes:
+            return body, None
+        compressed = self._compress(body)
+        # Incompressible body: compression would only cost time on both sides
+        if len(compressed) >= len(body):
+            return body, None
+        with self.lock:
+            self.bytes_in = self.bytes_in + len(body)
+            self.bytes_out = self.bytes_out + len(compressed)
+        return compressed, self.encoding
+
+    def log_summary(self):
+        """
+        Log compression totals of the run
+
+        :return: No Return
+        """
+        ratio = self.bytes_in / self.bytes_out if self.bytes_out else 0.0
+        logging.info(
+            f"Compression ({self.encoding}): {self.bytes_in} bytes compressed to {self.bytes_out} bytes, "
+            f"ratio {ratio:.1f}, {self.bytes_in - self.bytes_out} bytes saved"
+        )
+
+
+def compress_body(body, headers, compressor):
+    """
+    Compress a request body and set its Content-Encoding header
+
+    :param body: body bytes
+    :param headers: request headers (dict), updated
+    :param compressor: RequestCompressor, body sent as it is if None
+    :return: body to send
+    """
+    if compressor is None:
+        return body
+    compressed, encoding = compressor.compress(body)
+    if encoding is None:
+        return body
+    headers['Content-Encoding'] = encoding
+    logging.info(
+        "Body compressed with %s: %d -> %d bytes, ratio %.1f, %d bytes saved",
+        encoding, len(body), len(compressed), len(body) / len(compressed), len(body) - len(compressed)
+    )
+    return compressed
+
+
+def build_request_compressor(content_encoding, min_bytes = DEFAULT_MIN_BYTES):
+    """
+    Build the request compressor from the configuration
+
+    :param content_encoding: one of CONTENT_ENCODINGS
+    :param min_bytes: bodies smaller than this size are sent as they are
+    :return: RequestCompressor, None for identity
+    """
+    if content_encoding == "identity":
+        return None
+    return RequestCompressor(content_encoding, min_bytes)
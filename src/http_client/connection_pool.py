@@ -0,0 +1,285 @@
+"""
+Persistent HTTP connections management, connections are kept alive and reused between requests
+"""
+
+import http.client
+import logging
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+# Maximum number of connections opened at the same time to one host
+DEFAULT_MAX_PER_HOST = 8
+
+# Idle connections older than this number of seconds are closed
+DEFAULT_IDLE_TIMEOUT = 30.0
+
+# Errors raised when a kept alive connection was closed by the server
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+)
+
+
+def request_body(body):
+    """
+    Get the body to send for one attempt of a request
+
+    :param body: bytes, None, or function returning a new iterable of chunks (a streamed body is consumed by a send)
+    :return: bytes, None or iterable of chunks
+    """
+    return body() if callable(body) else body
+
+
+class PooledResponse:
+    """
+    Fully read HTTP response, the connection is back in the pool when it is built
+    """
+
+    def __init__(self, status, reason, headers, body):
+        """
+        :param status: status code
+        :param reason: reason phrase
+        :param headers: http.client.HTTPMessage, repeated headers are all kept
+        :param body: body bytes
+        """
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def get_header(self, name, default = None):
+        """
+        Get a header value, header names are case insensitive
+
+        :param name: header name
+        :param default: value returned when the header is missing
+        :return: header value
+        """
+        return self.headers.get(name, default)
+
+
+class ConnectionPool:
+    """
+    Pool of keep-alive HTTP/HTTPS connections, by (scheme, host, port)
+    """
+
+    def __init__(self, max_per_host = DEFAULT_MAX_PER_HOST, idle_timeout = DEFAULT_IDLE_TIMEOUT):
+        """
+        :param max_per_host: maximum number of connections opened at the same time to one host
+        :param idle_timeout: idle connections older than this number of seconds are closed
+        """
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        # Idle connections: key -> deque of (connection, last use time)
+        self.idle = {}
+        # Connections slots: key -> semaphore of max_per_host
+        self.slots = {}
+
+    def _slot(self, key):
+        with self.lock:
+            if key not in self.slots:
+                self.slots[key] = threading.BoundedSemaphore(self.max_per_host)
+                self.idle[key] = deque()
+            return self.slots[key]
+
+    def _new_connection(self, key, timeout):
+        scheme, host, port = key
+        logging.debug(f"Open connection to {scheme}://{host}:{port}")
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=timeout)
+        return http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _evict_expired(self, idle, now):
+        """
+        Close the expired connections of a deque of idle connections, called with the lock held.
+        Connections are appended when released: the oldest ones are on the left.
+
+        :param idle: deque of (connection, last use time)
+        :param now: time.monotonic() value
+        :return: number of connections closed
+        """
+        closed = 0
+        while idle and now - idle[0][1] >= self.idle_timeout:
+            conn, _ = idle.popleft()
+            conn.close()
+            closed = closed + 1
+        return closed
+
+    def _get_idle(self, key):
+        """
+        Get the most recently used idle connection, closing the expired ones
+
+        :param key: (scheme, host, port)
+        :return: connection or None
+        """
+        with self.lock:
+            idle = self.idle[key]
+            self._evict_expired(idle, time.monotonic())
+            return idle.pop()[0] if idle else None
+
+    def _put_idle(self, key, conn):
+        now = time.monotonic()
+        with self.lock:
+            idle = self.idle[key]
+            # Connections left idle under fresher ones are closed here, not only when they are reached
+            self._evict_expired(idle, now)
+            idle.append((conn, now))
+
+    def evict_idle(self):
+        """
+        Close every idle connection older than idle_timeout
+
+        :return: number of connections closed
+        """
+        now = time.monotonic()
+        with self.lock:
+            return sum(self._evict_expired(idle, now) for idle in self.idle.values())
+
+    def close(self):
+        """
+        Close every idle connection
+
+        :return: No Return
+        """
+        with self.lock:
+            for idle in self.idle.values():
+                for conn, _ in idle:
+                    conn.close()
+                idle.clear()
+
+    @staticmethod
+    def _split_url(url):
+        """
+        :param url: request url
+        :return: tuple (pool key (scheme, host, port), request path)
+        """
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+        return (scheme, parts.hostname, port), path
+
+    def _start(self, key, method, path, body, headers, timeout):
+        """
+        Send a request on an idle or new connection and read the response status and headers.
+        A reused connection closed by the server is reopened and the request is sent again once.
+
+        :return: tuple (connection, http.client.HTTPResponse)
+        """
+        conn = self._get_idle(key)
+        reused = conn is not None
+        if not reused:
+            conn = self._new_connection(key, timeout)
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+
+        try:
+            conn.request(method, path, body=request_body(body), headers=headers or {})
+            return conn, conn.getresponse()
+        except STALE_CONNECTION_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+        except Exception:
+            conn.close()
+            raise
+
+        # Kept alive connection closed by the server: reconnect transparently
+        logging.debug(f"Stale connection to {key[1]}:{key[2]}, reconnecting")
+        conn = self._new_connection(key, timeout)
+        try:
+            conn.request(method, path, body=request_body(body), headers=headers or {})
+            return conn, conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+
+    def _release(self, key, conn, response):
+        """
+        Put a connection back in the pool once its response is fully read
+
+        :return: No Return
+        """
+        if response.will_close:
+            conn.close()
+        else:
+            self._put_idle(key, conn)
+
+    def request(self, method, url, body = None, headers = None, timeout = None):
+        """
+        Send an HTTP request on a pooled connection and read the full response.
+
+        :param method: request method
+        :param url: request url
+        :param body: request body (bytes), or function returning a new iterable of chunks sent with chunked encoding
+        :param headers: request headers
+        :param timeout: socket timeout in seconds
+        :return: PooledResponse
+        """
+        key, path = self._split_url(url)
+        slot = self._slot(key)
+        slot.acquire()
+        try:
+            conn, response = self._start(key, method, path, body, headers, timeout)
+            try:
+                # Body must be fully read before the connection can be reused
+                pooled = PooledResponse(
+                    status=response.status,
+                    reason=response.reason,
+                    headers=response.headers,
+                    body=response.read()
+                )
+            except Exception:
+                conn.close()
+                raise
+            self._release(key, conn, response)
+            return pooled
+        finally:
+            slot.release()
+
+    def stream_lines(self, method, url, body = None, headers = None, timeout = None):
+        """
+        Send an HTTP request on a pooled connection and read the response line by line, as it arrives.
+        The connection goes back to the pool when every line was read, it is closed if the reading stops before.
+
+        :param method: request method
+        :param url: request url
+        :param body: request body (bytes)
+        :param headers: request headers
+        :param timeout: socket timeout in seconds, between two reads
+        :return: generator of lines (bytes)
+        :raise http.client.HTTPException: when the answer status is 400 or more
+        """
+        key, path = self._split_url(url)
+        slot = self._slot(key)
+        slot.acquire()
+        try:
+            conn, response = self._start(key, method, path, body, headers, timeout)
+            completed = False
+            try:
+                if response.status >= 400:
+                    content = response.read()
+                    completed = True
+                    raise http.client.HTTPException(f"HTTP {response.status}: {content[:200]!r}")
+                for line in response:
+                    yield line
+                completed = True
+            finally:
+                if completed:
+                    self._release(key, conn, response)
+                else:
+                    conn.close()
+        finally:
+            slot.release()
+
+
+default_pool = ConnectionPool()
@@ -0,0 +1,89 @@
+"""
+JSON encoding of request bodies, with orjson when installed and a reused stdlib encoder otherwise.
+Bodies can be a JSON array or NDJSON, one record per line.
+Records (business.records) are turned into JSON objects while they are encoded.
+"""
+
+import itertools
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Available body formats and their content type
+BODY_FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+
+# Number of NDJSON lines sent in one chunk of a streamed body
+NDJSON_CHUNK_RECORDS = 256
+
+def record_as_dict(value):
+    """
+    Encoder hook of the values JSON does not know: records are encoded as their dict
+
+    :param value: value to encode
+    :return: dict
+    :raise TypeError: when the value is not a record
+    """
+    try:
+        return value.as_dict()
+    except AttributeError:
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable") from None
+
+
+# Stdlib encoder built once: compact separators and no circular reference check.
+# ASCII output is kept, escaping is faster than encoding a non-ASCII str to UTF-8.
+stdlib_encoder = json.JSONEncoder(check_circular=False, separators=(",", ":"), default=record_as_dict)
+
+# Name of the encoder in use, for logs and benchmarks
+encoder_name = "orjson" if orjson is not None else "json"
+
+
+def encode_json(value):
+    """
+    Encode a value as JSON
+
+    :param value: JSON serializable value
+    :return: UTF-8 bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=record_as_dict)
+    return stdlib_encoder.encode(value).encode("ascii")
+
+
+def iter_ndjson(records, chunk_records = NDJSON_CHUNK_RECORDS):
+    """
+    Encode records as NDJSON while they are consumed
+
+    :param records: iterable of records
+    :param chunk_records: number of lines per returned chunk
+    :return: generator of chunks (bytes) of `chunk_records` lines
+    """
+    records = iter(records)
+    while chunk := list(itertools.islice(records, chunk_records)):
+        if orjson is not None:
+            yield b"".join(
+                orjson.dumps(record, default=record_as_dict, option=orjson.OPT_APPEND_NEWLINE) for record in chunk
+            )
+        else:
+            yield "".join(stdlib_encoder.encode(record) + "\n" for record in chunk).encode("ascii")
+
+
+def encode_body(payload, body_format = "json", stream = False):
+    """
+    Encode a request body
+
+    :param payload: record (dict or business.records record) or list of records
+    :param body_format: one of BODY_FORMATS
+    :param stream: NDJSON only, return a generator of chunks encoded while the body is sent
+    :return: bytes, or generator of bytes when streamed
+    """
+    if body_format == "ndjson":
+        records = payload if isinstance(payload, list) else [payload]
+        chunks = iter_ndjson(records)
+        return chunks if stream else b"".join(chunks)
+    return encode_json(payload)
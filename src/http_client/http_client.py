@@ -2,63 +2,154 @@
 HTTP requests management
 """
 
-import json
+import http.client
 import logging
-from urllib import request, error
+import time
 
+from http_client.compression import compress_body
+from http_client.connection_pool import default_pool
+from http_client.encoder import BODY_FORMATS, encode_body
+from http_client.retry import no_retry_policy
+from metrics.metrics import bytes_sent, http_request_seconds, http_responses, stage_seconds
 
-def _build_request(url, method, headers, body):
+
+def counted_chunks(chunks):
+    """
+    Count the bytes of a streamed body while it is sent
+
+    :param chunks: iterable of bytes
+    :return: generator of the same chunks
+    """
+    for chunk in chunks:
+        bytes_sent.inc(len(chunk))
+        yield chunk
+
+
+def encode_request_body(payload, headers, compressor, body_format):
+    """
+    Encode and compress the body of a request, sent bytes are counted in the metrics
+
+    :param payload: record or list of records
+    :param headers: query headers, Content-Encoding is added when the body is compressed
+    :param compressor: RequestCompressor of the body, sent as it is if None
+    :param body_format: json or ndjson
+    :return: bytes, or function returning a new generator of chunks for a streamed NDJSON body
+    """
+    if body_format == "ndjson" and compressor is None:
+        # Records are encoded while the body is sent, again for each attempt
+        return lambda: counted_chunks(encode_body(payload, body_format, True))
+    with stage_seconds.time("encoding"):
+        return compress_body(encode_body(payload, body_format), headers, compressor)
+
+
+def observe_response(status, start_time, data_bytes):
     """
-    Build an http request
+    Update the metrics of one HTTP request
 
-    :param url: request url
-    :param method: request method
-    :param headers: request headers
-    :param body: request body
-    :return: returns the request
+    :param status: HTTP status, None when no answer was received
+    :param start_time: time.perf_counter() when the request was sent
+    :param data_bytes: request body, bytes are counted here, streamed bodies while they are sent
+    :return: No Return
     """
-    req = request.Request(url=url, data=body, headers=headers or {}, method=method)
-    return req
+    http_request_seconds.observe(time.perf_counter() - start_time)
+    http_responses.inc(1, "error" if status is None else str(status))
+    if isinstance(data_bytes, bytes):
+        bytes_sent.inc(len(data_bytes))
 
 
-def send_json(url, payload, headers, timeout, method = 'POST'):
+class SendError(Exception):
     """
-    Sends JSON payload to an API
+    Query definitively failed, after every allowed attempt
+    """
+
+    def __init__(self, message, status = None):
+        super().__init__(message)
+        self.status = status
+
+
+def send_json(
+        url,
+        payload,
+        headers,
+        timeout,
+        method = 'POST',
+        pool = None,
+        retry_policy = None,
+        request_limiter = None,
+        record_limiter = None,
+        compressor = None,
+        body_format = "json"
+):
+    """
+    Sends JSON payload to an API, on a kept alive connection of the pool.
+    Failed queries are sent again following the retry policy.
 
     :param url: API endpoint
     :param payload: payload
     :param headers: query headers
     :param timeout: query timeout
     :param method: query method
+    :param pool: ConnectionPool to use, shared default pool if None
+    :param retry_policy: RetryPolicy to use, no retry if None
+    :param request_limiter: TokenBucket limiting requests per second, no limit if None
+    :param record_limiter: TokenBucket limiting records per second, no limit if None
+    :param compressor: RequestCompressor of the body, sent as it is if None
+    :param body_format: json (array of records) or ndjson (one record per line)
     :return: returns the result sent by the endpoint
+    :raise SendError: when the query failed after every allowed attempt
     """
-    data_bytes = json.dumps(payload).encode('utf-8')
-    hdrs = headers
-    hdrs.setdefault('Content-Type', 'application/json')
-
-    logging.debug(f"Payload {payload})")
-
-    try:
-        req = _build_request(url, method, hdrs, data_bytes)
-        logging.info(f"Send {method} to {url}")
-        logging.debug(f"Request {req})")
-
-        # Send query
-        with request.urlopen(req, timeout=timeout) as resp:
-            status = resp.getcode()
-            body = resp.read().decode('utf-8')
-            logging.info(f"HTTP answer {status}")
-            logging.debug(f"HTTP answer {body}, Headers: {dict(resp.headers.items())}")
-            return {
-                'status': status,
-                'body': body,
-                'headers': dict(resp.headers.items()),
-            }
-    # Exception management
-    except error.HTTPError as e:
-        content = e.read().decode('utf-8') if e.fp else ''
-        logging.error(f"HTTPError {e.code}: {content}")
-    except error.URLError as e:
-        logging.error(f"URLError: {e}")
-    except Exception:
-        logging.exception(f"Unknown error {Exception}")
+    hdrs = dict(headers or {})
+    hdrs.setdefault('Content-Type', BODY_FORMATS[body_format])
+    data_bytes = encode_request_body(payload, hdrs, compressor, body_format)
+    pool = pool or default_pool
+    retry_policy = retry_policy or no_retry_policy
+    records = len(payload) if isinstance(payload, list) else 1
+
+    # Payloads of thousands of records are only formatted when debug lines are written
+    logging.debug("Payload %s", payload)
+
+    attempt = 1
+    while True:
+        # Rate limiting, each attempt counts
+        if request_limiter:
+            request_limiter.acquire()
+        if record_limiter:
+            record_limiter.acquire(records)
+
+        status = None
+        retry_after = None
+        try:
+            logging.info("Send %s to %s", method, url)
+            logging.debug("Request headers %s", hdrs)
+
+            # Send query
+            start_time = time.perf_counter()
+            try:
+                resp = pool.request(method, url, body=data_bytes, headers=hdrs, timeout=timeout)
+                status = resp.status
+            finally:
+                observe_response(status, start_time, data_bytes)
+            # Answers not in UTF-8 are kept readable instead of failing the send
+            body = resp.body.decode('utf-8', errors='replace')
+            if status < 400:
+                logging.info("HTTP answer %s", status)
+                logging.debug("HTTP answer %s, Headers: %s", body, resp.headers)
+                return {
+                    'status': status,
+                    'body': body,
+                    'headers': resp.headers,
+                }
+            retry_after = resp.get_header('Retry-After')
+            reason = f"HTTPError {status}: {body}"
+        # Exception management
+        except (OSError, http.client.HTTPException) as e:
+            reason = f"URLError: {e}"
+
+        if attempt >= retry_policy.max_attempts or not retry_policy.is_retryable(status):
+            logging.error(f"{reason}, attempt {attempt}/{retry_policy.max_attempts}, giving up")
+            raise SendError(reason, status)
+
+        delay = retry_policy.delay(attempt, retry_after)
+        logging.warning(f"{reason}, attempt {attempt}/{retry_policy.max_attempts}, retry in {delay:.2f} s")
+        time.sleep(delay)
+        attempt = attempt + 1
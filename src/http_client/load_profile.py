@@ -0,0 +1,185 @@
+"""
+Load profiles: the rate of a push over time, as a sequence of stages.
+A stage is written on one line, durations in seconds and rates in records (or requests) per second:
+
+    constant <duration> <rate>
+    ramp <duration> <from_rate> <to_rate>
+    step <duration> <from_rate> <to_rate> <steps>
+    spike <duration> <base_rate> <peak_rate> <peak_duration>
+
+Stages are turned into linear segments, the pacing releases batches at the time the integral of the rate
+reaches the number of units already released.
+"""
+
+import math
+
+# Units of the profile rates: records per second, or requests (batches) per second
+PROFILE_UNITS = ("records", "requests")
+
+
+class LoadProfile:
+    """
+    Rate over time, made of consecutive linear segments
+    """
+
+    def __init__(self, segments, unit = "records"):
+        """
+        :param segments: list of (duration, start rate, end rate) tuples, the last duration can be math.inf
+        :param unit: one of PROFILE_UNITS
+        """
+        if unit not in PROFILE_UNITS:
+            raise ValueError(f"Invalid profile unit: {unit}")
+        if not segments:
+            raise ValueError("Empty load profile")
+        self.segments = segments
+        self.unit = unit
+        self.duration = sum(duration for duration, _, _ in segments)
+
+    def rate_at(self, elapsed):
+        """
+        :param elapsed: seconds since the start
+        :return: rate at this time, 0 after the end of the profile
+        """
+        for duration, start_rate, end_rate in self.segments:
+            if elapsed < duration:
+                return start_rate + (end_rate - start_rate) * elapsed / duration
+            elapsed = elapsed - duration
+        return 0.0
+
+    def units_at(self, elapsed):
+        """
+        :param elapsed: seconds since the start
+        :return: number of units released by the profile at this time
+        """
+        units = 0.0
+        for duration, start_rate, end_rate in self.segments:
+            if elapsed < duration:
+                rate = start_rate + (end_rate - start_rate) * elapsed / duration
+                return units + elapsed * (start_rate + rate) / 2
+            units = units + duration * (start_rate + end_rate) / 2
+            elapsed = elapsed - duration
+        return units
+
+    def time_of(self, units):
+        """
+        Get the time at which a number of units has been released
+
+        :param units: number of units released since the start
+        :return: seconds since the start, math.inf when the profile ends before
+        """
+        start = 0.0
+        for duration, start_rate, end_rate in self.segments:
+            if units <= 0:
+                return start
+            segment_units = duration * (start_rate + end_rate) / 2
+            if units < segment_units:
+                # units = start_rate * t + slope * t^2 / 2, solved in a form stable for any slope
+                slope = (end_rate - start_rate) / duration
+                discriminant = max(start_rate * start_rate + 2 * slope * units, 0.0)
+                return start + 2 * units / (start_rate + math.sqrt(discriminant))
+            units = units - segment_units
+            start = start + duration
+        return math.inf
+
+    def describe(self):
+        """
+        :return: one line description of the profile, for logs
+        """
+        if math.isinf(self.duration):
+            return f"{len(self.segments)} segments, endless, {self.unit} per second"
+        return f"{len(self.segments)} segments, {self.duration:.0f} s, {self.units_at(self.duration):.0f} {self.unit}"
+
+
+def parse_stage(line):
+    """
+    Parse one stage of a profile
+
+    :param line: stage line (ex. 'ramp 60 0 1000')
+    :return: list of (duration, start rate, end rate) segments
+    :raise ValueError: when the stage is invalid
+    """
+    kind, *values = line.split()
+    try:
+        values = [float(value) for value in values]
+    except ValueError:
+        raise ValueError(f"Invalid stage values: {line}") from None
+    arguments = {"constant": 2, "ramp": 3, "step": 4, "spike": 4}
+    if kind not in arguments:
+        raise ValueError(f"Invalid stage type: {kind}, expected one of {', '.join(arguments)}")
+    if len(values) != arguments[kind]:
+        raise ValueError(f"Stage {kind} expects {arguments[kind]} values: {line}")
+    if any(value < 0 for value in values) or values[0] <= 0:
+        raise ValueError(f"Stage durations must be greater than 0 and rates positive: {line}")
+
+    duration = values[0]
+    match kind:
+        case "constant":
+            return [(duration, values[1], values[1])]
+        case "ramp":
+            return [(duration, values[1], values[2])]
+        case "step":
+            from_rate, to_rate, steps = values[1], values[2], int(values[3])
+            if steps < 1:
+                raise ValueError(f"Stage step needs at least 1 step: {line}")
+            levels = [to_rate] if steps == 1 else [
+                from_rate + (to_rate - from_rate) * index / (steps - 1) for index in range(steps)
+            ]
+            return [(duration / steps, level, level) for level in levels]
+        case _:
+            base_rate, peak_rate, peak_duration = values[1], values[2], values[3]
+            if not 0 < peak_duration <= duration:
+                raise ValueError(f"Stage spike peak must last between 0 and the stage duration: {line}")
+            side = (duration - peak_duration) / 2
+            segments = [(peak_duration, peak_rate, peak_rate)]
+            if side > 0:
+                segments = [(side, base_rate, base_rate)] + segments + [(side, base_rate, base_rate)]
+            return segments
+
+
+def parse_profile(lines, unit = "records"):
+    """
+    Parse a profile, one stage per line, empty lines and '#' comments are ignored
+
+    :param lines: iterable of stage lines
+    :param unit: one of PROFILE_UNITS
+    :return: LoadProfile
+    :raise ValueError: when a stage is invalid
+    """
+    segments = []
+    for line in lines:
+        line = line.split("#", 1)[0].strip()
+        if line:
+            segments.extend(parse_stage(line))
+    return LoadProfile(segments, unit)
+
+
+def read_profile_file(file_name, unit = "records"):
+    """
+    Read a profile file, see parse_profile
+
+    :param file_name: path of the file
+    :param unit: one of PROFILE_UNITS
+    :return: LoadProfile
+    :raise ValueError: when the file cannot be read or a stage is invalid
+    """
+    try:
+        with open(file_name, encoding="utf-8") as profile_file:
+            return parse_profile(profile_file, unit)
+    except OSError as e:
+        raise ValueError(f"Profile file not readable: {e}") from None
+
+
+def ramp_profile(rate, ramp_seconds = 0):
+    """
+    Build an endless profile: a linear ramp from 0, then a constant rate
+
+    :param rate: records per second, 0 or less for no limit
+    :param ramp_seconds: duration of the ramp, 0 for no ramp
+    :return: LoadProfile, None for no limit
+    """
+    if rate <= 0:
+        return None
+    segments = [(math.inf, rate, rate)]
+    if ramp_seconds > 0:
+        segments.insert(0, (ramp_seconds, 0.0, rate))
+    return LoadProfile(segments)
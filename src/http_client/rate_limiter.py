@@ -0,0 +1,77 @@
+"""
+Client side rate limiting, token bucket shared by sending threads
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket filled at `rate` tokens per second, up to `capacity` tokens
+    """
+
+    def __init__(self, rate, capacity = None):
+        """
+        :param rate: tokens added per second
+        :param capacity: maximum number of tokens stored, one second of tokens by default
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def _take(self, tokens):
+        """
+        Take tokens, the bucket can go below zero
+
+        :param tokens: number of tokens to take
+        :return: number of seconds to wait until the tokens are paid
+        """
+        with self.lock:
+            self._refill()
+            self.tokens = self.tokens - tokens
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def acquire(self, tokens = 1):
+        """
+        Take tokens, waiting until they are available.
+        Requests larger than the capacity are allowed and paid by waiting afterwards.
+
+        :param tokens: number of tokens to take
+        :return: number of seconds waited
+        """
+        wait = self._take(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens = 1):
+        """
+        Take tokens, waiting without blocking the event loop
+
+        :param tokens: number of tokens to take
+        :return: number of seconds waited
+        """
+        # Only imported by the async engine, the threads engine never loads asyncio
+        import asyncio
+        wait = self._take(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+def build_token_bucket(rate):
+    """
+    Build a token bucket from a configured rate
+
+    :param rate: tokens per second, 0 or less for no limit
+    :return: TokenBucket or None
+    """
+    return TokenBucket(rate) if rate and rate > 0 else None
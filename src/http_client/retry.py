@@ -0,0 +1,74 @@
+"""
+Retry policy management, exponential backoff with jitter and Retry-After support
+"""
+
+import email.utils
+import random
+import time
+
+# HTTP statuses worth sending the query again
+RETRYABLE_STATUSES = (408, 429, 500, 502, 503, 504)
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header value
+
+    :param value: header value, number of seconds or HTTP date
+    :return: number of seconds to wait, None if missing or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_date.timestamp() - time.time())
+
+
+class RetryPolicy:
+    """
+    Number of attempts and waiting time between attempts
+    """
+
+    def __init__(self, max_attempts = 5, backoff_base = 0.5, backoff_max = 30.0, jitter = True):
+        """
+        :param max_attempts: maximum number of attempts, 1 to never retry
+        :param backoff_base: waiting time before the first retry in seconds, doubled at each retry
+        :param backoff_max: maximum waiting time between attempts in seconds
+        :param jitter: draw the waiting time between 0 and the backoff ("full jitter")
+        """
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+
+    def is_retryable(self, status):
+        """
+        :param status: HTTP status, None for a connection error
+        :return: True if the query can be sent again
+        """
+        return status is None or status in RETRYABLE_STATUSES
+
+    def delay(self, attempt, retry_after = None):
+        """
+        Compute the waiting time after a failed attempt.
+        A Retry-After value sent by the server is always respected.
+
+        :param attempt: number of the failed attempt, starting at 1
+        :param retry_after: Retry-After header value
+        :return: number of seconds to wait
+        """
+        backoff = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        if self.jitter:
+            backoff = random.uniform(0, backoff)
+        server_delay = parse_retry_after(retry_after)
+        if server_delay is not None:
+            return max(backoff, server_delay)
+        return backoff
+
+
+no_retry_policy = RetryPolicy(max_attempts=1)
@@ -0,0 +1,139 @@
+"""
+Paced push, used by the STREAM action and by PUSH with a load profile.
+Batches are released on the schedule of a load profile until the profile ends, a duration is reached
+or SIGTERM/SIGINT is received. Batches already released are still sent before the process exits.
+"""
+
+import logging
+import math
+import signal
+import threading
+import time
+
+# Seconds between two throughput reports
+DEFAULT_REPORT_SECONDS = 10
+
+
+class StreamControl:
+    """
+    Schedule and stop condition of a paced push, with periodic throughput reports
+    """
+
+    def __init__(self, profile = None, duration_seconds = 0, report_seconds = DEFAULT_REPORT_SECONDS):
+        """
+        :param profile: LoadProfile releasing the batches, None for no limit
+        :param duration_seconds: maximum duration of the push, 0 to push until the profile ends or SIGTERM/SIGINT
+        :param report_seconds: seconds between two throughput reports, 0 for no report
+        """
+        self.profile = profile
+        self.end_time = profile.duration if profile else math.inf
+        if duration_seconds > 0:
+            self.end_time = min(self.end_time, duration_seconds)
+        self.report_seconds = report_seconds
+        self.stop_event = threading.Event()
+        self.start_time = None
+        self.previous_handlers = {}
+        self.reporter = None
+
+    def stop(self, signum = None, frame = None):
+        """
+        Stop the release of batches, used as signal handler
+
+        :return: No Return
+        """
+        if signum is not None and not self.stop_event.is_set():
+            logging.info(f"{signal.Signals(signum).name} received, sending in-flight batches before exit")
+        self.stop_event.set()
+
+    def start(self, report = None):
+        """
+        Start the schedule, catch SIGTERM and SIGINT, and start the throughput reports
+
+        :param report: PushReport of the push, read by the reports
+        :return: No Return
+        """
+        self.start_time = time.monotonic()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self.previous_handlers[signum] = signal.signal(signum, self.stop)
+        if report is not None and self.report_seconds > 0:
+            self.reporter = threading.Thread(target=self._report, args=(report,), name="stream-report", daemon=True)
+            self.reporter.start()
+
+    def close(self):
+        """
+        Stop the reports and restore the signal handlers
+
+        :return: No Return
+        """
+        self.stop_event.set()
+        for signum, handler in self.previous_handlers.items():
+            signal.signal(signum, handler)
+        self.previous_handlers = {}
+        if self.reporter:
+            self.reporter.join()
+
+    def _wait_until(self, when):
+        """
+        Wait until a time of the schedule, the end of the push or a stop
+
+        :param when: seconds since the start
+        :return: True if batches can still be released
+        """
+        if when >= self.end_time:
+            self.stop_event.wait(self.start_time + self.end_time - time.monotonic())
+            self.stop_event.set()
+        else:
+            self.stop_event.wait(self.start_time + when - time.monotonic())
+        return not self.stop_event.is_set()
+
+    def iter_batches(self, batches):
+        """
+        Release batches on the schedule.
+        Release times are computed from the start, not from the previous batch: scheduler delays and
+        late wake-ups are caught up by the next batches instead of adding up.
+
+        :param batches: iterable of batches (list of records)
+        :return: generator of batches, ends on stop or at the end of the push
+        """
+        if self.start_time is None:
+            self.start_time = time.monotonic()
+        count_requests = self.profile is not None and self.profile.unit == "requests"
+        released = 0
+        for batch in batches:
+            if not self._wait_until(self.profile.time_of(released) if self.profile else 0.0):
+                break
+            yield batch
+            released = released + (1 if count_requests else len(batch))
+
+    def _report(self, report):
+        """
+        Log the throughput of each period, until stopped
+
+        :param report: PushReport of the push
+        :return: No Return
+        """
+        unit = self.profile.unit if self.profile else "records"
+        last_units = 0
+        last_time = self.start_time
+        while not self.stop_event.wait(self.report_seconds):
+            now = time.monotonic()
+            if unit == "requests":
+                units = report.batches_ok + report.batches_failed
+            else:
+                units = report.records_ok + report.records_failed
+            rate = (units - last_units) / (now - last_time)
+            target = ""
+            target_rate = None
+            if self.profile:
+                elapsed, previous = now - self.start_time, last_time - self.start_time
+                target_rate = (self.profile.units_at(elapsed) - self.profile.units_at(previous)) / (now - last_time)
+                target = f" (target {target_rate:.0f} {unit}/s)"
+            logging.info(
+                f"Stream: {rate:.0f} {unit}/s over the last {now - last_time:.0f} s{target}, "
+                f"{report.records_ok} records sent, {report.records_failed} records failed, "
+                f"{report.batches_ok + report.batches_failed} batches in {now - self.start_time:.0f} s",
+                extra={"rate": rate, "target_rate": target_rate, "unit": unit, "records_ok": report.records_ok,
+                       "records_failed": report.records_failed}
+            )
+            last_units = units
+            last_time = now
@@ -0,0 +1,38 @@
+"""
+Optional libraries, imported once on first use by the features that need them.
+zstd compresses csv.zst files and request bodies, pyarrow writes Parquet files: runs that use neither never import them.
+"""
+
+import functools
+import importlib
+
+
+@functools.cache
+def load_module(name):
+    """
+    Import an optional library once, on first use
+
+    :param name: module name (ex. 'pyarrow.parquet')
+    :return: module, None when it is not installed
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def load_zstd():
+    """
+    zstd is in the standard library since Python 3.14, in the zstandard package before
+
+    :return: (compression.zstd module or None, zstandard module or None)
+    """
+    zstd = load_module("compression.zstd")
+    return zstd, None if zstd is not None else load_module("zstandard")
+
+
+def load_pyarrow():
+    """
+    :return: pyarrow module with its parquet submodule imported, None when it is not installed
+    """
+    return load_module("pyarrow") if load_module("pyarrow.parquet") is not None else None
@@ -1,10 +1,40 @@
 """
-Log file management
+Log file management.
+Hot paths (one call per row, per item or per request) log with %-style arguments: the message is only
+formatted for records of an enabled level. Per row debug lines are sampled, 1 in N rows is logged.
+Logging calls merge the message arguments and put records in a queue, a QueueListener thread formats them
+(text or JSON lines, tracebacks included) and writes them to the files.
+The queue can be bounded: when the writer falls behind, new records are dropped and counted instead of
+slowing down generation and pushing. Files can be JSON lines, rotated by size or time and gzipped.
+Worker processes (CSV --workers) do not run the listener thread: their records are sent to the parent process
+through a multiprocessing queue, see start_worker_logging.
 """
 
+import atexit
+import copy
+import datetime
+import itertools
+import json
 import logging
+import logging.handlers
+import os
+import queue
 import sys
 
+from metrics.metrics import log_records_dropped
+
+# Default number of calls between two logged rows of a DebugSampler
+DEFAULT_DEBUG_SAMPLE_EVERY = 1000
+
+# Number of calls between two logged rows, set from the configuration
+debug_sample_every = DEFAULT_DEBUG_SAMPLE_EVERY
+
+# Log file rotations: none, by size or by time
+LOG_ROTATIONS = ("none", "size", "time")
+
+# Attributes of every LogRecord, other attributes come from `extra` and are written as JSON fields
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
 
 # Define log level from a string
 def compute_log_level(log_level):
@@ -19,3 +49,294 @@ def compute_log_level(log_level):
         logging.error(f"Invalid log level: {log_level}")
         sys.exit(5)
     return numeric_level
+
+
+def debug_enabled(logger = None):
+    """
+    Check once, before a loop, that debug lines would be written
+
+    :param logger: logger to check, root logger if None
+    :return: True if DEBUG records are handled
+    """
+    return (logger or logging.getLogger()).isEnabledFor(logging.DEBUG)
+
+
+def set_debug_sampling(every):
+    """
+    Set the sampling of the per row debug lines
+
+    :param every: one line is logged every `every` calls, 1 to log every row
+    :return: No Return
+    """
+    global debug_sample_every
+    if every < 1:
+        raise ValueError("debug_sample_every must be greater than 0")
+    debug_sample_every = every
+
+
+class DebugSampler:
+    """
+    Debug lines logged 1 call in N, for lines written at each generated row or item
+    """
+
+    def __init__(self, every = None, logger = None):
+        """
+        :param every: calls between two logged lines, debug_sample_every of the configuration if None
+        :param logger: logger to use, root logger if None
+        """
+        self.every = every
+        self.logger = logger or logging.getLogger()
+        # next() on itertools.count is atomic, samplers can be shared by threads
+        self.calls = itertools.count()
+
+    def debug(self, message, *args):
+        """
+        Log a debug line if this call is sampled, arguments are only formatted when it is written
+
+        :param message: %-style message
+        :param args: arguments of the message
+        :return: No Return
+        """
+        if next(self.calls) % (self.every or debug_sample_every) == 0 and self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(message, *args, stacklevel=2)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as JSON lines. Fields given with `extra` (ex. batch_id, latency_ms) are written as fields.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "file": record.filename,
+            "function": record.funcName,
+            "line": record.lineno,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def gzip_rotator(source, destination):
+    """
+    Rotator of the file handlers: the rotated file is gzipped, in the listener thread
+
+    :param source: file being rotated
+    :param destination: name of the rotated file, see gzip_namer
+    :return: No Return
+    """
+    # Only imported when rotated logs are compressed
+    import gzip
+    import shutil
+    with open(source, "rb") as source_file, gzip.open(destination, "wb") as destination_file:
+        shutil.copyfileobj(source_file, destination_file)
+    os.remove(source)
+
+
+def gzip_namer(name):
+    """
+    Namer of the file handlers, rotated files get a .gz extension
+
+    :param name: default name of the rotated file (ex. app.log.1)
+    :return: name of the gzipped file
+    """
+    return f"{name}.gz"
+
+
+def build_log_handler(
+        log_file,
+        log_format,
+        structured = False,
+        rotation = "none",
+        max_bytes = 0,
+        when = "midnight",
+        backup_count = 5,
+        compress = False
+):
+    """
+    Build the handler of the log file
+
+    :param log_file: path of the log file
+    :param log_format: format of the text lines, unused for JSON lines
+    :param structured: write JSON lines instead of text lines
+    :param rotation: one of LOG_ROTATIONS
+    :param max_bytes: size of the file triggering a rotation, for size rotation
+    :param when: interval of a time rotation (S, M, H, D, midnight, W0-W6, see TimedRotatingFileHandler)
+    :param backup_count: number of rotated files kept
+    :param compress: gzip the rotated files
+    :return: logging.Handler
+    :raise ValueError: when the rotation is invalid
+    """
+    match rotation:
+        case "none":
+            handler = logging.FileHandler(filename=log_file, encoding="utf-8", mode="a+")
+        case "size":
+            handler = logging.handlers.RotatingFileHandler(
+                filename=log_file, encoding="utf-8", maxBytes=max_bytes, backupCount=backup_count
+            )
+        case "time":
+            handler = logging.handlers.TimedRotatingFileHandler(
+                filename=log_file, encoding="utf-8", when=when, backupCount=backup_count
+            )
+        case _:
+            raise ValueError(f"Invalid log rotation: {rotation}, expected one of {', '.join(LOG_ROTATIONS)}")
+    if compress and rotation != "none":
+        handler.rotator = gzip_rotator
+        handler.namer = gzip_namer
+    handler.setFormatter(JsonFormatter() if structured else logging.Formatter(log_format))
+    return handler
+
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler leaving the formatting to the handlers of the listener.
+    QueueHandler.prepare formats the whole line and merges the traceback in the message: JSON lines would
+    get the traceback in "message" instead of "exception".
+    """
+
+    def prepare(self, record):
+        """
+        Copy a record for the queue: arguments are merged in the message, the traceback is kept as text
+
+        :param record: LogRecord
+        :return: LogRecord to queue
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            # Tracebacks hold frames and cannot be sent to another process
+            record.exc_info = None
+        return record
+
+
+class DroppingQueueHandler(RecordQueueHandler):
+    """
+    Queue handler that never blocks: records are dropped and counted when the queue is full
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Counted without lock: an approximate count under contention is enough for a dropped records counter
+            self.dropped = self.dropped + 1
+            log_records_dropped.inc()
+
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """
+    Queue listener of a bounded queue: the stop sentinel waits for room instead of failing on a full queue
+    """
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+def start_queue_logging(logger = None, queue_size = 0):
+    """
+    Move the handlers of a logger behind a queue: logging calls put records in the queue,
+    a QueueListener thread formats and writes them with the handlers. The listener is stopped, and the queue flushed, at exit.
+
+    :param logger: logger whose handlers are moved, root logger if None
+    :param queue_size: maximum number of queued records, new records are dropped when it is full, 0 for no limit
+    :return: QueueListener
+    """
+    logger = logger or logging.getLogger()
+    handlers = list(logger.handlers)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    if queue_size > 0:
+        log_queue = queue.Queue(maxsize=queue_size)
+        queue_handler = DroppingQueueHandler(log_queue)
+        listener = DrainingQueueListener(log_queue, *handlers, respect_handler_level=True)
+    else:
+        log_queue = queue.SimpleQueue()
+        queue_handler = RecordQueueHandler(log_queue)
+        listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    logger.addHandler(queue_handler)
+    listener.queue_handler = queue_handler
+    listener.start()
+    atexit.register(stop_queue_logging, listener)
+    return listener
+
+
+def stop_queue_logging(listener):
+    """
+    Write the queued records and stop the listener thread.
+    The number of dropped records is written directly to the handlers, after the queue.
+
+    :param listener: QueueListener returned by start_queue_logging
+    :return: No Return
+    """
+    atexit.unregister(stop_queue_logging)
+    listener.stop()
+    dropped = getattr(listener.queue_handler, "dropped", 0)
+    if dropped:
+        record = logging.LogRecord(
+            "root", logging.WARNING, __file__, 0, "%d log records dropped, the log queue was full", (dropped,), None,
+            func="stop_queue_logging"
+        )
+        record.dropped_records = dropped
+        for handler in listener.handlers:
+            handler.handle(record)
+    for handler in listener.handlers:
+        handler.flush()
+
+
+class ForwardingHandler(logging.Handler):
+    """
+    Handle the records received from worker processes with the loggers of this process
+    """
+
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+
+def start_worker_logging(context = None):
+    """
+    Collect the records of worker processes: a listener thread of the parent process reads them from a
+    multiprocessing queue and logs them with its own handlers (log queue, file, format, rotation)
+
+    :param context: multiprocessing context starting the workers, default context if None
+    :return: tuple (QueueListener, stop it when the workers ended, arguments of init_worker_logging)
+    """
+    # Only imported by runs with worker processes
+    import multiprocessing
+    log_queue = (context or multiprocessing.get_context()).Queue()
+    listener = logging.handlers.QueueListener(log_queue, ForwardingHandler())
+    listener.start()
+    return listener, (log_queue, logging.getLogger().getEffectiveLevel(), debug_sample_every)
+
+
+def init_worker_logging(log_queue, level, sample_every):
+    """
+    Initializer of worker processes: records are sent to the parent process instead of the handlers
+    inherited from it, whose listener thread does not run in the worker
+
+    :param log_queue: multiprocessing queue read by the listener of start_worker_logging
+    :param level: level of the root logger
+    :param sample_every: sampling of the per row debug lines, see set_debug_sampling
+    :return: No Return
+    """
+    logger = logging.getLogger()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(RecordQueueHandler(log_queue))
+    logger.setLevel(level)
+    set_debug_sampling(sample_every)
@@ -0,0 +1,44 @@
+"""
+Local /metrics endpoint, serving the registry in the Prometheus text format.
+Imported by MetricsExporter only when a port is configured: http.server is slow to import for short runs.
+"""
+
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from metrics.metrics import CONTENT_TYPE, registry
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    Serve the metrics of the registry on /metrics
+    """
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"Metrics endpoint: {format % args}")
+
+
+def start_metrics_server(host, port):
+    """
+    Start the /metrics endpoint in a daemon thread
+
+    :param host: address of the endpoint
+    :param port: port of the endpoint
+    :return: ThreadingHTTPServer, to shut down at the end of the run
+    """
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,372 @@
+"""
+Run metrics: counters and histograms updated by the generators, the HTTP client and app.py.
+Metrics are exported in the Prometheus text format, to a file at the end of a run or on a local /metrics
+endpoint while the program runs (STREAM, see metrics.endpoint), and summed up in a table at the end of each run.
+Metrics are kept by process: with CSV --workers, generation metrics of the worker processes are not collected.
+"""
+
+import bisect
+import contextlib
+import logging
+import math
+import os
+import threading
+import time
+
+# Prefix of the exported metric names
+NAMESPACE = "datagen"
+
+# Upper bounds of the histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Content type of the Prometheus text format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def format_value(value):
+    """
+    :param value: sample value
+    :return: value as written in the text format
+    """
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(label_names, label_values, extra = ()):
+    """
+    :param label_names: names of the labels
+    :param label_values: values of the labels, in the same order
+    :param extra: additional (name, value) pairs (ex. histogram 'le')
+    :return: labels as written in the text format (ex. '{stage="http"}'), empty string without labels
+    """
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")) for name, value in pairs
+    )
+    return "{" + ",".join(f"{name}=\"{value}\"" for name, value in escaped) + "}"
+
+
+class Counter:
+    """
+    Monotonic counter, by label values
+    """
+
+    def __init__(self, name, documentation, label_names = ()):
+        """
+        :param name: metric name, without namespace
+        :param documentation: help text
+        :param label_names: names of the labels
+        """
+        self.name = f"{NAMESPACE}_{name}"
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount = 1, *label_values):
+        """
+        Add to the counter
+
+        :param amount: value added, positive
+        :param label_values: values of the labels, in the order of label_names
+        :return: No Return
+        """
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        """
+        :param label_values: values of the labels
+        :return: current value
+        """
+        with self.lock:
+            return self.values.get(label_values, 0)
+
+    def render(self):
+        """
+        :return: lines of the text format
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for label_values, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(self.label_names, label_values)} {format_value(value)}")
+        return lines
+
+    def summary_rows(self):
+        """
+        :return: rows of the summary table (metric, labels, count, total, mean ms, max ms)
+        """
+        with self.lock:
+            return [
+                (self.name, format_labels(self.label_names, label_values), "", format_value(value), "", "")
+                for label_values, value in sorted(self.values.items())
+            ]
+
+
+class HistogramSeries:
+    """
+    Observations of a histogram for one set of label values
+    """
+    __slots__ = ("bucket_counts", "count", "total", "maximum")
+
+    def __init__(self, buckets):
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+
+class Histogram:
+    """
+    Distribution of durations in cumulative buckets, by label values
+    """
+
+    def __init__(self, name, documentation, label_names = (), buckets = DEFAULT_BUCKETS):
+        """
+        :param name: metric name, without namespace
+        :param documentation: help text
+        :param label_names: names of the labels
+        :param buckets: sorted upper bounds of the buckets, +Inf is added
+        """
+        self.name = f"{NAMESPACE}_{name}"
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def observe(self, value, *label_values):
+        """
+        Add an observation
+
+        :param value: observed value, in seconds for durations
+        :param label_values: values of the labels, in the order of label_names
+        :return: No Return
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = HistogramSeries(self.buckets)
+            series.bucket_counts[index] = series.bucket_counts[index] + 1
+            series.count = series.count + 1
+            series.total = series.total + value
+            series.maximum = max(series.maximum, value)
+
+    @contextlib.contextmanager
+    def time(self, *label_values):
+        """
+        Observe the duration of a block of code
+
+        :param label_values: values of the labels
+        :return: context manager
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, *label_values)
+
+    def count(self, *label_values):
+        """
+        :param label_values: values of the labels
+        :return: number of observations
+        """
+        with self.lock:
+            series = self.series.get(label_values)
+            return series.count if series else 0
+
+    def render(self):
+        """
+        :return: lines of the text format
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for label_values, series in sorted(self.series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (math.inf,), series.bucket_counts):
+                    cumulative = cumulative + bucket_count
+                    labels = format_labels(self.label_names, label_values, (("le", format_value(bound)),))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = format_labels(self.label_names, label_values)
+                lines.append(f"{self.name}_sum{labels} {format_value(series.total)}")
+                lines.append(f"{self.name}_count{labels} {series.count}")
+        return lines
+
+    def summary_rows(self):
+        """
+        :return: rows of the summary table (metric, labels, count, total, mean ms, max ms)
+        """
+        with self.lock:
+            return [
+                (
+                    self.name,
+                    format_labels(self.label_names, label_values),
+                    str(series.count),
+                    f"{series.total:.3f}",
+                    f"{series.total / series.count * 1000:.2f}",
+                    f"{series.maximum * 1000:.2f}"
+                )
+                for label_values, series in sorted(self.series.items()) if series.count
+            ]
+
+
+class Registry:
+    """
+    Metrics of the process, in registration order
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, documentation, label_names = ()):
+        """
+        Register a counter
+
+        :return: Counter
+        """
+        metric = Counter(name, documentation, label_names)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, label_names = (), buckets = DEFAULT_BUCKETS):
+        """
+        Register a histogram
+
+        :return: Histogram
+        """
+        metric = Histogram(name, documentation, label_names, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        :return: every metric in the Prometheus text format (str)
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write_text_file(self, file_name):
+        """
+        Write the metrics in a file, replaced atomically (node_exporter textfile collector)
+
+        :param file_name: path of the file
+        :return: No Return
+        """
+        temporary_file = f"{file_name}.tmp"
+        with open(temporary_file, "w", encoding="utf-8") as metrics_file:
+            metrics_file.write(self.render())
+        os.replace(temporary_file, file_name)
+
+    def summary_table(self):
+        """
+        :return: table of the metrics with observations (str)
+        """
+        header = ("metric", "labels", "count", "total", "mean ms", "max ms")
+        rows = [row for metric in self.metrics for row in metric.summary_rows()]
+        widths = [max(len(row[column]) for row in [header] + rows) for column in range(len(header))]
+        lines = []
+        for row in [header] + rows:
+            cells = [row[0].ljust(widths[0]), row[1].ljust(widths[1])]
+            cells.extend(cell.rjust(width) for cell, width in zip(row[2:], widths[2:]))
+            lines.append("  ".join(cells).rstrip())
+        return "\n".join(lines)
+
+
+# Metrics of the program
+registry = Registry()
+records_generated = registry.counter(
+    "records_generated_total", "Records generated, by kind (feedback, sale) and generation mode", ("kind", "mode")
+)
+rows_written = registry.counter("rows_written_total", "Sales rows written to the output files", ("format",))
+batches_sent = registry.counter("batches_total", "Batches pushed to the API, by result", ("result",))
+records_sent = registry.counter("records_sent_total", "Records pushed to the API, by result", ("result",))
+bytes_sent = registry.counter("http_request_bytes_total", "Request body bytes sent, after compression, retries included")
+http_responses = registry.counter(
+    "http_responses_total", "HTTP answers of the API by status code, 'error' when no answer was received", ("status",)
+)
+ollama_items = registry.counter("ollama_items_total", "Items received from Ollama")
+log_records_dropped = registry.counter("log_records_dropped_total", "Log records dropped, the log queue was full")
+http_request_seconds = registry.histogram("http_request_seconds", "Duration of one HTTP request to the API")
+ollama_request_seconds = registry.histogram(
+    "ollama_request_seconds", "Duration of one Ollama call, until its last item", ("stream",)
+)
+stage_seconds = registry.histogram(
+    "stage_seconds",
+    "Duration of the stages: generation (one block), encoding (one body), batch (one batch with retries), "
+    "push and csv (one run)",
+    ("stage",)
+)
+
+
+class MetricsExporter:
+    """
+    Export of the metrics: /metrics endpoint during the run, text file and summary table at the end
+    """
+
+    def __init__(self, file_name = "", host = "127.0.0.1", port = 0, summary = True):
+        """
+        :param file_name: text file written at the end of the run, empty for no file
+        :param host: address of the /metrics endpoint
+        :param port: port of the /metrics endpoint, 0 for no endpoint
+        :param summary: print the summary table at the end of the run
+        """
+        self.file_name = file_name
+        self.host = host
+        self.port = port
+        self.summary = summary
+        self.server = None
+
+    def start(self):
+        """
+        Start the /metrics endpoint in a daemon thread
+
+        :return: No Return
+        """
+        if self.port:
+            from metrics.endpoint import start_metrics_server
+            self.server = start_metrics_server(self.host, self.port)
+            logging.info(f"Metrics served on http://{self.host}:{self.server.server_port}/metrics")
+
+    def close(self):
+        """
+        Stop the endpoint, write the text file and print the summary table
+
+        :return: No Return
+        """
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.file_name:
+            try:
+                registry.write_text_file(self.file_name)
+                logging.info(f"Metrics written to {self.file_name}")
+            except OSError as e:
+                logging.error(f"Metrics file not written: {e}")
+        table = registry.summary_table()
+        logging.info(f"Metrics summary\n{table}")
+        if self.summary:
+            print(table)
+
+
+def build_metrics_exporter(file_name, host, port, summary):
+    """
+    Build the exporter of the metrics
+
+    :param file_name: text file written at the end of the run, empty for no file
+    :param host: address of the /metrics endpoint
+    :param port: port of the /metrics endpoint, 0 for no endpoint
+    :param summary: print the summary table at the end of the run
+    :return: MetricsExporter, None when metrics are not exported
+    """
+    if not file_name and not port and not summary:
+        return None
+    return MetricsExporter(file_name, host, port, summary)